@@ -0,0 +1,222 @@
+-- 用量记录按月分区 + 小时/天汇总表
+-- usage_logs 改为按 created_at 的月分区表；旧分区可直接 DROP，无需 DELETE 扫描
+-- 汇总表由后台聚合任务调用 refresh_usage_rollups() 维护，Dashboard 只读汇总表
+
+-- 创建某月分区（已存在则跳过）
+-- 兜底分区中已有该月的记录（例如聚合任务停机期间的写入）时，先把这些记录移出兜底分区，
+-- 建好分区后再写回，否则建分区会因兜底分区含有匹配的行而失败
+CREATE OR REPLACE FUNCTION create_usage_logs_partition(part_month DATE)
+RETURNS VOID AS $$
+DECLARE
+    start_date DATE := date_trunc('month', part_month)::DATE;
+    end_date DATE := (date_trunc('month', part_month) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := 'usage_logs_' || to_char(part_month, 'YYYY_MM');
+    moved BOOLEAN := FALSE;
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    IF to_regclass('usage_logs_default') IS NOT NULL THEN
+        DROP TABLE IF EXISTS usage_logs_partition_moving;
+        CREATE TEMP TABLE usage_logs_partition_moving (LIKE usage_logs) ON COMMIT DROP;
+        WITH moving AS (
+            DELETE FROM usage_logs_default
+            WHERE created_at >= start_date AND created_at < end_date
+            RETURNING id, user_id, endpoint, request_size, response_size,
+                      processing_time_ms, created_at
+        )
+        INSERT INTO usage_logs_partition_moving (id, user_id, endpoint, request_size, response_size,
+                                                 processing_time_ms, created_at)
+        SELECT * FROM moving;
+        moved := TRUE;
+    END IF;
+
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF usage_logs FOR VALUES FROM (%L) TO (%L)',
+        partition_name, start_date, end_date
+    );
+
+    IF moved THEN
+        INSERT INTO usage_logs (id, user_id, endpoint, request_size, response_size,
+                                processing_time_ms, created_at)
+        SELECT id, user_id, endpoint, request_size, response_size,
+               processing_time_ms, created_at
+        FROM usage_logs_partition_moving;
+        DROP TABLE usage_logs_partition_moving;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 把现有的普通表转换为分区表（重复执行时跳过）
+DO $$
+DECLARE
+    part_month DATE;
+    last_month DATE;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class
+        WHERE relname = 'usage_logs' AND relkind = 'p'
+    ) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE usage_logs RENAME TO usage_logs_legacy;
+    ALTER INDEX IF EXISTS idx_usage_logs_user_id RENAME TO idx_usage_logs_legacy_user_id;
+    ALTER INDEX IF EXISTS idx_usage_logs_created_at RENAME TO idx_usage_logs_legacy_created_at;
+
+    -- 分区表的主键必须包含分区键
+    CREATE TABLE usage_logs (
+        id UUID DEFAULT gen_random_uuid(),
+        user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+        endpoint VARCHAR(100) NOT NULL,
+        request_size INTEGER DEFAULT 0,
+        response_size INTEGER DEFAULT 0,
+        processing_time_ms INTEGER DEFAULT 0,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at);
+
+    -- 为历史数据所在月份及未来两个月创建分区
+    SELECT date_trunc('month', COALESCE(MIN(created_at), NOW()))::DATE
+    INTO part_month
+    FROM usage_logs_legacy;
+    last_month := (date_trunc('month', NOW()) + INTERVAL '2 months')::DATE;
+
+    WHILE part_month <= last_month LOOP
+        PERFORM create_usage_logs_partition(part_month);
+        part_month := (part_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+
+    INSERT INTO usage_logs (id, user_id, endpoint, request_size, response_size,
+                            processing_time_ms, created_at)
+    SELECT id, user_id, endpoint, request_size, response_size,
+           processing_time_ms, COALESCE(created_at, NOW())
+    FROM usage_logs_legacy;
+
+    DROP TABLE usage_logs_legacy;
+END;
+$$;
+
+-- 兜底分区：分区尚未创建时的写入不会失败
+CREATE TABLE IF NOT EXISTS usage_logs_default PARTITION OF usage_logs DEFAULT;
+
+-- 用量记录查询索引（在分区表上创建，自动应用到每个分区）
+CREATE INDEX IF NOT EXISTS idx_usage_logs_user_created ON usage_logs(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_usage_logs_created_at ON usage_logs(created_at);
+
+-- 小时汇总表
+CREATE TABLE IF NOT EXISTS usage_rollup_hourly (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    endpoint VARCHAR(100) NOT NULL,
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+    request_count BIGINT NOT NULL DEFAULT 0,
+    processing_time_sum BIGINT NOT NULL DEFAULT 0,
+    processing_time_p95 INTEGER NOT NULL DEFAULT 0,
+    request_bytes BIGINT NOT NULL DEFAULT 0,
+    response_bytes BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, bucket, endpoint)
+);
+
+-- 天汇总表（p95 无法由小时汇总合并，直接从原始记录计算）
+CREATE TABLE IF NOT EXISTS usage_rollup_daily (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    endpoint VARCHAR(100) NOT NULL,
+    bucket DATE NOT NULL,
+    request_count BIGINT NOT NULL DEFAULT 0,
+    processing_time_sum BIGINT NOT NULL DEFAULT 0,
+    processing_time_p95 INTEGER NOT NULL DEFAULT 0,
+    request_bytes BIGINT NOT NULL DEFAULT 0,
+    response_bytes BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, bucket, endpoint)
+);
+
+CREATE INDEX IF NOT EXISTS idx_usage_rollup_hourly_bucket ON usage_rollup_hourly(bucket);
+CREATE INDEX IF NOT EXISTS idx_usage_rollup_daily_bucket ON usage_rollup_daily(bucket);
+
+-- 汇总水位：小时/天汇总已计算到的时间（聚合任务从水位往前一段回看窗口开始重算，
+-- 停机期间的记录在恢复后补齐）
+CREATE TABLE IF NOT EXISTS usage_rollup_state (
+    name VARCHAR(20) PRIMARY KEY,
+    rolled_up_to TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- 重新计算 since 之后的汇总桶（幂等，可重复执行）
+-- 天汇总需要扫描当天全部原始记录，调用方可以降低其刷新频率
+CREATE OR REPLACE FUNCTION refresh_usage_rollups(since TIMESTAMP WITH TIME ZONE,
+                                                 include_daily BOOLEAN DEFAULT TRUE)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO usage_rollup_hourly (user_id, endpoint, bucket, request_count,
+                                     processing_time_sum, processing_time_p95,
+                                     request_bytes, response_bytes)
+    SELECT user_id, endpoint, date_trunc('hour', created_at),
+           COUNT(*),
+           COALESCE(SUM(processing_time_ms), 0),
+           COALESCE(percentile_disc(0.95) WITHIN GROUP (ORDER BY processing_time_ms), 0),
+           COALESCE(SUM(request_size), 0),
+           COALESCE(SUM(response_size), 0)
+    FROM usage_logs
+    WHERE created_at >= date_trunc('hour', since) AND user_id IS NOT NULL
+    GROUP BY user_id, endpoint, date_trunc('hour', created_at)
+    ON CONFLICT (user_id, bucket, endpoint) DO UPDATE SET
+        request_count = EXCLUDED.request_count,
+        processing_time_sum = EXCLUDED.processing_time_sum,
+        processing_time_p95 = EXCLUDED.processing_time_p95,
+        request_bytes = EXCLUDED.request_bytes,
+        response_bytes = EXCLUDED.response_bytes;
+
+    IF NOT include_daily THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO usage_rollup_daily (user_id, endpoint, bucket, request_count,
+                                    processing_time_sum, processing_time_p95,
+                                    request_bytes, response_bytes)
+    SELECT user_id, endpoint, created_at::DATE,
+           COUNT(*),
+           COALESCE(SUM(processing_time_ms), 0),
+           COALESCE(percentile_disc(0.95) WITHIN GROUP (ORDER BY processing_time_ms), 0),
+           COALESCE(SUM(request_size), 0),
+           COALESCE(SUM(response_size), 0)
+    FROM usage_logs
+    WHERE created_at >= date_trunc('day', since) AND user_id IS NOT NULL
+    GROUP BY user_id, endpoint, created_at::DATE
+    ON CONFLICT (user_id, bucket, endpoint) DO UPDATE SET
+        request_count = EXCLUDED.request_count,
+        processing_time_sum = EXCLUDED.processing_time_sum,
+        processing_time_p95 = EXCLUDED.processing_time_p95,
+        request_bytes = EXCLUDED.request_bytes,
+        response_bytes = EXCLUDED.response_bytes;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 删除早于 cutoff 所在月份的整月分区，返回删除的分区数
+CREATE OR REPLACE FUNCTION drop_usage_logs_partitions(cutoff DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    part RECORD;
+    dropped INTEGER := 0;
+BEGIN
+    FOR part IN
+        SELECT child.relname AS name
+        FROM pg_inherits
+        JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+        JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+        WHERE parent.relname = 'usage_logs'
+          AND child.relname ~ '^usage_logs_[0-9]{4}_[0-9]{2}$'
+    LOOP
+        IF to_date(substring(part.name FROM 12), 'YYYY_MM') < date_trunc('month', cutoff)::DATE THEN
+            EXECUTE format('DROP TABLE IF EXISTS %I', part.name);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 首次汇总全部历史数据，并以此设置初始水位
+SELECT refresh_usage_rollups('-infinity'::TIMESTAMP WITH TIME ZONE);
+INSERT INTO usage_rollup_state (name, rolled_up_to)
+VALUES ('hourly', NOW()), ('daily', NOW())
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,19 @@
+-- 交互记录表（OpenClaw 集成中经温暖增强的对话，由后台线程批量写入）
+-- user_id 为接入方的用户标识，不一定对应 users 表
+
+CREATE TABLE IF NOT EXISTS interactions (
+    id BIGSERIAL PRIMARY KEY,
+    user_id VARCHAR(255) NOT NULL,
+    channel VARCHAR(50),
+    session_id VARCHAR(255),
+    user_input TEXT NOT NULL,
+    primary_emotion VARCHAR(20),
+    intensity REAL,
+    emotion_data JSONB,
+    response TEXT,
+    metadata JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 按用户查询对话历史
+CREATE INDEX IF NOT EXISTS idx_interactions_user_created ON interactions(user_id, created_at);
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结果对象内存基准
+把分析结果按缓存的存储格式（JSON）编码后再逐条反序列化并全部驻留，
+用 tracemalloc 统计每条 EmotionResult / WarmResponse 占用的字节数；
+指定 --baseline 时，从该 git 版本加载模型类做对比
+
+    python scripts/bench_memory.py --baseline HEAD~1
+"""
+
+import os
+import sys
+import json
+import types
+import argparse
+import itertools
+import subprocess
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.core.emotion_analyzer import EmotionResult, get_emotion_analyzer
+from src.core.warm_response_engine import WarmResponse, get_warm_response_engine
+
+ANALYZER_PATH = "src/core/emotion_analyzer.py"
+ENGINE_PATH = "src/core/warm_response_engine.py"
+
+
+def load_baseline_class(revision: str, path: str, name: str):
+    """从指定 git 版本加载模型类"""
+    source = subprocess.check_output(["git", "show", f"{revision}:{path}"], cwd=ROOT, text=True)
+    module_name = os.path.splitext(os.path.basename(path))[0]
+    module = types.ModuleType(f"src.core._baseline_{module_name}")
+    module.__package__ = "src.core"
+    sys.modules[module.__name__] = module
+    exec(compile(source, f"{revision}:{path}", "exec"), module.__dict__)
+    return getattr(module, name)
+
+
+def build_payloads(count: int):
+    """生成缓存中的 JSON 编码结果（每条解码后都是新的字符串对象）"""
+    texts = [
+        "今天好开心啊！", "工作压力好大，有点焦虑", "一个人在家，感觉好孤独",
+        "非常生气，不想说话", "谢谢你一直陪着我", "有点难过，但还好", "明天要考试了，好紧张",
+    ]
+    suffixes = ["", "。", "……", "!!", "，怎么办"]
+    analyzer = get_emotion_analyzer()
+    engine = get_warm_response_engine()
+    emotions, responses = [], []
+    for text, suffix in itertools.islice(itertools.cycle(itertools.product(texts, suffixes)), count):
+        result = analyzer.analyze(text + suffix, {"topic": "work"})
+        emotions.append(json.dumps(result.to_dict(), ensure_ascii=False))
+        responses.append(json.dumps(
+            engine.generate(result, "我在听。", {"preferences": {"style": "warm"}}).to_dict(),
+            ensure_ascii=False
+        ))
+    return emotions, responses
+
+
+def bytes_per_object(model, payloads) -> float:
+    """反序列化并驻留全部对象，返回平均每个对象（含其字段）占用的字节数"""
+    loads, from_dict = json.loads, model.from_dict
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [from_dict(loads(payload)) for payload in payloads]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del objects
+    return used / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结果对象内存基准")
+    parser.add_argument("--count", type=int, default=20000, help="驻留的结果条数")
+    parser.add_argument("--baseline", help="对比的 git 版本（如 HEAD~1）")
+    args = parser.parse_args()
+
+    emotions, responses = build_payloads(args.count)
+    current = {
+        "EmotionResult": bytes_per_object(EmotionResult, emotions),
+        "WarmResponse": bytes_per_object(WarmResponse, responses),
+    }
+    print(f"cached results: {args.count}")
+    for name, size in current.items():
+        print(f"current  {name}: {size:.0f} bytes/result")
+
+    if args.baseline:
+        baseline = {
+            "EmotionResult": bytes_per_object(
+                load_baseline_class(args.baseline, ANALYZER_PATH, "EmotionResult"), emotions
+            ),
+            "WarmResponse": bytes_per_object(
+                load_baseline_class(args.baseline, ENGINE_PATH, "WarmResponse"), responses
+            ),
+        }
+        for name, size in baseline.items():
+            print(f"baseline {name}: {size:.0f} bytes/result ({args.baseline}, "
+                  f"{1 - current[name] / size:.0%} smaller now)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应序列化微基准
+对比核心端点原来的编码路径（to_dict + json.dumps 统计大小，再由 FastAPI
+jsonable_encoder + JSONResponse 编码）与现在的一次编码路径
+
+    python scripts/bench_serialization.py
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src.api.serialization import ORJSON_AVAILABLE, dumps, render_list_envelope
+from src.core.emotion_analyzer import EmotionAnalyzer
+
+
+def metadata() -> dict:
+    return {
+        "user_id": "3f1c2a9e-8d8b-4c1e-9a53-0f6e1d2b7c44",
+        "plan": "pro",
+        "quota_remaining": 9876,
+        "processing_time_ms": 3,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+def legacy_single(result) -> int:
+    """原路径：单条"""
+    size = len(json.dumps(result.to_dict()))
+    content = {"success": True, "data": result.to_dict(), "metadata": metadata()}
+    JSONResponse(jsonable_encoder(content)).body
+    return size
+
+
+def current_single(result) -> int:
+    """现路径：单条"""
+    body = dumps({"success": True, "data": result.to_dict(), "metadata": metadata()})
+    return len(body)
+
+
+def legacy_batch(results) -> list:
+    """原路径：批量"""
+    data = [result.to_dict() for result in results]
+    sizes = [len(json.dumps(item)) for item in data]
+    JSONResponse(jsonable_encoder({"success": True, "data": data, "metadata": metadata()})).body
+    return sizes
+
+
+def current_batch(results) -> list:
+    """现路径：批量"""
+    items = [dumps(result.to_dict()) for result in results]
+    render_list_envelope(items, metadata())
+    return [len(item) for item in items]
+
+
+def timed(func, arg, rounds: int) -> float:
+    """返回每次调用的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(arg)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="响应序列化微基准")
+    parser.add_argument("--rounds", type=int, default=20000, help="单条请求重复次数")
+    parser.add_argument("--batch-size", type=int, default=100, help="批量请求的条数")
+    args = parser.parse_args()
+
+    analyzer = EmotionAnalyzer()
+    result = analyzer.analyze("今天被老板批评了，好难过，不知道该怎么办？")
+    results = [result] * args.batch_size
+    batch_rounds = max(1, args.rounds // args.batch_size)
+
+    print(f"encoder: {'orjson' if ORJSON_AVAILABLE else 'json'}")
+    legacy = timed(legacy_single, result, args.rounds)
+    current = timed(current_single, result, args.rounds)
+    print(f"single:  legacy {legacy:.1f} us, current {current:.1f} us ({legacy / current:.1f}x)")
+    legacy = timed(legacy_batch, results, batch_rounds)
+    current = timed(current_batch, results, batch_rounds)
+    print(f"batch({args.batch_size}): legacy {legacy:.1f} us, current {current:.1f} us "
+          f"({legacy / current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+温暖回应生成微基准
+测量 WarmResponseEngine.generate 的单次耗时；指定 --baseline 时，
+从该 git 版本加载引擎做对比（同一随机种子下输出应完全一致）
+
+    python scripts/bench_warm_response.py --baseline HEAD~1
+"""
+
+import os
+import sys
+import time
+import types
+import random
+import argparse
+import itertools
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.core.emotion_analyzer import EmotionResult
+from src.core.warm_response_engine import WarmResponseEngine
+
+ENGINE_PATH = "src/core/warm_response_engine.py"
+
+
+def load_baseline_engine(revision: str) -> WarmResponseEngine:
+    """从指定 git 版本加载 WarmResponseEngine"""
+    source = subprocess.check_output(
+        ["git", "show", f"{revision}:{ENGINE_PATH}"], cwd=ROOT, text=True
+    )
+    module = types.ModuleType("src.core._baseline_warm_response_engine")
+    module.__package__ = "src.core"
+    exec(compile(source, f"{revision}:{ENGINE_PATH}", "exec"), module.__dict__)
+    return module.WarmResponseEngine()
+
+
+def build_cases():
+    """覆盖各情感、风格、表情级别与强度的输入"""
+    emotions = ["joy", "sadness", "anger", "anxiety", "fear", "neutral", "loneliness"]
+    styles = ["warm", "professional", "casual", "balanced"]
+    levels = ["none", "low", "moderate", "high"]
+    bases = ["建议你休息一下。", "那就好，继续加油吧。", "难过的时候可以找朋友聊聊天哦"]
+    cases = []
+    for emotion, style, level, base in itertools.product(emotions, styles, levels, bases):
+        for intensity in (0.2, 0.5, 0.9):
+            result = EmotionResult(emotion, [], intensity, 0.6, [], [], intensity > 0.8, "")
+            context = {"preferences": {"style": style, "emoji_level": level}}
+            cases.append((result, base, context))
+    return cases
+
+
+def bench(engine: WarmResponseEngine, cases, rounds: int) -> float:
+    """返回每次生成的平均耗时（微秒）"""
+    random.seed(0)
+    generate = engine.generate
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for result, base, context in cases:
+            generate(result, base, context)
+    return (time.perf_counter() - start) / (rounds * len(cases)) * 1e6
+
+
+def check_parity(baseline: WarmResponseEngine, engine: WarmResponseEngine, cases) -> int:
+    """同一随机种子下对比两个引擎的输出，返回不一致的条数"""
+    mismatches = 0
+    for seed, (result, base, context) in enumerate(cases):
+        random.seed(seed)
+        expected = baseline.generate(result, base, context).to_dict()
+        random.seed(seed)
+        if engine.generate(result, base, context).to_dict() != expected:
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WarmResponseEngine 微基准")
+    parser.add_argument("--rounds", type=int, default=50, help="每组输入重复次数")
+    parser.add_argument("--baseline", help="对比的 git 版本（如 HEAD~1）")
+    args = parser.parse_args()
+
+    cases = build_cases()
+    engine = WarmResponseEngine()
+    current = bench(engine, cases, args.rounds)
+    print(f"cases: {len(cases)} x {args.rounds} rounds")
+    print(f"current:  {current:.2f} us/response")
+
+    if args.baseline:
+        baseline_engine = load_baseline_engine(args.baseline)
+        baseline = bench(baseline_engine, cases, args.rounds)
+        print(f"baseline: {baseline:.2f} us/response ({args.baseline})")
+        print(f"speedup:  {baseline / current:.2f}x")
+        print(f"output mismatches: {check_parity(baseline_engine, engine, cases)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,12 @@
 # -*- coding: utf-8 -*-
 """
 初始化数据库
-创建用户表和用量记录表
+按文件名顺序执行 migrations/ 下的全部迁移（迁移脚本均可重复执行）
 """
 
 import os
 import sys
+import glob
 import psycopg2
 
 def init_database():
@@ -21,22 +22,24 @@ def init_database():
         
         with conn.cursor() as cur:
             # 读取并执行迁移文件
-            migration_file = os.path.join(
-                os.path.dirname(__file__), 
-                "migrations", 
-                "001_create_user_tables.sql"
+            migrations_dir = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                "migrations"
             )
+            migration_files = sorted(glob.glob(os.path.join(migrations_dir, "*.sql")))
             
-            if os.path.exists(migration_file):
+            if not migration_files:
+                print(f"❌ Migration files not found: {migrations_dir}")
+                return False
+            
+            for migration_file in migration_files:
                 with open(migration_file, 'r') as f:
                     sql = f.read()
                 
-                print("Executing migration...")
+                print(f"Executing migration {os.path.basename(migration_file)}...")
                 cur.execute(sql)
-                print("✅ Database initialized successfully!")
-            else:
-                print(f"❌ Migration file not found: {migration_file}")
-                return False
+            
+            print("✅ Database initialized successfully!")
         
         conn.close()
         return True
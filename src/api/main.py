@@ -8,20 +8,32 @@ Warm Agent API 主服务 - 包含用户管理功能
 import os
 import json
 import time
+import asyncio
+import functools
+import uuid
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 
-from fastapi import FastAPI, HTTPException, Depends, status, Request, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, status, Request, BackgroundTasks, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from pydantic import BaseModel, Field, validator
 import uvicorn
 
 from ..core.emotion_analyzer import get_emotion_analyzer, EmotionResult
 from ..core.warm_response_engine import get_warm_response_engine, WarmResponse
-from ..core.user_manager import get_user_manager, UserManager, User
+from ..core.user_manager import User
+from ..core.async_user_manager import get_async_user_manager
+from ..core.auth_cache import get_auth_cache
+from ..core.usage_buffer import get_usage_buffer
+from ..core.usage_rollup import get_usage_aggregator
+from ..core import metrics
 from ..core.email_service import get_email_service
+from ..core.analysis_executor import get_analysis_executor, AnalysisBusyError
+from ..core.quota_meter import QuotaMeter
+from ..integrations.openclaw import get_openclaw_integration, OpenClawContext, OpenClawMessage
+from .serialization import JSONBytesResponse, dumps, render_list_envelope
 
 
 # ==================== Pydantic 模型 ====================
@@ -107,13 +119,43 @@ app.add_middleware(
 # 初始化核心组件
 emotion_analyzer = get_emotion_analyzer()
 warm_engine = get_warm_response_engine()
-user_manager = get_user_manager()
+user_manager = get_async_user_manager()
+auth_cache = get_auth_cache()
+usage_buffer = get_usage_buffer()
+usage_aggregator = get_usage_aggregator()
 email_service = get_email_service()
+analysis_executor = get_analysis_executor()
+openclaw_integration = get_openclaw_integration()
+
+# 运行状态指标的采样间隔（秒）
+METRICS_SAMPLE_INTERVAL = float(os.getenv("WARM_AGENT_METRICS_SAMPLE_INTERVAL", "5"))
+
+# 批量接口单次最多处理的条数
+MAX_BATCH_SIZE = int(os.getenv("WARM_AGENT_MAX_BATCH_SIZE", "1000"))
+
+# WebSocket 连接每次向数据库预留的额度
+STREAM_QUOTA_CHUNK = int(os.getenv("WARM_AGENT_STREAM_QUOTA_CHUNK", "20"))
+
+# WebSocket 关闭码（4000-4999 为应用自定义）
+WS_CLOSE_UNAUTHORIZED = 4401
+WS_CLOSE_FORBIDDEN = 4403
+WS_CLOSE_QUOTA_EXCEEDED = 4429
 
 # API Key 认证
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 
+async def lookup_user(api_key: str) -> Optional[User]:
+    """按API Key查找用户：先查认证缓存（含无效key的负缓存），未命中再查数据库"""
+    cached, user = auth_cache.get(api_key)
+    if not cached:
+        # 查库期间若有失效（重新生成key、变更套餐），读到的记录可能已过时，不写入缓存
+        generation = auth_cache.generation()
+        user = await user_manager.get_user_by_api_key(api_key)
+        auth_cache.set(api_key, user, generation)
+    return user
+
+
 async def get_current_user(api_key: str = Depends(api_key_header)) -> User:
     """验证API Key并获取用户"""
     if not api_key:
@@ -122,7 +164,8 @@ async def get_current_user(api_key: str = Depends(api_key_header)) -> User:
             detail="API Key is required"
         )
     
-    user = user_manager.get_user_by_api_key(api_key)
+    user = await lookup_user(api_key)
+    
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -145,9 +188,160 @@ async def get_current_user(api_key: str = Depends(api_key_header)) -> User:
     return user
 
 
-def check_and_increment_quota(user: User) -> bool:
-    """检查并增加用量计数"""
-    return user_manager.increment_quota(user.api_key)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """记录请求耗时（按路由模板统计，避免路径参数导致标签膨胀）"""
+    start_time = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = route.path if route is not None else "unmatched"
+        metrics.HTTP_REQUEST_SECONDS.labels(
+            request.method, endpoint, str(status_code)
+        ).observe(time.perf_counter() - start_time)
+
+
+def sample_runtime_metrics():
+    """采样连接池、缓存与后台队列状态"""
+    metrics.set_pool_stats(user_manager.pool_stats())
+    metrics.set_queue_depth("analysis", analysis_executor.pending)
+    metrics.set_queue_depth("usage_buffer", usage_buffer.stats()["buffered"])
+    metrics.USAGE_EVENTS_DROPPED.set(usage_buffer.dropped)
+    interaction_stats = openclaw_integration.recorder.stats()
+    metrics.set_queue_depth("interactions", interaction_stats["queued"])
+    metrics.INTERACTIONS_DROPPED.set(interaction_stats["dropped"])
+    session_stats = openclaw_integration.sessions.stats()
+    if "sessions" in session_stats:
+        metrics.SESSIONS_RESIDENT.set(session_stats["sessions"])
+    if analysis_executor.cache is not None:
+        metrics.CACHE_BYTES.labels(analysis_executor.cache.namespace).set(
+            analysis_executor.cache.stats()["bytes"]
+        )
+    if warm_engine.cache is not None:
+        warm_engine.cache.report_metrics()
+        metrics.CACHE_BYTES.labels("warm_response").set(warm_engine.cache.stats()["bytes"])
+
+
+async def sample_runtime_metrics_forever():
+    """每个 worker 定期采样自己的运行状态"""
+    while True:
+        sample_runtime_metrics()
+        await asyncio.sleep(METRICS_SAMPLE_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_metrics_sampler():
+    """启动运行状态采样"""
+    app.state.metrics_sampler = asyncio.get_running_loop().create_task(
+        sample_runtime_metrics_forever()
+    )
+
+
+@app.on_event("shutdown")
+async def stop_metrics_sampler():
+    """停止采样并清理本 worker 的多进程指标"""
+    app.state.metrics_sampler.cancel()
+    metrics.mark_process_dead()
+
+
+@app.on_event("startup")
+async def warm_up_tokenizer():
+    """在后台线程加载分词词典（不阻塞启动，加载完成前 /ready 返回 503）"""
+    loop = asyncio.get_running_loop()
+    app.state.tokenizer_warmup = loop.run_in_executor(None, emotion_analyzer.tokenizer.initialize)
+
+
+@app.on_event("startup")
+async def start_analysis_executor():
+    """预热分析工作池（不阻塞事件循环）"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, analysis_executor.start)
+
+
+@app.on_event("shutdown")
+async def stop_analysis_executor():
+    """关闭分析工作池与结果缓存"""
+    analysis_executor.shutdown()
+    if analysis_executor.cache is not None:
+        await analysis_executor.cache.close()
+
+
+@app.on_event("startup")
+async def start_auth_cache():
+    """启动认证缓存的失效通知监听（配置了Redis时）"""
+    auth_cache.start()
+
+
+@app.on_event("shutdown")
+async def stop_auth_cache():
+    """停止认证缓存监听"""
+    auth_cache.stop()
+
+
+@app.on_event("startup")
+async def start_usage_buffer():
+    """启动用量日志批量写入任务"""
+    usage_buffer.start()
+
+
+@app.on_event("startup")
+async def start_interaction_recorder():
+    """启动交互记录写入线程"""
+    openclaw_integration.recorder.start()
+
+
+@app.on_event("shutdown")
+async def stop_interaction_recorder():
+    """写完剩余的交互记录（阻塞 I/O 放到线程中）"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, openclaw_integration.recorder.stop)
+
+
+@app.on_event("startup")
+async def start_usage_aggregator():
+    """启动用量汇总与分区维护任务"""
+    usage_aggregator.start()
+
+
+@app.on_event("shutdown")
+async def stop_usage_aggregator():
+    """停止用量汇总任务"""
+    await usage_aggregator.stop()
+
+
+@app.on_event("shutdown")
+async def stop_usage_buffer():
+    """写完缓冲区中剩余的用量日志（须在关闭连接池之前）"""
+    await usage_buffer.stop()
+
+
+@app.on_event("shutdown")
+async def close_database_pool():
+    """关闭数据库连接池"""
+    await user_manager.close()
+
+
+def analysis_busy_error() -> HTTPException:
+    """分析队列已满"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Analysis queue is full, please retry later"
+    )
+
+
+async def consume_quota(user: User, cost: int = 1) -> int:
+    """扣减额度，返回剩余额度；超出额度时抛出429"""
+    remaining = await user_manager.consume_quota(user.api_key, cost)
+    if remaining is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Quota exceeded"
+        )
+    return remaining
 
 
 # ==================== 公开端点（无需认证） ====================
@@ -236,19 +430,41 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """健康检查"""
+    """健康检查（ready 表示预热已完成）"""
+    ready = emotion_analyzer.tokenizer.ready
     return {
         "status": "healthy",
+        "ready": ready,
         "timestamp": datetime.utcnow().isoformat(),
         "version": "1.1.0",
         "components": {
             "emotion_analyzer": "ok",
+            "tokenizer": "ok" if ready else "warming",
             "warm_engine": "ok",
             "user_system": "ok"
         }
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """就绪检查：分词词典加载完成前返回 503"""
+    if not emotion_analyzer.tokenizer.ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"ready": False}
+        )
+    return {"ready": True}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus 指标（多 worker 时汇总全部进程）"""
+    sample_runtime_metrics()
+    content, content_type = metrics.render_metrics()
+    return Response(content=content, headers={"Content-Type": content_type})
+
+
 @app.get("/register", response_class=HTMLResponse)
 async def register_page():
     """注册页面"""
@@ -472,7 +688,7 @@ async def register(request: RegisterRequest, background_tasks: BackgroundTasks):
     注册成功后会发送API key到邮箱
     """
     try:
-        user = user_manager.create_user(request.email, request.password, request.plan)
+        user = await user_manager.create_user(request.email, request.password, request.plan)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -506,7 +722,7 @@ async def login(request: LoginRequest):
     
     验证成功后返回用户信息（包含完整API key）
     """
-    user = user_manager.authenticate_user(request.email, request.password)
+    user = await user_manager.authenticate_user(request.email, request.password)
     
     if not user:
         raise HTTPException(
@@ -698,7 +914,7 @@ async def get_profile(user: User = Depends(get_current_user)):
 @app.post("/user/regenerate-key")
 async def regenerate_key(user: User = Depends(get_current_user)):
     """重新生成API Key"""
-    new_key = user_manager.regenerate_api_key(user.id)
+    new_key = await user_manager.regenerate_api_key(user.id)
     
     if not new_key:
         raise HTTPException(
@@ -720,7 +936,7 @@ async def delete_account(user: User = Depends(get_current_user)):
     删除用户账户和所有相关数据（用量记录等）
     删除后可以重新使用相同邮箱注册
     """
-    success = user_manager.delete_user(user.id)
+    success = await user_manager.delete_user(user.id)
     
     if not success:
         raise HTTPException(
@@ -740,7 +956,7 @@ async def get_usage(
     user: User = Depends(get_current_user)
 ):
     """获取用量统计"""
-    return user_manager.get_usage_stats(user.id, days)
+    return await user_manager.get_usage_stats(user.id, days)
 
 
 # ==================== 核心功能端点（需要API Key） ====================
@@ -748,7 +964,6 @@ async def get_usage(
 @app.post("/v1/emotion/analyze")
 async def analyze_emotion(
     request: EmotionRequest,
-    background_tasks: BackgroundTasks,
     user: User = Depends(get_current_user)
 ):
     """
@@ -761,42 +976,112 @@ async def analyze_emotion(
     start_time = time.time()
     
     # 检查并增加配额
-    if not check_and_increment_quota(user):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Quota exceeded"
-        )
+    quota_remaining = await consume_quota(user)
     
     try:
-        # 执行情感分析
-        emotion_result = emotion_analyzer.analyze(
+        # 执行情感分析（长文本交给分析执行器，不阻塞事件循环）
+        emotion_result = await analysis_executor.analyze(
             request.text,
             context=request.context
         )
         
         processing_time = int((time.time() - start_time) * 1000)
         
-        # 后台记录用量
-        background_tasks.add_task(
-            user_manager.log_usage,
-            user.api_key,
-            "/v1/emotion/analyze",
-            len(request.text),
-            len(json.dumps(emotion_result.to_dict())),
-            processing_time
-        )
-        
-        return {
+        # 只编码一次：响应体直接返回，其长度用于用量统计
+        body = dumps({
             "success": True,
             "data": emotion_result.to_dict(),
             "metadata": {
                 "user_id": user.id,
                 "plan": user.plan,
-                "quota_remaining": user.quota_limit - user.quota_used - 1,
+                "quota_remaining": quota_remaining,
                 "processing_time_ms": processing_time,
                 "timestamp": datetime.utcnow().isoformat()
             }
-        }
+        })
+        
+        # 记录用量（批量异步写入）
+        usage_buffer.record(
+            user.id,
+            "/v1/emotion/analyze",
+            len(request.text),
+            len(body),
+            processing_time
+        )
+        
+        return JSONBytesResponse(body)
+    
+    except AnalysisBusyError:
+        raise analysis_busy_error()
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Analysis failed: {str(e)}"
+        )
+
+
+@app.post("/v1/emotion/analyze/batch")
+async def analyze_emotion_batch(
+    request: List[EmotionRequest],
+    user: User = Depends(get_current_user)
+):
+    """
+    批量情感分析端点
+    
+    请求体为情感分析请求的列表，每条与 `/v1/emotion/analyze` 相同。
+    整批只扣减一次额度（N条扣N次）并一次性写入用量日志。
+    """
+    start_time = time.time()
+    count = len(request)
+    
+    if count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Batch must contain at least one item"
+        )
+    
+    if count > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch size exceeds limit of {MAX_BATCH_SIZE}"
+        )
+    
+    # 一次扣减N个额度
+    quota_remaining = await consume_quota(user, count)
+    
+    try:
+        emotion_results = await analysis_executor.analyze_many(
+            [item.text for item in request],
+            [item.context for item in request]
+        )
+        # 每条结果只编码一次，拼接成响应体，各自的长度用于用量统计
+        items = [dumps(result.to_dict()) for result in emotion_results]
+        
+        processing_time = int((time.time() - start_time) * 1000)
+        per_item_time = processing_time // count
+        
+        # 记录整批用量（批量异步写入）
+        for item, encoded in zip(request, items):
+            usage_buffer.record(
+                user.id,
+                "/v1/emotion/analyze/batch",
+                len(item.text),
+                len(encoded),
+                per_item_time
+            )
+        
+        return JSONBytesResponse(render_list_envelope(items, {
+            "user_id": user.id,
+            "plan": user.plan,
+            "total_requests": count,
+            "quota_remaining": quota_remaining,
+            "processing_time_ms": processing_time,
+            "timestamp": datetime.utcnow().isoformat()
+        }))
+    
+    except AnalysisBusyError:
+        raise analysis_busy_error()
     
     except Exception as e:
         raise HTTPException(
@@ -808,7 +1093,6 @@ async def analyze_emotion(
 @app.post("/v1/warm-response/generate")
 async def generate_warm_response(
     request: WarmResponseRequest,
-    background_tasks: BackgroundTasks,
     user: User = Depends(get_current_user)
 ):
     """
@@ -822,18 +1106,14 @@ async def generate_warm_response(
     start_time = time.time()
     
     # 检查并增加配额
-    if not check_and_increment_quota(user):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Quota exceeded"
-        )
+    quota_remaining = await consume_quota(user)
     
     try:
         # 如果没有提供情感数据，先进行分析
         if request.emotion_data:
             emotion_result = EmotionResult.from_dict(request.emotion_data)
         else:
-            emotion_result = emotion_analyzer.analyze(request.text)
+            emotion_result = await analysis_executor.analyze(request.text)
         
         # 合并用户上下文和偏好
         user_context = request.user_context or {}
@@ -848,32 +1128,35 @@ async def generate_warm_response(
         warm_response = warm_engine.generate(
             emotion_result=emotion_result,
             base_response=request.base_response,
-            user_context=user_context
+            user_context=user_context,
+            seed=warm_engine.seed_for(user.id, request.text)
         )
         
         processing_time = int((time.time() - start_time) * 1000)
         
-        # 后台记录用量
-        background_tasks.add_task(
-            user_manager.log_usage,
-            user.api_key,
+        # 记录用量（批量异步写入）
+        usage_buffer.record(
+            user.id,
             "/v1/warm-response/generate",
             len(request.text),
             len(warm_response.text),
             processing_time
         )
         
-        return {
+        return JSONBytesResponse(dumps({
             "success": True,
             "data": warm_response.to_dict(),
             "metadata": {
                 "user_id": user.id,
                 "plan": user.plan,
-                "quota_remaining": user.quota_limit - user.quota_used - 1,
+                "quota_remaining": quota_remaining,
                 "processing_time_ms": processing_time,
                 "timestamp": datetime.utcnow().isoformat()
             }
-        }
+        }))
+    
+    except AnalysisBusyError:
+        raise analysis_busy_error()
     
     except Exception as e:
         raise HTTPException(
@@ -882,6 +1165,159 @@ async def generate_warm_response(
         )
 
 
+# ==================== 实时端点（WebSocket） ====================
+
+async def close_stream(websocket: WebSocket, code: int, detail: str):
+    """发送错误说明后关闭连接"""
+    await websocket.send_json({"type": "error", "detail": detail})
+    await websocket.close(code=code)
+
+
+@app.websocket("/v1/stream")
+async def emotion_stream(websocket: WebSocket):
+    """
+    实时情感分析与温暖回应
+    
+    连接时通过 `X-API-Key` 头或 `api_key` 查询参数认证（整个连接只认证一次），
+    之后每条消息为 JSON：`{"id": ..., "text": ..., "base_response": ..., "context": {...}}`，
+    服务端逐条返回 `{"type": "result", ...}`。
+    
+    额度按块预留（每块 `WARM_AGENT_STREAM_QUOTA_CHUNK` 次），连接关闭时退还未用部分；
+    会话状态（温暖模式开关等）在连接存续期间保留。
+    """
+    await websocket.accept()
+    
+    api_key = websocket.headers.get("x-api-key") or websocket.query_params.get("api_key")
+    if not api_key:
+        await close_stream(websocket, WS_CLOSE_UNAUTHORIZED, "API Key is required")
+        return
+    
+    user = await lookup_user(api_key)
+    if not user:
+        await close_stream(websocket, WS_CLOSE_UNAUTHORIZED, "Invalid API Key")
+        return
+    
+    if not user.is_active:
+        await close_stream(websocket, WS_CLOSE_FORBIDDEN, "Account is deactivated")
+        return
+    
+    if user.quota_used >= user.quota_limit:
+        await close_stream(websocket, WS_CLOSE_QUOTA_EXCEEDED, "Quota exceeded. Please upgrade your plan.")
+        return
+    
+    meter = QuotaMeter(user_manager, user.api_key, STREAM_QUOTA_CHUNK)
+    session_id = f"ws:{user.id}:{uuid.uuid4().hex}"
+    loop = asyncio.get_running_loop()
+    
+    try:
+        while True:
+            try:
+                payload = json.loads(await websocket.receive_text())
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Message must be JSON"})
+                continue
+            
+            if not isinstance(payload, dict):
+                payload = {}
+            message_id = payload.get("id")
+            text = payload.get("text")
+            if not isinstance(text, str) or not 1 <= len(text) <= 10000:
+                await websocket.send_json({
+                    "type": "error",
+                    "id": message_id,
+                    "detail": "text must be a string of 1-10000 characters"
+                })
+                continue
+            
+            user_context = payload.get("context") or {}
+            if not isinstance(user_context, dict) or not isinstance(user_context.get("preferences", {}), dict):
+                await websocket.send_json({
+                    "type": "error",
+                    "id": message_id,
+                    "detail": "context must be an object (with an object preferences)"
+                })
+                continue
+            base_response = payload.get("base_response") or ""
+            if not isinstance(base_response, str):
+                await websocket.send_json({
+                    "type": "error",
+                    "id": message_id,
+                    "detail": "base_response must be a string"
+                })
+                continue
+            
+            start_time = time.time()
+            
+            quota_remaining = await meter.consume()
+            if quota_remaining is None:
+                await close_stream(websocket, WS_CLOSE_QUOTA_EXCEEDED, "Quota exceeded")
+                return
+            
+            # 单条消息处理失败只回错误帧（并退回这次扣减的额度），不断开连接
+            try:
+                emotion_result = await analysis_executor.analyze(text, context=user_context)
+                # 会话状态的读写（Redis 后端时为网络往返）放到线程中，不阻塞事件循环
+                processed = await loop.run_in_executor(None, functools.partial(
+                    openclaw_integration.process_message,
+                    OpenClawMessage(content=text, base_response=base_response),
+                    OpenClawContext(
+                        user_id=user.id,
+                        channel="websocket",
+                        user_context=user_context,
+                        session_id=session_id
+                    ),
+                    emotion_result=emotion_result
+                ))
+            except AnalysisBusyError:
+                meter.unconsume()
+                await websocket.send_json({
+                    "type": "error",
+                    "id": message_id,
+                    "detail": "Analysis queue is full, please retry later"
+                })
+                continue
+            except Exception as e:
+                meter.unconsume()
+                print(f"Stream message processing failed: {e}")
+                await websocket.send_json({
+                    "type": "error",
+                    "id": message_id,
+                    "detail": "Failed to process message"
+                })
+                continue
+            
+            processing_time = int((time.time() - start_time) * 1000)
+            
+            # 记录用量（批量异步写入）
+            usage_buffer.record(
+                user.id,
+                "/v1/stream",
+                len(text),
+                len(processed.enhanced_response),
+                processing_time
+            )
+            
+            await websocket.send_json({
+                "type": "result",
+                "id": message_id,
+                "emotion": processed.emotion_data.to_dict(),
+                "enhanced": processed.should_enhance,
+                "response": processed.enhanced_response,
+                "quota_remaining": quota_remaining,
+                "processing_time_ms": processing_time
+            })
+    
+    except WebSocketDisconnect:
+        pass
+    
+    finally:
+        await loop.run_in_executor(None, openclaw_integration.end_session, session_id)
+        try:
+            await meter.release()
+        except Exception as e:
+            print(f"Failed to refund stream quota: {e}")
+
+
 # ==================== 启动入口 ====================
 
 if __name__ == "__main__":
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应序列化
+核心端点把返回内容一次性编码为 bytes 并直接作为响应体返回，
+跳过 FastAPI 的 jsonable_encoder 与二次编码；用量统计直接使用 bytes 的长度。
+安装了 orjson 时用它编码，否则退回标准库 json（输出格式与 FastAPI 的 JSONResponse 相同）
+"""
+
+import json
+from typing import Any, Dict, List
+
+from fastapi.responses import Response
+
+# orjson 为可选依赖
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+if ORJSON_AVAILABLE:
+    def dumps(content: Any) -> bytes:
+        """编码为 UTF-8 JSON bytes"""
+        return orjson.dumps(content)
+else:
+    def dumps(content: Any) -> bytes:
+        """编码为 UTF-8 JSON bytes"""
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+
+
+def render_list_envelope(items: List[bytes], metadata: Dict[str, Any]) -> bytes:
+    """把已编码的条目拼成 {"success": true, "data": [...], "metadata": {...}}"""
+    return b"".join((
+        b'{"success":true,"data":[',
+        b",".join(items),
+        b'],"metadata":',
+        dumps(metadata),
+        b"}"
+    ))
+
+
+class JSONBytesResponse(Response):
+    """响应体为已编码的 JSON bytes"""
+    media_type = "application/json"
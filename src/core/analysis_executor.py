@@ -0,0 +1,258 @@
+"""
+分析执行器 - Warm Agent核心模块
+
+把CPU密集的情感分析从事件循环中移出。支持三种执行模式：
+
+- ``inline``：在调用方线程中直接执行（默认，与原行为一致）
+- ``thread``：在线程池中执行，事件循环不被阻塞
+- ``process``：在预热好的进程池中执行，每个子进程只加载一次jieba词典
+
+短文本始终走内联快速路径；排队中的任务数有上限，超出时等待（背压），
+等待超时则抛出 ``AnalysisBusyError``。配置了结果缓存时，命中缓存的文本不再分析。
+"""
+
+import os
+import json
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from .emotion_analyzer import EmotionResult, get_emotion_analyzer
+from .cache import CacheManager, get_analysis_cache
+
+
+EXECUTION_MODES = ("inline", "thread", "process")
+
+
+class AnalysisBusyError(RuntimeError):
+    """分析队列已满且等待超时"""
+
+
+def _init_worker() -> None:
+    """子进程初始化：构建分析器并加载jieba词典"""
+    get_emotion_analyzer().tokenizer.initialize()
+
+
+def _warmup_worker() -> int:
+    """预热任务，返回子进程PID"""
+    return os.getpid()
+
+
+def _analyze_in_worker(text: str, context: Optional[Dict]) -> EmotionResult:
+    """在工作进程/线程中分析单条文本"""
+    return get_emotion_analyzer().analyze(text, context=context)
+
+
+def _analyze_many_in_worker(texts: List[str],
+                            contexts: Optional[List[Optional[Dict]]]) -> List[EmotionResult]:
+    """在工作进程/线程中批量分析"""
+    return get_emotion_analyzer().analyze_many(texts, contexts)
+
+
+class AnalysisExecutor:
+    """情感分析执行器"""
+
+    def __init__(self, mode: str = "inline", max_workers: Optional[int] = None,
+                 max_pending: int = 64, inline_max_chars: int = 200,
+                 queue_timeout: float = 5.0, cache: Optional[CacheManager] = None):
+        """
+        初始化执行器
+
+        Args:
+            mode: 执行模式 (inline/thread/process)
+            max_workers: 工作线程/进程数，默认CPU核数
+            max_pending: 同时提交到池中的最大任务数
+            inline_max_chars: 不超过该长度的文本直接内联分析
+            queue_timeout: 等待空位的最长时间（秒）
+            cache: 分析结果缓存（可选）
+        """
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"mode must be one of: {EXECUTION_MODES}")
+
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.inline_max_chars = inline_max_chars
+        self.queue_timeout = queue_timeout
+        self.cache = cache
+
+        self._pool: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """当前在池中排队或执行的任务数"""
+        return self._pending
+
+    def start(self) -> None:
+        """创建并预热工作池（inline模式下无操作）"""
+        if self.mode == "inline" or self._pool is not None:
+            return
+
+        if self.mode == "thread":
+            pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="warm-agent-analysis",
+                initializer=_init_worker
+            )
+        else:
+            # spawn：子进程不继承父进程的事件循环和线程
+            pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+
+        # 预热：让所有工作者都完成初始化，完成后才对外可见
+        try:
+            warmups = [pool.submit(_warmup_worker) for _ in range(self.max_workers)]
+            for future in warmups:
+                future.result()
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        self._pool = pool
+
+    def shutdown(self) -> None:
+        """关闭工作池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _should_inline(self, total_chars: int) -> bool:
+        """是否走内联快速路径"""
+        return self.mode == "inline" or total_chars <= self.inline_max_chars
+
+    async def _ensure_pool(self) -> None:
+        """
+        确保工作池可用
+
+        首次使用或进程池损坏后需要重建时，在默认线程池中创建并预热（预热要等每个
+        工作者加载完jieba词典），事件循环不被阻塞；并发的调用方共享同一次重建
+        """
+        if self._pool is not None:
+            return
+
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+
+        async with self._start_lock:
+            if self._pool is None:
+                await asyncio.get_running_loop().run_in_executor(None, self.start)
+
+    async def _submit(self, func, *args):
+        """提交任务到工作池，带背压控制"""
+        await self._ensure_pool()
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise AnalysisBusyError("Analysis queue is full")
+
+        self._pending += 1
+        pool = self._pool
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            # 子进程异常退出：关闭损坏的进程池（回收管理线程与残留子进程），下次提交时重建
+            if self._pool is pool:
+                self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            self._pending -= 1
+            self._semaphore.release()
+
+    async def _analyze(self, text: str, context: Optional[Dict]) -> EmotionResult:
+        """分析单条文本（不查缓存）"""
+        if self._should_inline(len(text)):
+            return get_emotion_analyzer().analyze(text, context=context)
+        return await self._submit(_analyze_in_worker, text, context)
+
+    async def _analyze_many(self, texts: List[str],
+                            contexts: Optional[List[Optional[Dict]]]) -> List[EmotionResult]:
+        """批量分析文本（不查缓存）"""
+        if self._should_inline(sum(len(text) for text in texts)):
+            return get_emotion_analyzer().analyze_many(texts, contexts)
+        return await self._submit(_analyze_many_in_worker, texts, contexts)
+
+    async def analyze(self, text: str, context: Optional[Dict] = None) -> EmotionResult:
+        """分析单条文本"""
+        return (await self.analyze_many([text], [context]))[0]
+
+    async def analyze_many(self, texts: List[str],
+                           contexts: Optional[List[Optional[Dict]]] = None) -> List[EmotionResult]:
+        """批量分析文本，只有未命中缓存的文本会被分析"""
+        if contexts is None:
+            contexts = [None] * len(texts)
+        elif len(contexts) != len(texts):
+            raise ValueError("contexts must have the same length as texts")
+
+        if self.cache is None:
+            if len(texts) == 1:
+                return [await self._analyze(texts[0], contexts[0])]
+            return await self._analyze_many(texts, contexts)
+
+        analyzer = get_emotion_analyzer()
+        keys = [analyzer.cache_key(text, context) for text, context in zip(texts, contexts)]
+        cached = await self.cache.get_many(keys)
+
+        results: List[Optional[EmotionResult]] = [
+            EmotionResult.from_dict(json.loads(value)) if value is not None else None
+            for value in cached
+        ]
+        missing = [index for index, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        # 同一批中重复的文本只分析一次
+        unique: Dict[str, int] = {}
+        for index in missing:
+            unique.setdefault(keys[index], index)
+        indexes = list(unique.values())
+
+        if len(indexes) == 1:
+            fresh = [await self._analyze(texts[indexes[0]], contexts[indexes[0]])]
+        else:
+            fresh = await self._analyze_many(
+                [texts[index] for index in indexes],
+                [contexts[index] for index in indexes]
+            )
+
+        computed = dict(zip(unique, fresh))
+        for index in missing:
+            results[index] = computed[keys[index]]
+
+        await self.cache.set_many([
+            (key, json.dumps(result.to_dict(), ensure_ascii=False).encode("utf-8"))
+            for key, result in computed.items()
+        ])
+        return results
+
+
+# 全局分析执行器实例
+_analysis_executor: Optional[AnalysisExecutor] = None
+
+
+def get_analysis_executor() -> AnalysisExecutor:
+    """获取全局分析执行器实例（单例模式，配置来自环境变量）"""
+    global _analysis_executor
+    if _analysis_executor is None:
+        workers = os.getenv("WARM_AGENT_ANALYSIS_WORKERS")
+        _analysis_executor = AnalysisExecutor(
+            mode=os.getenv("WARM_AGENT_ANALYSIS_MODE", "inline"),
+            max_workers=int(workers) if workers else None,
+            max_pending=int(os.getenv("WARM_AGENT_ANALYSIS_MAX_PENDING", "64")),
+            inline_max_chars=int(os.getenv("WARM_AGENT_INLINE_MAX_CHARS", "200")),
+            queue_timeout=float(os.getenv("WARM_AGENT_ANALYSIS_QUEUE_TIMEOUT", "5")),
+            cache=get_analysis_cache()
+        )
+    return _analysis_executor
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+认证缓存模块
+按 API key 的哈希缓存 User 记录（TTL + LRU），无效 key 也做短期负缓存；
+可选通过 Redis pub/sub 把失效通知广播到所有 worker 进程
+
+缓存维护一个失效代数：调用方查库前取 ``generation()``，写入时带上，查库期间发生过失效
+（例如另一个请求刚重新生成了 key）则放弃写入，旧记录不会在失效之后被重新缓存
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from .user_manager import User
+from .metrics import AUTH_CACHE_LOOKUPS
+
+_HIT = AUTH_CACHE_LOOKUPS.labels("hit")
+_NEGATIVE_HIT = AUTH_CACHE_LOOKUPS.labels("negative_hit")
+_MISS = AUTH_CACHE_LOOKUPS.labels("miss")
+
+# Redis 为可选依赖
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+def hash_api_key(api_key: str) -> str:
+    """API key 的哈希（缓存与广播中都不出现明文 key）"""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+class AuthCache:
+    """认证缓存"""
+
+    def __init__(self, ttl: float = 30.0, negative_ttl: float = 5.0,
+                 max_size: int = 10000, redis_url: Optional[str] = None,
+                 channel: str = "warm_agent:auth_invalidate"):
+        """
+        初始化认证缓存
+
+        Args:
+            ttl: 有效 key 的缓存时间（秒）
+            negative_ttl: 无效 key 的缓存时间（秒）
+            max_size: 最多缓存的条目数（超出按 LRU 淘汰）
+            redis_url: Redis 连接URL，为空则只在本进程内失效
+            channel: 失效通知频道
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.redis_url = redis_url
+        self.channel = channel
+
+        # key 哈希 -> (过期时间, User 或 None)
+        self._entries: "OrderedDict[str, Tuple[float, Optional[User]]]" = OrderedDict()
+        # 用户ID -> key 哈希集合（按用户失效）
+        self._user_keys: Dict[str, Set[str]] = {}
+        # 失效代数：每次失效（含清空）递增
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self._redis = None
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, api_key: str) -> Tuple[bool, Optional[User]]:
+        """
+        查询缓存
+
+        Returns:
+            (是否命中, User)；命中负缓存时返回 (True, None)
+        """
+        key = hash_api_key(api_key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                _MISS.inc()
+                return False, None
+
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                _MISS.inc()
+                return False, None
+
+            self._entries.move_to_end(key)
+            if user is None:
+                self.negative_hits += 1
+                _NEGATIVE_HIT.inc()
+            else:
+                self.hits += 1
+                _HIT.inc()
+            return True, user
+
+    def generation(self) -> int:
+        """当前失效代数（查库前获取，写入时传给 ``set``）"""
+        return self._generation
+
+    def set(self, api_key: str, user: Optional[User], generation: Optional[int] = None) -> None:
+        """
+        写入缓存；user 为 None 表示无效 key
+
+        Args:
+            generation: 查库前取得的失效代数；此后发生过失效时不写入（记录可能已过时）
+        """
+        key = hash_api_key(api_key)
+        ttl = self.ttl if user is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, user)
+            if user is not None:
+                self._user_keys.setdefault(user.id, set()).add(key)
+
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str) -> None:
+        """删除条目（调用方持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[1] is None:
+            return
+        keys = self._user_keys.get(entry[1].id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[entry[1].id]
+
+    def _evict_user(self, user_id: str) -> None:
+        """在本进程内失效某用户的全部缓存"""
+        with self._lock:
+            self._generation += 1
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """失效某用户的全部缓存，并通知其他 worker"""
+        self._evict_user(user_id)
+        if self._redis is not None:
+            try:
+                self._redis.publish(self.channel, user_id)
+            except redis.RedisError as e:
+                print(f"Failed to publish auth invalidation: {e}")
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def start(self) -> None:
+        """连接 Redis 并启动失效通知监听线程（未配置 Redis 时无操作）"""
+        if not self.redis_url or not REDIS_AVAILABLE or self._listener is not None:
+            return
+
+        self._redis = redis.Redis.from_url(self.redis_url)
+        self._stop.clear()
+        self._listener = threading.Thread(
+            target=self._listen,
+            name="warm-agent-auth-cache",
+            daemon=True
+        )
+        self._listener.start()
+
+    def _listen(self) -> None:
+        """监听失效通知"""
+        while not self._stop.is_set():
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # 重新订阅期间可能漏掉通知，保守起见清空本地缓存
+                self.clear()
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self._evict_user(message["data"].decode())
+            except redis.RedisError as e:
+                print(f"Auth cache listener error: {e}")
+                self._stop.wait(1.0)
+            finally:
+                pubsub.close()
+
+    def stop(self) -> None:
+        """停止监听线程"""
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+        if self._redis is not None:
+            self._redis.close()
+            self._redis = None
+
+    def stats(self) -> Dict[str, int]:
+        """缓存状态"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+            }
+
+
+# 全局认证缓存实例
+_auth_cache: Optional[AuthCache] = None
+
+
+def get_auth_cache() -> AuthCache:
+    """获取认证缓存实例（单例，配置来自环境变量）"""
+    global _auth_cache
+    if _auth_cache is None:
+        _auth_cache = AuthCache(
+            ttl=float(os.getenv("WARM_AGENT_AUTH_CACHE_TTL", "30")),
+            negative_ttl=float(os.getenv("WARM_AGENT_AUTH_CACHE_NEGATIVE_TTL", "5")),
+            max_size=int(os.getenv("WARM_AGENT_AUTH_CACHE_SIZE", "10000")),
+            redis_url=os.getenv("REDIS_URL"),
+            channel=os.getenv("WARM_AGENT_AUTH_CACHE_CHANNEL", "warm_agent:auth_invalidate")
+        )
+    return _auth_cache
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量情感打分模块
+把情感词库编译为 关键词 -> 情感 的权重矩阵，整批文本的命中次数组成一个矩阵，
+打分、否定词衰减、程度词调整、主次情感选择与置信度都对整批做向量运算。
+
+结果须与 ``EmotionAnalyzer.analyze`` 逐位一致，因此累加一律按词表顺序逐列进行
+（``np.add.accumulate``，而不是顺序不确定的矩阵乘法/成对求和），
+最后保留两位小数时也使用 Python 的 ``round``。
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from .lexicon import LexiconMatch
+
+# NumPy 为可选依赖
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+class BatchScores:
+    """一批文本的打分结果（均为 Python 原生类型）"""
+
+    __slots__ = ("primary", "secondary", "intensity", "confidence")
+
+    def __init__(self, primary: List[str], secondary: List[List[str]],
+                 intensity: List[float], confidence: List[float]):
+        self.primary = primary
+        self.secondary = secondary
+        self.intensity = intensity
+        self.confidence = confidence
+
+
+class BatchScorer:
+    """向量化情感打分器"""
+
+    # 与 EmotionAnalyzer 中的常量一致
+    KEYWORD_WEIGHT = 0.3
+    NEGATION_DAMPING = 0.3
+    NEGATION_SHIFT = 0.2
+
+    def __init__(self, emotion_keywords: Dict[str, List[str]]):
+        """
+        编译词库
+
+        Args:
+            emotion_keywords: 情感 -> 关键词列表（顺序即累加顺序）
+        """
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("numpy is required for batch scoring")
+
+        self.emotions = list(emotion_keywords)
+        self._emotion_index = {emotion: index for index, emotion in enumerate(self.emotions)}
+
+        # 关键词列按词表顺序排列（与 LexiconIndex 中 "emotion" 词库的 rank 一致），
+        # 同一情感的词占据连续的列
+        self.keywords: List[Tuple[str, str]] = []
+        self._blocks: List[Tuple[int, int]] = []
+        for emotion in self.emotions:
+            start = len(self.keywords)
+            for word in emotion_keywords[emotion]:
+                self.keywords.append((emotion, word))
+            self._blocks.append((start, len(self.keywords)))
+
+        self.weights = np.zeros((len(self.keywords), len(self.emotions)))
+        for column, (emotion, _) in enumerate(self.keywords):
+            self.weights[column, self.emotions.index(emotion)] = self.KEYWORD_WEIGHT
+
+        self._joy = self.emotions.index("joy") if "joy" in self.emotions else -1
+        self._sadness = self.emotions.index("sadness") if "sadness" in self.emotions else -1
+
+    def _hit_counts(self, matches: List[LexiconMatch]) -> "np.ndarray":
+        """每条文本各关键词的不重叠命中次数（稀疏命中写入稠密矩阵）"""
+        counts = np.zeros((len(matches), len(self.keywords)))
+        for row, match in enumerate(matches):
+            for hit in match.entries("emotion"):
+                counts[row, hit.rank] = match.counts[("emotion", hit.label)][hit.word]
+        return counts
+
+    def _keyword_scores(self, counts: "np.ndarray") -> "np.ndarray":
+        """关键词得分：每种情感按词表顺序逐列累加"""
+        scores = np.zeros((counts.shape[0], len(self.emotions)))
+        for index, (start, end) in enumerate(self._blocks):
+            if end > start:
+                weighted = counts[:, start:end] * self.weights[start:end, index]
+                scores[:, index] = np.add.accumulate(weighted, axis=1)[:, -1]
+        return scores
+
+    def _apply_negation(self, scores: "np.ndarray",
+                        negations: Dict[int, List[str]]) -> None:
+        """
+        否定词处理（原地修改）
+
+        每条文本的否定事件按出现顺序排列；第 k 轮同时处理所有文本的第 k 个事件，
+        每条文本内的运算顺序与逐条处理相同
+        """
+        events = {
+            row: [self._emotion_index[emotion] for emotion in emotions]
+            for row, emotions in negations.items() if emotions
+        }
+        if not events:
+            return
+
+        for round_index in range(max(len(row_events) for row_events in events.values())):
+            rows = np.array([row for row, row_events in events.items() if len(row_events) > round_index])
+            emotions = np.array([row_events[round_index] for row_events in events.values()
+                                 if len(row_events) > round_index])
+            scores[rows, emotions] *= self.NEGATION_DAMPING
+            if self._joy >= 0 and self._sadness >= 0:
+                scores[rows[emotions == self._joy], self._sadness] += self.NEGATION_SHIFT
+                scores[rows[emotions == self._sadness], self._joy] += self.NEGATION_SHIFT
+
+    def score(self, texts: List[str], matches: List[LexiconMatch],
+              negations: Optional[Dict[int, List[str]]] = None) -> BatchScores:
+        """
+        对整批文本打分
+
+        Args:
+            texts: 文本（非空）
+            matches: 与文本一一对应的词库扫描结果
+            negations: 行号 -> 按出现顺序被否定的情感（只需包含有否定的文本）
+
+        Returns:
+            BatchScores: 主要情感、次要情感、强度与置信度
+        """
+        scores = self._keyword_scores(self._hit_counts(matches))
+        if negations:
+            self._apply_negation(scores, negations)
+
+        top = scores.max(axis=1)
+
+        # 强度：最高分经程度词与感叹号调整
+        def flags(kind: str, label: Optional[str] = None) -> "np.ndarray":
+            return np.fromiter((match.has(kind, label) for match in matches), bool, len(matches))
+
+        intensity = top
+        intensity = np.where(flags("intensity", "extremely"), np.minimum(1.0, intensity * 1.5), intensity)
+        intensity = np.where(flags("intensity", "very"), np.minimum(1.0, intensity * 1.2), intensity)
+        intensity = np.where(flags("intensity", "slightly"), np.maximum(0.1, intensity * 0.7), intensity)
+        intensity = np.where(flags("exclamation"), np.minimum(1.0, intensity * 1.2), intensity)
+
+        # 置信度：最高分 / 总分（总分按情感顺序累加），再按文本长度调整
+        total = np.add.accumulate(scores, axis=1)[:, -1]
+        nonzero = total != 0
+        confidence = np.divide(top, total, out=np.full_like(top, 0.5), where=nonzero)
+        lengths = np.fromiter((len(text) for text in texts), np.int64, len(texts))
+        confidence = np.where(lengths < 5, confidence * 0.8, confidence)
+        confidence = np.where(lengths > 500, confidence * 0.9, confidence)
+        confidence = np.minimum(1.0, confidence)
+
+        # 主次情感：按分数降序，同分保持情感定义顺序
+        order = np.argsort(-scores, axis=1, kind="stable")
+        secondary_ok = (scores > 0) & (scores > (top * 0.5)[:, None])
+
+        primary: List[str] = []
+        secondary: List[List[str]] = []
+        for row_top, row_order, row_ok in zip(top.tolist(), order.tolist(), secondary_ok.tolist()):
+            if row_top == 0:
+                primary.append("neutral")
+                secondary.append([])
+                continue
+            primary.append(self.emotions[row_order[0]])
+            secondary.append([
+                self.emotions[index] for index in row_order[1:]
+                if row_ok[index]
+            ][:2])
+
+        return BatchScores(
+            primary=primary,
+            secondary=secondary,
+            intensity=[round(value, 2) for value in intensity.tolist()],
+            confidence=[
+                round(value, 2) if ok else 0.5
+                for value, ok in zip(confidence.tolist(), nonzero.tolist())
+            ]
+        )
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缓存模块
+两级缓存：进程内 LRU（按条目数和字节数限额）+ 可选的共享 Redis 层。
+值统一为 bytes，两级之间无需转换；命中 Redis 时回填本地 LRU
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import CACHE_LOOKUPS
+
+# Redis 为可选依赖
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+class CacheManager:
+    """两级缓存管理器"""
+
+    def __init__(self, namespace: str, max_entries: int = 10000,
+                 max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600.0,
+                 redis_url: Optional[str] = None):
+        """
+        初始化缓存
+
+        Args:
+            namespace: 缓存命名空间（Redis key 前缀与指标标签）
+            max_entries: 本地最多缓存的条目数
+            max_bytes: 本地缓存的 key + value 总字节数上限
+            ttl: 过期时间（秒），两级共用
+            redis_url: Redis 连接URL，为空则只用本地缓存
+        """
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # key -> (过期时间, value)
+        self._local: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+
+        self._redis = None
+        if redis_url and REDIS_AVAILABLE:
+            self._redis = aioredis.Redis.from_url(redis_url)
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+        self._local_hit = CACHE_LOOKUPS.labels(namespace, "local_hit")
+        self._redis_hit = CACHE_LOOKUPS.labels(namespace, "redis_hit")
+        self._miss = CACHE_LOOKUPS.labels(namespace, "miss")
+
+    def _redis_key(self, key: str) -> str:
+        return f"warm_agent:{self.namespace}:{key}"
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        """查询本地 LRU"""
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._pop_local(key)
+            return None
+        self._local.move_to_end(key)
+        return entry[1]
+
+    def _pop_local(self, key: str) -> None:
+        entry = self._local.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(key) + len(entry[1])
+
+    def _set_local(self, key: str, value: bytes) -> None:
+        """写入本地 LRU，超出条目数或字节数时淘汰最久未用的条目"""
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+
+        self._pop_local(key)
+        self._local[key] = (time.monotonic() + self.ttl, value)
+        self._bytes += size
+
+        while len(self._local) > self.max_entries or self._bytes > self.max_bytes:
+            self._pop_local(next(iter(self._local)))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """查询缓存"""
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """批量查询缓存，本地未命中的 key 一次性 MGET"""
+        values = [self._get_local(key) for key in keys]
+        missing = [index for index, value in enumerate(values) if value is None]
+
+        self.local_hits += len(keys) - len(missing)
+        self._local_hit.inc(len(keys) - len(missing))
+
+        if missing and self._redis is not None:
+            try:
+                remote = await self._redis.mget([self._redis_key(keys[i]) for i in missing])
+            except RedisError as e:
+                self.redis_errors += 1
+                print(f"Cache redis get failed: {e}")
+                remote = [None] * len(missing)
+
+            still_missing = []
+            for index, value in zip(missing, remote):
+                if value is None:
+                    still_missing.append(index)
+                else:
+                    values[index] = value
+                    self._set_local(keys[index], value)
+            self.redis_hits += len(missing) - len(still_missing)
+            self._redis_hit.inc(len(missing) - len(still_missing))
+            missing = still_missing
+
+        self.misses += len(missing)
+        self._miss.inc(len(missing))
+        return values
+
+    async def set(self, key: str, value: bytes) -> None:
+        """写入缓存"""
+        await self.set_many([(key, value)])
+
+    async def set_many(self, items: List[Tuple[str, bytes]]) -> None:
+        """批量写入缓存（Redis 层一次 pipeline）"""
+        for key, value in items:
+            self._set_local(key, value)
+
+        if items and self._redis is not None:
+            try:
+                async with self._redis.pipeline(transaction=False) as pipe:
+                    for key, value in items:
+                        pipe.set(self._redis_key(key), value, ex=max(1, int(self.ttl)))
+                    await pipe.execute()
+            except RedisError as e:
+                self.redis_errors += 1
+                print(f"Cache redis set failed: {e}")
+
+    def clear(self) -> None:
+        """清空本地缓存"""
+        self._local.clear()
+        self._bytes = 0
+
+    async def close(self) -> None:
+        """关闭 Redis 连接"""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def stats(self) -> Dict[str, float]:
+        """缓存状态"""
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "entries": len(self._local),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "redis_errors": self.redis_errors,
+            "hit_ratio": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# 全局情感分析结果缓存
+_analysis_cache: Optional[CacheManager] = None
+
+
+def get_analysis_cache() -> Optional[CacheManager]:
+    """获取情感分析结果缓存（单例，WARM_AGENT_ANALYSIS_CACHE_SIZE=0 时禁用）"""
+    global _analysis_cache
+    max_entries = int(os.getenv("WARM_AGENT_ANALYSIS_CACHE_SIZE", "10000"))
+    if _analysis_cache is None and max_entries > 0:
+        _analysis_cache = CacheManager(
+            "emotion_analysis",
+            max_entries=max_entries,
+            max_bytes=int(os.getenv("WARM_AGENT_ANALYSIS_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            ttl=float(os.getenv("WARM_AGENT_ANALYSIS_CACHE_TTL", "3600")),
+            redis_url=os.getenv("REDIS_URL")
+        )
+    return _analysis_cache
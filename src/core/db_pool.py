@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库连接池模块
+为 psycopg2 提供线程安全的连接复用，避免每次调用都重新握手
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeoutError(RuntimeError):
+    """等待空闲连接超时"""
+
+
+class _PooledConnection:
+    """连接及其元数据"""
+
+    __slots__ = ("conn", "created_at", "last_used_at", "uses")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        self.uses = 0
+
+
+class ConnectionPool:
+    """
+    psycopg2 连接池
+
+    - 最小/最大连接数
+    - 借出时健康检查（连接已关闭则丢弃；空闲过久则先 ``SELECT 1``）
+    - 使用 N 次或存活 T 秒后回收重建
+    """
+
+    def __init__(self, database_url: str, min_size: int = 1, max_size: int = 10,
+                 max_uses: int = 5000, max_age: float = 3600.0,
+                 timeout: float = 5.0, health_check_idle: float = 30.0):
+        """
+        初始化连接池
+
+        Args:
+            database_url: 数据库连接URL
+            min_size: 最小连接数
+            max_size: 最大连接数
+            max_uses: 单个连接最多被借出的次数
+            max_age: 单个连接最长存活时间（秒）
+            timeout: 等待空闲连接的超时（秒）
+            health_check_idle: 空闲超过该时间的连接借出前先探活（秒）
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size")
+
+        self.database_url = database_url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.timeout = timeout
+        self.health_check_idle = health_check_idle
+
+        self._idle: List[_PooledConnection] = []
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._size = 0
+        self._waiting = 0
+        self._filled = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _connect(self) -> _PooledConnection:
+        """建立新连接"""
+        return _PooledConnection(psycopg2.connect(self.database_url))
+
+    def _is_expired(self, item: _PooledConnection) -> bool:
+        """连接是否需要回收"""
+        return (
+            item.conn.closed
+            or item.uses >= self.max_uses
+            or time.monotonic() - item.created_at >= self.max_age
+        )
+
+    def _is_healthy(self, item: _PooledConnection) -> bool:
+        """借出前的健康检查"""
+        if item.conn.closed:
+            return False
+        if time.monotonic() - item.last_used_at < self.health_check_idle:
+            return True
+        try:
+            with item.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            item.conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, item: _PooledConnection) -> None:
+        """关闭连接并释放名额（调用方持有锁）"""
+        self._size -= 1
+        try:
+            item.conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _fill(self) -> None:
+        """首次使用时预建最小连接数（先在锁内占用名额，在锁外建立连接）"""
+        with self._cond:
+            if self._filled:
+                return
+            self._filled = True
+            missing = max(0, self.min_size - self._size)
+            self._size += missing
+
+        created: List[_PooledConnection] = []
+        try:
+            for _ in range(missing):
+                created.append(self._connect())
+        finally:
+            with self._cond:
+                # 建立失败的名额退回，之后按需建立
+                self._size -= missing - len(created)
+                self._idle.extend(created)
+                self._cond.notify_all()
+
+    def getconn(self):
+        """借出一个连接（探活与建立连接都在锁外进行，慢连接不阻塞其他线程）"""
+        deadline = time.monotonic() + self.timeout
+
+        if not self._filled:
+            self._fill()
+
+        while True:
+            item = self._reserve(deadline)
+            if item is None:
+                break
+            if self._is_healthy(item):
+                with self._cond:
+                    return self._checkout(item)
+            with self._cond:
+                self._discard(item)
+                self._cond.notify()
+
+        try:
+            item = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            return self._checkout(item)
+
+    def _reserve(self, deadline: float) -> Optional[_PooledConnection]:
+        """
+        取出一个待探活的空闲连接；没有空闲连接但未达上限时占用一个新建名额并返回 None
+
+        Raises:
+            PoolTimeoutError: 等待超时
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+
+            while True:
+                # 优先复用最近归还的连接（LIFO）
+                while self._idle:
+                    item = self._idle.pop()
+                    if self._is_expired(item):
+                        self._discard(item)
+                        continue
+                    return item
+
+                if self._size < self.max_size:
+                    # 先占用名额，在锁外建立连接
+                    self._size += 1
+                    return None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"Timed out waiting for a database connection ({self.max_size} in use)"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _checkout(self, item: _PooledConnection):
+        """登记借出（调用方持有锁）"""
+        item.uses += 1
+        self._in_use[id(item.conn)] = item
+        return item.conn
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        """归还连接"""
+        with self._cond:
+            item = self._in_use.pop(id(conn), None)
+            if item is None:
+                return
+
+        # 未提交的事务（包括只读查询开启的事务）一律回滚（在锁外进行）
+        if not conn.closed and not discard:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        with self._cond:
+            if discard or self._closed or self._is_expired(item):
+                self._discard(item)
+            else:
+                item.last_used_at = time.monotonic()
+                self._idle.append(item)
+
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """以上下文管理器方式借用连接"""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def close(self) -> None:
+        """关闭全部空闲连接，借出中的连接归还时关闭"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        """连接池状态"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "waiting": self._waiting,
+                "max_size": self.max_size,
+            }
+
+
+def create_pool_from_env(database_url: str) -> ConnectionPool:
+    """根据环境变量创建连接池"""
+    return ConnectionPool(
+        database_url,
+        min_size=int(os.getenv("DATABASE_POOL_MIN_SIZE", "1")),
+        max_size=int(os.getenv("DATABASE_POOL_MAX_SIZE", "10")),
+        max_uses=int(os.getenv("DATABASE_POOL_MAX_USES", "5000")),
+        max_age=float(os.getenv("DATABASE_POOL_MAX_AGE", "3600")),
+        timeout=float(os.getenv("DATABASE_POOL_TIMEOUT", "5")),
+        health_check_idle=float(os.getenv("DATABASE_POOL_HEALTH_CHECK_IDLE", "30"))
+    )
@@ -7,8 +7,16 @@
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 from enum import Enum
+import os
 import re
-import jieba
+import json
+import hashlib
+
+from .batch_scoring import NUMPY_AVAILABLE, BatchScorer
+from .lexicon import LexiconMatch, get_lexicon_index
+from .metrics import StageTimer
+from .tokenizer import Token, Tokenizer
+from ..utils.compat import DATACLASS_SLOTS
 
 
 class EmotionType(Enum):
@@ -19,29 +27,54 @@ class EmotionType(Enum):
     ANXIETY = "anxiety"
     FEAR = "fear"
     NEUTRAL = "neutral"
+    SURPRISE = "surprise"
+    DISGUST = "disgust"
+    LOVE = "love"
+    GRATITUDE = "gratitude"
+    LONELINESS = "loneliness"
+
+
+# 情感名 -> EmotionType 的取值字符串（所有结果共享同一批字符串对象）
+_EMOTION_NAMES = {emotion.value: emotion.value for emotion in EmotionType}
+
 
+def _intern_emotion(name: str) -> str:
+    """已知情感名替换为 EmotionType 的取值字符串，未知的原样返回"""
+    return _EMOTION_NAMES.get(name, name)
 
-@dataclass
+
+@dataclass(**DATACLASS_SLOTS)
 class EmotionResult:
-    """情感分析结果"""
+    """
+    情感分析结果
+
+    结果会大量驻留在缓存中，因此使用 slots（Python 3.10+）、
+    情感名统一引用 EmotionType 的取值字符串、列表字段存为元组
+    """
     primary_emotion: str
-    secondary_emotions: List[str]
+    secondary_emotions: Tuple[str, ...]
     intensity: float
     confidence: float
-    keywords: List[str]
-    context_hints: List[str]
+    keywords: Tuple[str, ...]
+    context_hints: Tuple[str, ...]
     needs_support: bool
     suggested_response: str
+
+    def __post_init__(self):
+        self.primary_emotion = _intern_emotion(self.primary_emotion)
+        self.secondary_emotions = tuple(_intern_emotion(name) for name in self.secondary_emotions)
+        self.keywords = tuple(self.keywords)
+        self.context_hints = tuple(self.context_hints)
     
     def to_dict(self) -> Dict:
         """转换为字典"""
         return {
             "primary_emotion": self.primary_emotion,
-            "secondary_emotions": self.secondary_emotions,
+            "secondary_emotions": list(self.secondary_emotions),
             "intensity": self.intensity,
             "confidence": self.confidence,
-            "keywords": self.keywords,
-            "context_hints": self.context_hints,
+            "keywords": list(self.keywords),
+            "context_hints": list(self.context_hints),
             "needs_support": self.needs_support,
             "suggested_response": self.suggested_response
         }
@@ -93,20 +126,71 @@ class EmotionAnalyzer:
         "想死", "活着没意思", "没人理解", "好累", "想放弃"
     ]
     
-    def __init__(self):
-        """初始化情感分析器"""
-        # 加载jieba词典
+    # 上下文提示词
+    CONTEXT_HINT_WORDS = {
+        "time_specific": ["今天", "昨天", "刚才", "现在"],
+        "location_specific": ["家", "公司", "学校", "路上"],
+        "social_context": ["他", "她", "他们", "朋友", "家人", "同事"],
+        "life_event": ["工作", "学习", "感情", "健康", "钱", "考试"],
+    }
+    
+    # 标点提示
+    EXCLAMATION_MARKS = ["!!", "！"]
+    QUESTION_MARKS = ["?", "？"]
+    
+    # 分析逻辑变化时递增，使旧的缓存结果失效
+    CACHE_VERSION = 1
+    
+    # 分析结果是否依赖 context 参数（目前只依赖文本本身）
+    CONTEXT_SENSITIVE = False
+    
+    # 批量分析达到该条数时改用向量化打分（安装了 NumPy 时）
+    VECTORIZE_MIN_BATCH = 32
+    
+    def __init__(self, tokenizer: Optional[Tokenizer] = None):
+        """
+        初始化情感分析器
+        
+        Args:
+            tokenizer: 分词器（可选）；默认使用以情感词为自定义词的分词器，词典在首次分词时加载
+        """
+        if tokenizer is None:
+            tokenizer = Tokenizer(
+                (word for keywords in self.EMOTION_KEYWORDS.values() for word in keywords),
+                cache_dir=os.getenv("WARM_AGENT_TOKENIZER_CACHE_DIR")
+            )
+        self.tokenizer = tokenizer
+        
+        # 否定处理用：否定词集合与 关键词 -> 情感 的反向索引（按情感定义顺序）
+        self._negation_words = frozenset(self.NEGATION_WORDS)
+        self._keyword_emotions: Dict[str, Tuple[str, ...]] = {}
         for emotion, keywords in self.EMOTION_KEYWORDS.items():
-            for word in keywords:
-                jieba.add_word(word)
+            for word in dict.fromkeys(keywords):
+                self._keyword_emotions[word] = self._keyword_emotions.get(word, ()) + (emotion,)
+        
+        # 登记到共享词库索引：所有分析阶段共享一次扫描结果
+        self.lexicon = get_lexicon_index()
+        self.lexicon.register("emotion", self.EMOTION_KEYWORDS)
+        self.lexicon.register("need_support", self.NEED_SUPPORT_KEYWORDS)
+        self.lexicon.register("negation", self.NEGATION_WORDS)
+        self.lexicon.register("intensity", self.INTENSITY_MODIFIERS)
+        self.lexicon.register("context", self.CONTEXT_HINT_WORDS)
+        self.lexicon.register("exclamation", self.EXCLAMATION_MARKS)
+        self.lexicon.register("question", self.QUESTION_MARKS)
+        
+        self.batch_scorer = (
+            BatchScorer(self.EMOTION_KEYWORDS) if NUMPY_AVAILABLE else None
+        )
     
-    def analyze(self, text: str, context: Optional[Dict] = None) -> EmotionResult:
+    def analyze(self, text: str, context: Optional[Dict] = None,
+                match: Optional[LexiconMatch] = None) -> EmotionResult:
         """
         分析文本情感
         
         Args:
             text: 输入文本
             context: 上下文信息（可选）
+            match: 已有的词库扫描结果（可选，与触发器等模块共享）
             
         Returns:
             EmotionResult: 情感分析结果
@@ -114,34 +198,160 @@ class EmotionAnalyzer:
         if not text or not text.strip():
             return self._create_neutral_result()
         
+        # 0. 单次扫描全部词库
+        if match is None:
+            timer = StageTimer()
+            match = self.lexicon.scan(text)
+            timer.mark("lexicon_scan")
+        
+        return self._analyze_match(text, context, match, self._segment(text, match))
+    
+    def cache_key(self, text: str, context: Optional[Dict] = None) -> str:
+        """
+        分析结果的缓存键
+        
+        由分析逻辑版本、词库版本和文本哈希组成。文本不做空白或大小写归一化：
+        文本长度影响置信度、空白影响分词，归一化会改变结果。
+        只有分析结果依赖 context 时才把 context 计入缓存键。
+        """
+        digest = hashlib.sha256(text.encode("utf-8"))
+        if self.CONTEXT_SENSITIVE and context:
+            digest.update(b"\0")
+            digest.update(json.dumps(context, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        return f"v{self.CACHE_VERSION}:{self.lexicon.version}:{digest.hexdigest()}"
+    
+    def analyze_many(self, texts: List[str],
+                     contexts: Optional[List[Optional[Dict]]] = None) -> List[EmotionResult]:
+        """
+        批量分析文本情感
+        
+        按阶段处理整批文本：先完成全部词库扫描，再只对含否定词的文本分词，
+        最后汇总结果（批量较大时打分部分向量化）。结果与逐条调用 ``analyze`` 完全一致。
+        
+        Args:
+            texts: 输入文本列表
+            contexts: 与文本一一对应的上下文列表（可选）
+            
+        Returns:
+            List[EmotionResult]: 与输入顺序一致的分析结果
+        """
+        if contexts is None:
+            contexts = [None] * len(texts)
+        elif len(contexts) != len(texts):
+            raise ValueError("contexts must have the same length as texts")
+        
+        timer = StageTimer()
+        
+        # 1. 词库扫描
+        matches = [
+            self.lexicon.scan(text) if text and text.strip() else None
+            for text in texts
+        ]
+        timer.mark("batch_lexicon_scan")
+        
+        # 2. 分词（仅含否定词的文本）
+        tokens = {
+            index: self.tokenizer.tokenize(texts[index])
+            for index, match in enumerate(matches)
+            if match is not None and match.has("negation")
+        }
+        timer.mark("batch_tokenize")
+        
+        # 3. 向量化打分
+        rows = [index for index, match in enumerate(matches) if match is not None]
+        if self.batch_scorer is not None and len(rows) >= self.VECTORIZE_MIN_BATCH:
+            negations = {index: self._negated_emotions(stream) for index, stream in tokens.items()}
+            return self._analyze_batch(texts, contexts, matches, negations, rows)
+        
+        # 3. 汇总
+        results = []
+        for index, (text, context, match) in enumerate(zip(texts, contexts, matches)):
+            if match is None:
+                results.append(self._create_neutral_result())
+            else:
+                results.append(self._analyze_match(text, context, match, tokens.get(index)))
+        
+        return results
+    
+    def _analyze_batch(self, texts: List[str], contexts: List[Optional[Dict]],
+                       matches: List[Optional[LexiconMatch]], negations: Dict[int, List[str]],
+                       rows: List[int]) -> List[EmotionResult]:
+        """整批向量化打分，再逐条补全关键词、上下文与建议回应"""
+        timer = StageTimer()
+        
+        positions = {index: row for row, index in enumerate(rows)}
+        scores = self.batch_scorer.score(
+            [texts[index] for index in rows],
+            [matches[index] for index in rows],
+            {positions[index]: emotions for index, emotions in negations.items() if emotions}
+        )
+        timer.mark("batch_scoring")
+        
+        results = []
+        for index, (context, match) in enumerate(zip(contexts, matches)):
+            if match is None:
+                results.append(self._create_neutral_result())
+                continue
+            row = positions[index]
+            primary_emotion = scores.primary[row]
+            intensity = scores.intensity[row]
+            keywords = self._extract_keywords(match)
+            needs_support = self._check_needs_support(match, primary_emotion, intensity)
+            results.append(EmotionResult(
+                primary_emotion=primary_emotion,
+                secondary_emotions=scores.secondary[row],
+                intensity=intensity,
+                confidence=scores.confidence[row],
+                keywords=keywords,
+                context_hints=self._analyze_context(match, context),
+                needs_support=needs_support,
+                suggested_response=self._generate_suggested_response(
+                    primary_emotion, intensity, needs_support, keywords
+                )
+            ))
+        timer.mark("batch_assemble")
+        
+        return results
+    
+    def _analyze_match(self, text: str, context: Optional[Dict], matches: LexiconMatch,
+                       tokens: Optional[List[Token]] = None) -> EmotionResult:
+        """基于词库扫描结果（及分词结果，仅含否定词时需要）完成分析"""
+        timer = StageTimer()
+        
         # 1. 关键词匹配
-        emotion_scores = self._match_keywords(text)
+        emotion_scores = self._match_keywords(matches)
+        timer.mark("keyword_match")
         
         # 2. 处理否定词
-        emotion_scores = self._handle_negation(text, emotion_scores)
+        emotion_scores = self._handle_negation(emotion_scores, tokens)
+        timer.mark("negation")
         
         # 3. 计算强度
-        intensity = self._calculate_intensity(text, emotion_scores)
+        intensity = self._calculate_intensity(matches, emotion_scores)
+        timer.mark("intensity")
         
         # 4. 提取关键词
-        keywords = self._extract_keywords(text)
+        keywords = self._extract_keywords(matches)
         
         # 5. 分析上下文
-        context_hints = self._analyze_context(text, context)
+        context_hints = self._analyze_context(matches, context)
+        timer.mark("context")
         
         # 6. 确定主要情感和次要情感
         primary_emotion, secondary_emotions = self._determine_emotions(emotion_scores)
         
         # 7. 判断是否需要支持
-        needs_support = self._check_needs_support(text, primary_emotion, intensity)
+        needs_support = self._check_needs_support(matches, primary_emotion, intensity)
         
         # 8. 生成建议回应
         suggested_response = self._generate_suggested_response(
             primary_emotion, intensity, needs_support, keywords
         )
+        timer.mark("response")
         
         # 9. 计算置信度
         confidence = self._calculate_confidence(emotion_scores, text)
+        timer.mark("confidence")
         
         return EmotionResult(
             primary_emotion=primary_emotion,
@@ -154,103 +364,90 @@ class EmotionAnalyzer:
             suggested_response=suggested_response
         )
     
-    def _match_keywords(self, text: str) -> Dict[str, float]:
+    def _match_keywords(self, matches: LexiconMatch) -> Dict[str, float]:
         """匹配情感关键词"""
         scores = {emotion: 0.0 for emotion in self.EMOTION_KEYWORDS.keys()}
         
-        for emotion, keywords in self.EMOTION_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword in text:
-                    # 基础分 + 词频
-                    count = text.count(keyword)
-                    scores[emotion] += 0.3 * count
+        # 按词表顺序累加，保证浮点结果与逐词扫描一致
+        for hit in matches.entries("emotion"):
+            # 基础分 + 词频
+            scores[hit.label] += 0.3 * matches.counts[("emotion", hit.label)][hit.word]
         
         return scores
     
-    def _handle_negation(self, text: str, scores: Dict[str, float]) -> Dict[str, float]:
+    def _segment(self, text: str, matches: LexiconMatch) -> Optional[List[Token]]:
+        """分词（文本中没有任何否定词时无需分词，返回 None）"""
+        if not matches.has("negation"):
+            return None
+        return self.tokenizer.tokenize(text)
+    
+    def _negated_emotions(self, tokens: List[Token]) -> List[str]:
+        """一次线性扫描找出紧跟在否定词后的情感词，按出现顺序返回其情感"""
+        negated = []
+        previous = None
+        for token in tokens:
+            if previous in self._negation_words:
+                negated.extend(self._keyword_emotions.get(token.word, ()))
+            previous = token.word
+        return negated
+    
+    def _handle_negation(self, scores: Dict[str, float],
+                         tokens: Optional[List[Token]]) -> Dict[str, float]:
         """处理否定词"""
+        if not tokens:
+            return scores
+        
         # 简单的否定处理：如果在情感词前有否定词，降低该情感分数
-        words = list(jieba.cut(text))
-        
-        for i, word in enumerate(words):
-            if word in self.NEGATION_WORDS and i + 1 < len(words):
-                # 检查后面的词是否是情感词
-                next_word = words[i + 1]
-                for emotion, keywords in self.EMOTION_KEYWORDS.items():
-                    if next_word in keywords:
-                        scores[emotion] *= 0.3  # 降低分数
-                        # 可能转向中性或相反情感
-                        if emotion == "joy":
-                            scores["sadness"] += 0.2
-                        elif emotion == "sadness":
-                            scores["joy"] += 0.2
+        for emotion in self._negated_emotions(tokens):
+            scores[emotion] *= 0.3  # 降低分数
+            # 可能转向中性或相反情感
+            if emotion == "joy":
+                scores["sadness"] += 0.2
+            elif emotion == "sadness":
+                scores["joy"] += 0.2
         
         return scores
     
-    def _calculate_intensity(self, text: str, scores: Dict[str, float]) -> float:
+    def _calculate_intensity(self, matches: LexiconMatch,
+                             scores: Dict[str, float]) -> float:
         """计算情感强度"""
         base_intensity = max(scores.values()) if scores else 0.5
         
         # 根据程度词调整
-        for modifier in self.INTENSITY_MODIFIERS["extremely"]:
-            if modifier in text:
-                base_intensity = min(1.0, base_intensity * 1.5)
-                break
+        if matches.has("intensity", "extremely"):
+            base_intensity = min(1.0, base_intensity * 1.5)
         
-        for modifier in self.INTENSITY_MODIFIERS["very"]:
-            if modifier in text:
-                base_intensity = min(1.0, base_intensity * 1.2)
-                break
+        if matches.has("intensity", "very"):
+            base_intensity = min(1.0, base_intensity * 1.2)
         
-        for modifier in self.INTENSITY_MODIFIERS["slightly"]:
-            if modifier in text:
-                base_intensity = max(0.1, base_intensity * 0.7)
-                break
+        if matches.has("intensity", "slightly"):
+            base_intensity = max(0.1, base_intensity * 0.7)
         
         # 标点符号影响
-        if "!!" in text or "！" in text:
+        if matches.has("exclamation"):
             base_intensity = min(1.0, base_intensity * 1.2)
         
         return round(base_intensity, 2)
     
-    def _extract_keywords(self, text: str) -> List[str]:
+    def _extract_keywords(self, matches: LexiconMatch) -> List[str]:
         """提取关键词"""
         keywords = []
         
-        # 提取情感关键词
-        for emotion_words in self.EMOTION_KEYWORDS.values():
-            for word in emotion_words:
-                if word in text and word not in keywords:
-                    keywords.append(word)
-        
-        # 提取需求关键词
-        for word in self.NEED_SUPPORT_KEYWORDS:
-            if word in text and word not in keywords:
-                keywords.append(word)
+        # 提取情感关键词，再提取需求关键词
+        for hit in matches.entries("emotion") + matches.entries("need_support"):
+            if hit.word not in keywords:
+                keywords.append(hit.word)
         
         return keywords[:5]  # 最多返回5个关键词
     
-    def _analyze_context(self, text: str, context: Optional[Dict]) -> List[str]:
+    def _analyze_context(self, matches: LexiconMatch,
+                         context: Optional[Dict]) -> List[str]:
         """分析上下文"""
-        hints = []
-        
-        # 时间上下文
-        if any(word in text for word in ["今天", "昨天", "刚才", "现在"]):
-            hints.append("time_specific")
-        
-        # 地点上下文
-        if any(word in text for word in ["家", "公司", "学校", "路上"]):
-            hints.append("location_specific")
-        
-        # 人物上下文
-        if any(word in text for word in ["他", "她", "他们", "朋友", "家人", "同事"]):
-            hints.append("social_context")
-        
-        # 事件上下文
-        if any(word in text for word in ["工作", "学习", "感情", "健康", "钱", "考试"]):
-            hints.append("life_event")
-        
-        return hints
+        # 时间、地点、人物、事件上下文
+        return [
+            hint for hint in self.CONTEXT_HINT_WORDS
+            if matches.has("context", hint)
+        ]
     
     def _determine_emotions(self, scores: Dict[str, float]) -> Tuple[str, List[str]]:
         """确定主要情感和次要情感"""
@@ -269,7 +466,8 @@ class EmotionAnalyzer:
         
         return primary, secondary[:2]  # 最多2个次要情感
     
-    def _check_needs_support(self, text: str, primary_emotion: str, intensity: float) -> bool:
+    def _check_needs_support(self, matches: LexiconMatch,
+                             primary_emotion: str, intensity: float) -> bool:
         """判断是否需要情感支持"""
         # 高强度负面情绪
         if primary_emotion in ["sadness", "anger", "anxiety", "fear", "loneliness"]:
@@ -277,12 +475,11 @@ class EmotionAnalyzer:
                 return True
         
         # 需求关键词
-        for keyword in self.NEED_SUPPORT_KEYWORDS:
-            if keyword in text:
-                return True
+        if matches.has("need_support"):
+            return True
         
         # 疑问句可能需要支持
-        if "?" in text or "？" in text:
+        if matches.has("question"):
             if primary_emotion in ["sadness", "anxiety", "confusion"]:
                 return True
         
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+情感历史模块
+定长环形缓冲区：情感按小整数编码、强度为 float32、时间为 Unix 秒，
+各情感计数与强度总和随写入增量维护，摘要查询为 O(1)
+"""
+
+import sys
+import time
+import struct
+from array import array
+from typing import Iterator, List, Optional, Tuple
+
+from .emotion_analyzer import EmotionType
+
+# 情感编码：EmotionType 的定义顺序（只能在末尾追加，已序列化的编码不可变）
+EMOTION_NAMES: Tuple[str, ...] = tuple(emotion.value for emotion in EmotionType)
+EMOTION_CODES = {name: code for code, name in enumerate(EMOTION_NAMES)}
+NEUTRAL_CODE = EMOTION_CODES["neutral"]
+
+# 序列化头：记录条数(uint16)、计数个数(uint16)、强度总和(float64)，小端序
+_HEADER = struct.Struct("<HHd")
+
+
+class EmotionHistory:
+    """定长情感历史"""
+
+    __slots__ = ("capacity", "_codes", "_intensities", "_timestamps",
+                 "_head", "_size", "_counts", "_intensity_sum")
+
+    def __init__(self, capacity: int = 50):
+        """
+        初始化历史
+
+        Args:
+            capacity: 保留的最近记录条数
+        """
+        self.capacity = capacity
+        self._codes = array("B", bytes(capacity))
+        self._intensities = array("f", bytes(4 * capacity))
+        self._timestamps = array("I", bytes(4 * capacity))
+        # 下一个写入位置与当前条数
+        self._head = 0
+        self._size = 0
+        self._counts = array("I", bytes(4 * len(EMOTION_NAMES)))
+        self._intensity_sum = 0.0
+
+    def append(self, emotion: str, intensity: float, timestamp: Optional[int] = None) -> None:
+        """追加一条记录（已满时覆盖最旧的一条）"""
+        code = EMOTION_CODES.get(emotion, NEUTRAL_CODE)
+        head = self._head
+
+        if self._size == self.capacity:
+            self._counts[self._codes[head]] -= 1
+            self._intensity_sum -= self._intensities[head]
+        else:
+            self._size += 1
+
+        self._codes[head] = code
+        self._intensities[head] = intensity
+        self._timestamps[head] = int(time.time()) if timestamp is None else timestamp
+        self._counts[code] += 1
+        # 以实际存入的 float32 值累加，淘汰时才能精确扣回
+        self._intensity_sum += self._intensities[head]
+        self._head = (head + 1) % self.capacity
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Tuple[str, float, int]]:
+        """按时间顺序（旧到新）遍历 (情感, 强度, 时间戳)"""
+        start = (self._head - self._size) % self.capacity
+        for offset in range(self._size):
+            index = (start + offset) % self.capacity
+            yield (EMOTION_NAMES[self._codes[index]],
+                   self._intensities[index],
+                   self._timestamps[index])
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, EmotionHistory):
+            return NotImplemented
+        return self.capacity == other.capacity and list(self) == list(other)
+
+    def count(self, emotion: str) -> int:
+        """某情感在窗口内出现的次数"""
+        code = EMOTION_CODES.get(emotion)
+        return 0 if code is None else self._counts[code]
+
+    def most_common(self) -> Optional[Tuple[str, int]]:
+        """
+        出现最多的情感及次数（无记录时返回 None）
+
+        并列时取窗口内最早出现的情感（与 ``Counter.most_common`` 一致），
+        只有出现并列时才需要遍历窗口
+        """
+        if not self._size:
+            return None
+        best = max(self._counts)
+        tied = [code for code, count in enumerate(self._counts) if count == best]
+        if len(tied) > 1:
+            tied = [next(code for code in self._ordered(self._codes) if self._counts[code] == best)]
+        return EMOTION_NAMES[tied[0]], best
+
+    def mean_intensity(self) -> float:
+        """窗口内的平均强度"""
+        return self._intensity_sum / self._size if self._size else 0.0
+
+    def recent(self, n: int) -> List[str]:
+        """最近 n 条记录的情感（旧到新）"""
+        n = min(n, self._size)
+        return [
+            EMOTION_NAMES[self._codes[(self._head - n + offset) % self.capacity]]
+            for offset in range(n)
+        ]
+
+    def _ordered(self, values: array) -> array:
+        """按时间顺序（旧到新）取出窗口内的值"""
+        if self._size < self.capacity:
+            return values[:self._size]
+        return values[self._head:] + values[:self._head]
+
+    def to_bytes(self) -> bytes:
+        """
+        打包为 头 + 编码(uint8) + 强度(float32) + 时间戳(uint32) + 各情感计数(uint32)，小端序
+
+        记录按时间顺序排列；计数与强度总和一并保存，还原时无需重新累加
+        """
+        codes = self._ordered(self._codes)
+        intensities = self._ordered(self._intensities)
+        timestamps = self._ordered(self._timestamps)
+        counts = array("I", self._counts)
+        if sys.byteorder == "big":
+            intensities.byteswap()
+            timestamps.byteswap()
+            counts.byteswap()
+        header = _HEADER.pack(self._size, len(counts), self._intensity_sum)
+        return (header + codes.tobytes() + intensities.tobytes()
+                + timestamps.tobytes() + counts.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes, capacity: int = 50) -> "EmotionHistory":
+        """从 ``to_bytes`` 的结果还原（超出容量时只保留最新的记录）"""
+        size, kinds, intensity_sum = _HEADER.unpack_from(data)
+        offset = _HEADER.size
+        codes = array("B", data[offset:offset + size])
+        offset += size
+        intensities = array("f", data[offset:offset + 4 * size])
+        offset += 4 * size
+        timestamps = array("I", data[offset:offset + 4 * size])
+        offset += 4 * size
+        counts = array("I", data[offset:offset + 4 * kinds])
+        if sys.byteorder == "big":
+            intensities.byteswap()
+            timestamps.byteswap()
+            counts.byteswap()
+
+        history = cls(capacity)
+        if size > capacity:
+            # 容量变小：重放最新的记录，计数随之重算
+            for code, intensity, timestamp in zip(codes[-capacity:], intensities[-capacity:],
+                                                  timestamps[-capacity:]):
+                history.append(EMOTION_NAMES[code], intensity, timestamp)
+            return history
+
+        # 记录已按时间顺序排列，直接放到环的开头；情感编码只在末尾追加，新增的计数补 0
+        history._codes[:size] = codes
+        history._intensities[:size] = intensities
+        history._timestamps[:size] = timestamps
+        history._counts[:kinds] = counts
+        history._size = size
+        history._head = size % capacity
+        history._intensity_sum = intensity_sum
+        return history
@@ -0,0 +1,277 @@
+"""
+词库匹配模块 - Warm Agent核心模块
+
+提供基于 Aho-Corasick 自动机的多模式关键词匹配，一次扫描文本即可找出
+所有词库命中（含类别与位置），匹配耗时与文本长度线性相关，与词库大小无关。
+
+``LexiconIndex`` 汇总情感分析器、触发器等模块的全部词库，每条消息只扫描一次，
+各模块从同一个 ``LexiconMatch`` 中读取属于自己的命中。
+"""
+
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 多模式匹配自动机"""
+
+    def __init__(self):
+        """初始化自动机"""
+        # 状态0为根节点
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[str, Any]]] = [[]]
+        self._built = True
+
+    def add(self, word: str, category: Any) -> None:
+        """
+        添加关键词
+
+        同一个词可以属于多个类别，每个类别都会单独产生一次命中。
+        """
+        if not word:
+            return
+
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+
+        self._outputs[state].append((word, category))
+        self._built = False
+
+    def add_many(self, words: Iterable[str], category: Any) -> None:
+        """批量添加同一类别的关键词"""
+        for word in words:
+            self.add(word, category)
+
+    def build(self) -> "KeywordAutomaton":
+        """构建失败指针（BFS），并把后缀状态的输出合并到当前状态"""
+        queue = []
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+
+                # 长词在前，短词（后缀）在后
+                self._outputs[next_state] = (
+                    self._outputs[next_state] + self._outputs[self._fail[next_state]]
+                )
+
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[str, Any, int]]:
+        """
+        单次扫描文本，逐个产出（可重叠的）命中 ``(word, category, start)``
+
+        命中按结束位置排序，同一结束位置时长词在前。
+        """
+        if not self._built:
+            self.build()
+
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            if outputs[state]:
+                end = index + 1
+                for word, category in outputs[state]:
+                    yield word, category, end - len(word)
+
+
+class LexiconHit(NamedTuple):
+    """词库命中（带词库类型）"""
+    word: str
+    kind: str
+    label: Optional[str]
+    rank: int
+    start: int
+
+    @property
+    def end(self) -> int:
+        """命中结束位置（不含）"""
+        return self.start + len(self.word)
+
+
+class LexiconMatch:
+    """
+    单条文本的词库扫描结果
+
+    所有派生视图都按需计算并缓存，多个模块共享同一个实例。
+    """
+
+    def __init__(self, text: str, hits: List[LexiconHit]):
+        self.text = text
+        self.hits = hits
+        self._counts: Optional[Dict[Tuple[str, Optional[str]], Dict[str, int]]] = None
+        self._entries: Optional[Dict[str, List[LexiconHit]]] = None
+        self._first_start: Optional[Dict[str, int]] = None
+
+    @property
+    def counts(self) -> Dict[Tuple[str, Optional[str]], Dict[str, int]]:
+        """按（类型, 标签）汇总的命中词及其不重叠次数（与 ``str.count`` 一致）"""
+        if self._counts is None:
+            counts: Dict[Tuple[str, Optional[str]], Dict[str, int]] = {}
+            last_end: Dict[Tuple[str, Optional[str], str], int] = {}
+            for hit in self.hits:
+                key = (hit.kind, hit.label, hit.word)
+                if hit.start >= last_end.get(key, 0):
+                    words = counts.setdefault((hit.kind, hit.label), {})
+                    words[hit.word] = words.get(hit.word, 0) + 1
+                    last_end[key] = hit.end
+            self._counts = counts
+        return self._counts
+
+    def has(self, kind: str, label: Optional[str] = None) -> bool:
+        """是否命中某类型（及标签）的词"""
+        return (kind, label) in self.counts
+
+    def entries(self, kind: str) -> List[LexiconHit]:
+        """
+        按词表顺序返回某类型下命中的词表条目
+
+        每个条目只返回首次出现的命中；词表中重复的条目会分别返回。
+        """
+        if self._entries is None:
+            first: Dict[Tuple[str, int], LexiconHit] = {}
+            for hit in self.hits:
+                key = (hit.kind, hit.rank)
+                if key not in first or hit.start < first[key].start:
+                    first[key] = hit
+            entries: Dict[str, List[LexiconHit]] = {}
+            for hit in sorted(first.values(), key=lambda h: h.rank):
+                entries.setdefault(hit.kind, []).append(hit)
+            self._entries = entries
+        return self._entries.get(kind, [])
+
+    def first_start(self, word: str) -> int:
+        """词在文本中首次出现的位置，未出现返回 -1（与 ``str.find`` 一致）"""
+        if self._first_start is None:
+            first_start: Dict[str, int] = {}
+            for hit in self.hits:
+                if hit.start < first_start.get(hit.word, len(self.text) + 1):
+                    first_start[hit.word] = hit.start
+            self._first_start = first_start
+        return self._first_start.get(word, -1)
+
+    def first_end(self, kind: str) -> Optional[int]:
+        """某类型命中中最早的结束位置"""
+        ends = [hit.end for hit in self.entries(kind)]
+        return min(ends) if ends else None
+
+
+LexiconEntries = Union[List[str], Dict[Optional[str], List[str]]]
+
+
+class LexiconIndex:
+    """
+    共享词库索引
+
+    各模块通过 ``register`` 登记自己的词库（按类型区分），索引把全部词库编译进
+    同一个自动机；``scan`` 对每条文本只做一次扫描。
+    """
+
+    def __init__(self):
+        self._lexicons: Dict[str, Dict[Optional[str], List[str]]] = {}
+        self._automaton: Optional[KeywordAutomaton] = None
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, entries: LexiconEntries) -> None:
+        """
+        登记词库
+
+        Args:
+            kind: 词库类型（同类型重复登记会覆盖）
+            entries: 词列表，或 标签 -> 词列表 的字典
+        """
+        if not isinstance(entries, dict):
+            entries = {None: entries}
+        entries = {label: list(words) for label, words in entries.items()}
+
+        with self._lock:
+            if self._lexicons.get(kind) == entries:
+                return
+            self._lexicons[kind] = entries
+            self._automaton = None
+            self._version = None
+
+    @property
+    def version(self) -> str:
+        """
+        词库内容的哈希
+
+        与登记顺序无关、跨进程稳定；任何词库变化都会得到新的版本号，
+        可用作分析结果缓存键的一部分。
+        """
+        version = self._version
+        if version is None:
+            with self._lock:
+                payload = json.dumps(
+                    {kind: list(entries.items()) for kind, entries in self._lexicons.items()},
+                    ensure_ascii=False, sort_keys=True
+                )
+                version = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+                self._version = version
+        return version
+
+    def _build(self) -> KeywordAutomaton:
+        """编译全部词库"""
+        with self._lock:
+            if self._automaton is None:
+                automaton = KeywordAutomaton()
+                for kind, entries in self._lexicons.items():
+                    rank = 0
+                    for label, words in entries.items():
+                        for word in words:
+                            automaton.add(word, (kind, label, rank))
+                            rank += 1
+                self._automaton = automaton.build()
+            return self._automaton
+
+    def scan(self, text: str) -> LexiconMatch:
+        """扫描文本，返回全部词库的命中"""
+        automaton = self._automaton or self._build()
+        hits = [
+            LexiconHit(word, kind, label, rank, start)
+            for word, (kind, label, rank), start in automaton.iter_matches(text)
+        ]
+        return LexiconMatch(text, hits)
+
+
+# 全局词库索引
+_lexicon_index: Optional[LexiconIndex] = None
+
+
+def get_lexicon_index() -> LexiconIndex:
+    """获取全局共享词库索引（单例模式）"""
+    global _lexicon_index
+    if _lexicon_index is None:
+        _lexicon_index = LexiconIndex()
+    return _lexicon_index
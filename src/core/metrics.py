@@ -0,0 +1,231 @@
+"""
+监控指标 - Warm Agent核心模块
+
+基于 prometheus-client 暴露以下指标：
+
+- HTTP 请求耗时直方图（按方法、路由、状态码）
+- 情感分析各阶段耗时
+- 数据库调用耗时（按 UserManager 方法）
+- 连接池、缓存、后台队列等运行状态
+
+uvicorn 多 worker 部署时需设置 ``PROMETHEUS_MULTIPROC_DIR``（启动前清空该目录），
+``/metrics`` 会汇总所有 worker 的数据。未安装 prometheus-client 时所有指标均为空操作。
+"""
+
+import os
+import time
+import asyncio
+import functools
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+        REGISTRY, generate_latest, multiprocess
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# 分析阶段耗时多在微秒到毫秒级
+STAGE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1)
+
+
+class _NullMetric:
+    """未安装 prometheus-client 时的空指标"""
+
+    def labels(self, *args, **kwargs) -> "_NullMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+
+def _histogram(name: str, documentation: str, labels: Tuple[str, ...], **kwargs):
+    if not PROMETHEUS_AVAILABLE:
+        return _NullMetric()
+    return Histogram(name, documentation, labels, **kwargs)
+
+
+def _counter(name: str, documentation: str, labels: Tuple[str, ...]):
+    if not PROMETHEUS_AVAILABLE:
+        return _NullMetric()
+    return Counter(name, documentation, labels)
+
+
+def _gauge(name: str, documentation: str, labels: Tuple[str, ...] = ()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NullMetric()
+    # 多进程模式下对存活 worker 求和
+    return Gauge(name, documentation, labels, multiprocess_mode="livesum")
+
+
+HTTP_REQUEST_SECONDS = _histogram(
+    "warm_agent_http_request_duration_seconds",
+    "HTTP request latency",
+    ("method", "endpoint", "status")
+)
+
+ANALYSIS_STAGE_SECONDS = _histogram(
+    "warm_agent_analysis_stage_duration_seconds",
+    "Time spent in each EmotionAnalyzer stage",
+    ("stage",),
+    buckets=STAGE_BUCKETS
+)
+
+DB_CALL_SECONDS = _histogram(
+    "warm_agent_db_call_duration_seconds",
+    "Database call latency per UserManager method",
+    ("method",)
+)
+
+DB_CALL_ERRORS = _counter(
+    "warm_agent_db_call_errors_total",
+    "Failed database calls per UserManager method",
+    ("method",)
+)
+
+AUTH_CACHE_LOOKUPS = _counter(
+    "warm_agent_auth_cache_lookups_total",
+    "Auth cache lookups by result",
+    ("result",)
+)
+
+CACHE_LOOKUPS = _counter(
+    "warm_agent_cache_lookups_total",
+    "Result cache lookups by tier",
+    ("cache", "result")
+)
+
+CACHE_BYTES = _gauge(
+    "warm_agent_cache_bytes",
+    "Approximate local cache footprint in bytes",
+    ("cache",)
+)
+
+DB_POOL_CONNECTIONS = _gauge(
+    "warm_agent_db_pool_connections",
+    "Database pool connections by state",
+    ("state",)
+)
+
+QUEUE_DEPTH = _gauge(
+    "warm_agent_queue_depth",
+    "Pending items in background queues",
+    ("queue",)
+)
+
+INTERACTIONS_DROPPED = _gauge(
+    "warm_agent_interactions_dropped",
+    "Interaction records dropped because the recorder queue was full"
+)
+
+SESSIONS_RESIDENT = _gauge(
+    "warm_agent_sessions_resident",
+    "Sessions held by the in-process session store"
+)
+
+SESSION_EVICTIONS = _counter(
+    "warm_agent_session_evictions_total",
+    "Sessions removed from the in-process store by reason",
+    ("reason",)
+)
+
+USAGE_EVENTS_DROPPED = _gauge(
+    "warm_agent_usage_events_dropped",
+    "Usage events dropped because the buffer was full"
+)
+
+
+class StageTimer:
+    """按阶段记录耗时：每次 ``mark`` 记录距上一次 ``mark`` 的时间"""
+
+    __slots__ = ("_last",)
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        _stage_histogram(stage).observe(now - self._last)
+        self._last = now
+
+
+@functools.lru_cache(maxsize=None)
+def _stage_histogram(stage: str):
+    """缓存每个阶段的子指标，避免重复查找标签"""
+    return ANALYSIS_STAGE_SECONDS.labels(stage)
+
+
+def timed_db_call(method: str) -> Callable:
+    """装饰器：记录数据库方法（同步或异步）的耗时与失败次数"""
+    histogram = DB_CALL_SECONDS.labels(method)
+    errors = DB_CALL_ERRORS.labels(method)
+
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    errors.inc()
+                    raise
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+
+def set_pool_stats(stats: Dict[str, int]) -> None:
+    """更新连接池状态"""
+    for state, value in stats.items():
+        DB_POOL_CONNECTIONS.labels(state).set(value)
+
+
+def set_queue_depth(queue: str, depth: int) -> None:
+    """更新后台队列深度"""
+    QUEUE_DEPTH.labels(queue).set(depth)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """生成 /metrics 响应体与 Content-Type"""
+    if not PROMETHEUS_AVAILABLE:
+        return b"", CONTENT_TYPE_LATEST
+
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: Optional[int] = None) -> None:
+    """worker 退出时清理其多进程指标文件"""
+    if PROMETHEUS_AVAILABLE and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid or os.getpid())
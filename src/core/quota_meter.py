@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+额度计量模块
+长连接（如 WebSocket）按块预留额度：每用完一块才访问一次数据库，
+连接结束时退还预留但未使用的部分
+"""
+
+from typing import Dict, Optional
+
+
+class QuotaMeter:
+    """按块预留的额度计量器（每个连接一个实例）"""
+
+    def __init__(self, user_manager, api_key: str, chunk: int = 20):
+        """
+        初始化计量器
+
+        Args:
+            user_manager: 用户管理器（提供 ``consume_quota`` / ``refund_quota``）
+            api_key: 用户API Key
+            chunk: 每次向数据库预留的额度
+        """
+        self.user_manager = user_manager
+        self.api_key = api_key
+        self.chunk = max(1, chunk)
+
+        # 已预留未使用的额度，以及最近一次预留后数据库中的剩余额度
+        self.reserved = 0
+        self.db_remaining = 0
+        self.used = 0
+        self.reservations = 0
+
+    @property
+    def remaining(self) -> int:
+        """用户实际剩余额度（数据库剩余 + 本连接未用的预留）"""
+        return self.db_remaining + self.reserved
+
+    async def consume(self, cost: int = 1) -> Optional[int]:
+        """
+        扣减额度
+
+        Returns:
+            剩余额度；额度不足时返回 None
+        """
+        if self.reserved < cost:
+            if not await self._reserve(cost - self.reserved):
+                return None
+
+        self.reserved -= cost
+        self.used += cost
+        return self.remaining
+
+    def unconsume(self, cost: int = 1) -> None:
+        """撤销一次扣减（请求未能完成时），额度回到预留中，由 ``release`` 一并退还"""
+        cost = min(cost, self.used)
+        self.used -= cost
+        self.reserved += cost
+
+    async def _reserve(self, needed: int) -> bool:
+        """向数据库预留额度；整块不足时退回到只预留所需部分"""
+        for amount in (max(self.chunk, needed), needed):
+            remaining = await self.user_manager.consume_quota(self.api_key, amount)
+            if remaining is not None:
+                self.reserved += amount
+                self.db_remaining = remaining
+                self.reservations += 1
+                return True
+            if amount == needed:
+                break
+        return False
+
+    async def release(self) -> int:
+        """退还未使用的预留额度，返回退还的数量"""
+        refund, self.reserved = self.reserved, 0
+        if refund > 0:
+            await self.user_manager.refund_quota(self.api_key, refund)
+            self.db_remaining += refund
+        return refund
+
+    def stats(self) -> Dict[str, int]:
+        """计量状态"""
+        return {
+            "used": self.used,
+            "reserved": self.reserved,
+            "remaining": self.remaining,
+            "reservations": self.reservations,
+        }
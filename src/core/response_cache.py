@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+温暖回应缓存模块
+按（情感签名, 风格, 表情级别, 基础回应摘要）缓存已渲染的回应。
+每个 key 保留一个定长的变体池，命中时从池中随机取一个，回复仍有变化；
+变体用（渲染参数, 下标）派生的种子渲染，池的内容与请求顺序、进程无关
+"""
+
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .emotion_analyzer import EmotionResult
+from .metrics import CACHE_LOOKUPS
+
+# 渲染时比较强度的阈值：同一区间内的强度渲染行为完全相同
+INTENSITY_EDGES = (0.3, 0.4, 0.6, 0.7)
+
+# (情感, 强度区间, 是否需要支持)
+EmotionSignature = Tuple[str, int, bool]
+
+
+def emotion_signature(emotion_result: EmotionResult) -> EmotionSignature:
+    """情感签名（渲染只依赖这三项）"""
+    return (
+        emotion_result.primary_emotion,
+        bisect_left(INTENSITY_EDGES, emotion_result.intensity),
+        bool(emotion_result.needs_support)
+    )
+
+
+class _Variants:
+    """一个 key 下的变体池"""
+
+    __slots__ = ("elements", "variants", "size")
+
+    def __init__(self, elements: Tuple[str, ...], count: int):
+        self.elements = elements
+        # (回应文本, 不含强度加分的温暖度)，未渲染的位置为 None
+        self.variants: List[Optional[Tuple[str, float]]] = [None] * count
+        self.size = 0
+
+
+class ResponseVariantCache:
+    """温暖回应变体缓存（LRU，线程安全）"""
+
+    def __init__(self, max_entries: int = 10000, variants: int = 8):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最多缓存的 key 数（超出按 LRU 淘汰）
+            variants: 每个 key 的变体池大小
+        """
+        if max_entries < 1 or variants < 1:
+            raise ValueError("Invalid cache size")
+
+        self.max_entries = max_entries
+        self.variants = variants
+
+        self._entries: "OrderedDict[tuple, _Variants]" = OrderedDict()
+        self._bytes = 0
+        self._variant_count = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # 命中路径只有几微秒，指标按增量在采样时上报，不在每次查询时更新
+        self._reported_hits = 0
+        self._reported_misses = 0
+        self._hit = CACHE_LOOKUPS.labels("warm_response", "local_hit")
+        self._miss = CACHE_LOOKUPS.labels("warm_response", "miss")
+
+    def get(self, key: tuple, index: int) -> Optional[Tuple[Tuple[str, ...], Tuple[str, float]]]:
+        """
+        查询变体
+
+        Returns:
+            (个性化元素, (回应文本, 温暖度))；未命中返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            variant = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                variant = entry.variants[index]
+            if variant is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.elements, variant
+
+    def put(self, key: tuple, index: int, elements: Tuple[str, ...],
+            variant: Tuple[str, float]) -> None:
+        """写入变体，超出条目数时淘汰最久未用的 key"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Variants(elements, self.variants)
+            else:
+                self._entries.move_to_end(key)
+            if entry.variants[index] is None:
+                entry.size += 1
+                self._variant_count += 1
+                self._bytes += len(variant[0].encode("utf-8"))
+            entry.variants[index] = variant
+
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= sum(
+                    len(text.encode("utf-8")) for text, _ in filter(None, evicted.variants)
+                )
+                self._variant_count -= evicted.size
+                self.evictions += 1
+
+    def report_metrics(self) -> None:
+        """把上次上报以来的命中与未命中次数计入 Prometheus 指标"""
+        with self._lock:
+            hits, self._reported_hits = self.hits - self._reported_hits, self.hits
+            misses, self._reported_misses = self.misses - self._reported_misses, self.misses
+        self._hit.inc(hits)
+        self._miss.inc(misses)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._variant_count = 0
+
+    def stats(self) -> Dict[str, float]:
+        """缓存状态"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "variants": self._variant_count,
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
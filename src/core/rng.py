@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可复现随机数模块
+回应生成中的随机选择可改由种子决定：种子取自 (user_id, 文本, 日期) 的哈希，
+相同输入当天得到逐字节相同的输出，便于缓存与去重
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+_MASK64 = (1 << 64) - 1
+
+
+def stable_seed(*parts) -> int:
+    """多个值的稳定 64 位哈希（与进程、PYTHONHASHSEED 无关）"""
+    data = "\x1f".join("" if part is None else str(part) for part in parts)
+    return int.from_bytes(hashlib.blake2b(data.encode(), digest_size=8).digest(), "little")
+
+
+def response_seed(user_id: Optional[str], text: str, day: Optional[str] = None) -> int:
+    """回应种子：同一用户、同一文本在同一天（UTC）内相同"""
+    if day is None:
+        day = datetime.now(timezone.utc).date().isoformat()
+    return stable_seed(user_id, text, day)
+
+
+class SeededRNG:
+    """
+    SplitMix64 随机数生成器
+
+    只实现回应生成用到的 ``random()`` 与 ``choice()``，与 ``random`` 模块可互换；
+    每次请求新建一个，比构造 ``random.Random`` 便宜得多
+    """
+
+    __slots__ = ("_state",)
+
+    def __init__(self, seed: int):
+        self._state = seed & _MASK64
+
+    def _next(self) -> int:
+        self._state = (self._state + 0x9E3779B97F4A7C15) & _MASK64
+        z = self._state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+        return z ^ (z >> 31)
+
+    def random(self) -> float:
+        """[0, 1) 均匀分布"""
+        return (self._next() >> 11) * (1.0 / (1 << 53))
+
+    def choice(self, seq: Sequence[T]) -> T:
+        """从非空序列中随机选择一个元素"""
+        if not seq:
+            raise IndexError("Cannot choose from an empty sequence")
+        return seq[self._next() % len(seq)]
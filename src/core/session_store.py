@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话状态存储模块
+保存每个用户/会话的温暖模式、偏好与近期情感。状态以紧凑的 JSON 数组序列化，
+可选后端：进程内 LRU + TTL（有界，默认）或 Redis（多 worker 共享）
+
+每个会话带一个版本号，``compare_and_set`` 只在存储中的版本与读取时一致时写入（乐观并发），
+调用方在冲突时重新读取并在最新状态上重放自己的修改
+"""
+
+import os
+import json
+import base64
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .emotion_history import EmotionHistory
+from .metrics import SESSION_EVICTIONS
+
+# Redis 为可选依赖
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# 每个会话保留的情感记录条数
+HISTORY_LIMIT = 50
+
+
+@dataclass
+class SessionState:
+    """会话状态（时间为 Unix 时间戳，偏好只保存与默认值不同的部分）"""
+    warm_mode: bool = False
+    preferences: Dict = field(default_factory=dict)
+    interaction_count: int = 0
+    last_interaction: Optional[float] = None
+    emotion_history: EmotionHistory = field(
+        default_factory=lambda: EmotionHistory(HISTORY_LIMIT)
+    )
+    # 读取时存储中的版本（0 表示尚不存在），由存储维护，不参与序列化
+    version: int = field(default=0, compare=False, repr=False)
+    # 本次处理对状态所做的修改（不序列化），写回冲突时在最新状态上重放
+    changes: List[Callable[["SessionState"], None]] = field(
+        default_factory=list, compare=False, repr=False
+    )
+
+    def apply(self, change: Callable[["SessionState"], None]) -> None:
+        """执行并记录一项修改"""
+        change(self)
+        self.changes.append(change)
+
+    def replay(self, changes: List[Callable[["SessionState"], None]]) -> None:
+        """在本状态上重放其他副本的修改"""
+        for change in changes:
+            self.apply(change)
+
+    def touch(self) -> None:
+        """记录一次交互"""
+        self.interaction_count += 1
+        self.last_interaction = time.time()
+
+    def record_emotion(self, emotion: str, intensity: float) -> None:
+        """追加情感记录，只保留最近 HISTORY_LIMIT 条"""
+        self.emotion_history.append(emotion, intensity)
+
+    def to_bytes(self) -> bytes:
+        """序列化为紧凑的 JSON 数组（情感历史为打包后的 base64）"""
+        return json.dumps(
+            [int(self.warm_mode), self.preferences, self.interaction_count,
+             self.last_interaction,
+             base64.b64encode(self.emotion_history.to_bytes()).decode()],
+            ensure_ascii=False,
+            separators=(",", ":")
+        ).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, version: int = 0) -> "SessionState":
+        """从 ``to_bytes`` 的结果还原"""
+        warm_mode, preferences, count, last_interaction, history = json.loads(data)
+        return cls(
+            warm_mode=bool(warm_mode),
+            preferences=preferences,
+            interaction_count=count,
+            last_interaction=last_interaction,
+            emotion_history=EmotionHistory.from_bytes(base64.b64decode(history), HISTORY_LIMIT),
+            version=version
+        )
+
+
+class MemorySessionStore:
+    """进程内会话存储（LRU + TTL，条目数有上限）"""
+
+    def __init__(self, max_sessions: int = 10000, ttl: float = 86400.0):
+        """
+        初始化存储
+
+        Args:
+            max_sessions: 最多保留的会话数（超出按 LRU 淘汰）
+            ttl: 会话闲置多久后过期（秒）
+        """
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+
+        # 会话键 -> (过期时间, 序列化状态, 版本)
+        self._entries: "OrderedDict[str, Tuple[float, bytes, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.conflicts = 0
+
+    def get(self, key: str) -> Optional[SessionState]:
+        """读取会话状态，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return SessionState.from_bytes(entry[1], entry[2])
+
+    def set(self, key: str, state: SessionState) -> None:
+        """保存会话状态（不检查版本，并刷新过期时间）"""
+        data = state.to_bytes()
+        with self._lock:
+            entry = self._live_entry(key)
+            state.version = (entry[2] if entry is not None else 0) + 1
+            self._store(key, data, state.version)
+
+    def compare_and_set(self, key: str, state: SessionState) -> bool:
+        """存储中的版本仍为 ``state.version`` 时写入并递增版本，否则返回 False"""
+        data = state.to_bytes()
+        with self._lock:
+            entry = self._live_entry(key)
+            if (entry[2] if entry is not None else 0) != state.version:
+                self.conflicts += 1
+                return False
+            state.version += 1
+            self._store(key, data, state.version)
+        return True
+
+    def _live_entry(self, key: str) -> Optional[Tuple[float, bytes, int]]:
+        """未过期的条目（调用方持有锁；已过期的顺带删除）"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            SESSION_EVICTIONS.labels("expired").inc()
+            entry = None
+        return entry
+
+    def _store(self, key: str, data: bytes, version: int) -> None:
+        """写入条目并按 LRU 淘汰（调用方持有锁）"""
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, data, version)
+        self._bytes += len(data)
+        while len(self._entries) > self.max_sessions:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+            SESSION_EVICTIONS.labels("lru").inc()
+
+    def delete(self, key: str) -> None:
+        """删除会话"""
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        """删除条目（调用方持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def stats(self) -> Dict:
+        """存储状态"""
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._entries),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "conflicts": self.conflicts,
+            }
+
+
+class RedisSessionStore:
+    """
+    Redis 会话存储（所有 worker 共享，过期交给 Redis 处理）
+
+    每个会话是一个 hash：``state`` 为序列化状态，``version`` 为版本号；
+    条件写入由 Lua 脚本在 Redis 中原子地比较版本
+    """
+
+    # KEYS[1]=会话键，ARGV=期望版本、状态、新版本、TTL；版本不一致时返回 0
+    COMPARE_AND_SET = """
+local current = redis.call('HGET', KEYS[1], 'version') or '0'
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'state', ARGV[2], 'version', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+    # 无条件写入：版本在原有基础上递增
+    SET = """
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('HSET', KEYS[1], 'state', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return version
+"""
+
+    def __init__(self, redis_url: str, ttl: float = 86400.0,
+                 prefix: str = "warm_agent:session:"):
+        """
+        初始化存储
+
+        Args:
+            redis_url: Redis连接URL
+            ttl: 会话闲置多久后过期（秒）
+            prefix: key 前缀
+        """
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(redis_url)
+        self._compare_and_set = self._redis.register_script(self.COMPARE_AND_SET)
+        self._set = self._redis.register_script(self.SET)
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.conflicts = 0
+
+    def get(self, key: str) -> Optional[SessionState]:
+        """读取会话状态；Redis 不可用时按新会话处理"""
+        try:
+            data, version = self._redis.hmget(self.prefix + key, "state", "version")
+        except redis.RedisError as e:
+            self.errors += 1
+            print(f"Session store get failed: {e}")
+            return None
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return SessionState.from_bytes(data, int(version or 0))
+
+    def set(self, key: str, state: SessionState) -> None:
+        """保存会话状态（不检查版本，并刷新过期时间）"""
+        try:
+            state.version = int(self._set(
+                keys=[self.prefix + key], args=[state.to_bytes(), max(1, int(self.ttl))]
+            ))
+        except redis.RedisError as e:
+            self.errors += 1
+            print(f"Session store set failed: {e}")
+
+    def compare_and_set(self, key: str, state: SessionState) -> bool:
+        """
+        存储中的版本仍为 ``state.version`` 时写入并递增版本，否则返回 False
+
+        Redis 不可用时放弃写入并返回 True（与 ``set`` 一样按尽力而为处理，不让调用方重试）
+        """
+        try:
+            written = self._compare_and_set(
+                keys=[self.prefix + key],
+                args=[state.version, state.to_bytes(), state.version + 1, max(1, int(self.ttl))]
+            )
+        except redis.RedisError as e:
+            self.errors += 1
+            print(f"Session store set failed: {e}")
+            return True
+        if not written:
+            self.conflicts += 1
+            return False
+        state.version += 1
+        return True
+
+    def delete(self, key: str) -> None:
+        """删除会话"""
+        try:
+            self._redis.delete(self.prefix + key)
+        except redis.RedisError as e:
+            self.errors += 1
+            print(f"Session store delete failed: {e}")
+
+    def stats(self) -> Dict:
+        """存储状态（会话数由 Redis 统计，这里只有本进程的访问计数）"""
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "conflicts": self.conflicts,
+        }
+
+
+# 全局会话存储实例
+_session_store = None
+
+
+def get_session_store():
+    """
+    获取会话存储实例（单例）
+
+    WARM_AGENT_SESSION_STORE=redis 且配置了 REDIS_URL 时使用 Redis，否则使用进程内存储
+    """
+    global _session_store
+    if _session_store is None:
+        ttl = float(os.getenv("WARM_AGENT_SESSION_TTL", "86400"))
+        redis_url = os.getenv("REDIS_URL")
+        if os.getenv("WARM_AGENT_SESSION_STORE", "memory") == "redis" and redis_url and REDIS_AVAILABLE:
+            _session_store = RedisSessionStore(redis_url, ttl=ttl)
+        else:
+            _session_store = MemorySessionStore(
+                max_sessions=int(os.getenv("WARM_AGENT_SESSION_MAX", "10000")),
+                ttl=ttl
+            )
+    return _session_store
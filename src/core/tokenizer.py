@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分词模块
+jieba 前缀词典在第一次分词时才构建（导入与构造均不触发），
+构建结果连同自定义词一起缓存为一个文件，文件名含词典与自定义词的哈希；
+之后的进程把缓存文件内存映射后直接反序列化，跳过词典构建与逐词添加
+"""
+
+import os
+import mmap
+import marshal
+import hashlib
+import tempfile
+import threading
+from typing import Iterable, List, NamedTuple, Optional
+
+import jieba
+
+# jieba 自带词典（缓存键包含其大小与修改时间）
+DEFAULT_DICT_PATH = os.path.join(os.path.dirname(jieba.__file__), jieba.DEFAULT_DICT_NAME)
+
+
+class Token(NamedTuple):
+    """分词结果中的一个词及其在原文中的位置"""
+    word: str
+    start: int
+    end: int
+
+
+class Tokenizer:
+    """延迟初始化的 jieba 分词器"""
+
+    def __init__(self, words: Iterable[str] = (), cache_dir: Optional[str] = None):
+        """
+        初始化分词器（不加载词典）
+
+        Args:
+            words: 自定义词（按顺序添加，顺序影响词频估计）
+            cache_dir: 词典缓存目录，默认为系统临时目录
+        """
+        self.words = list(dict.fromkeys(words))
+        self.cache_dir = cache_dir or tempfile.gettempdir()
+
+        # 加载完成后才替换为已初始化的实例，分词不会用到只加载了一半的词典
+        self._jieba = jieba.Tokenizer()
+        self._lock = threading.Lock()
+        self.loaded_from_cache = False
+
+    @property
+    def ready(self) -> bool:
+        """词典是否已加载"""
+        return self._jieba.initialized
+
+    @property
+    def cache_path(self) -> str:
+        """词典缓存文件路径"""
+        digest = hashlib.sha256(jieba.__version__.encode())
+        stat = os.stat(DEFAULT_DICT_PATH)
+        digest.update(f"\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+        for word in self.words:
+            digest.update(b"\0" + word.encode("utf-8"))
+        return os.path.join(self.cache_dir, f"warm_agent_jieba.{digest.hexdigest()[:16]}.cache")
+
+    def initialize(self) -> None:
+        """加载词典（可重复调用；多线程同时调用时只加载一次）"""
+        if self.ready:
+            return
+        with self._lock:
+            if self.ready:
+                return
+            path = self.cache_path
+            tokenizer = self._load_cache(path)
+            if tokenizer is None:
+                tokenizer = self._build()
+                self._dump_cache(path, tokenizer)
+            self._jieba = tokenizer
+
+    def _load_cache(self, path: str) -> Optional[jieba.Tokenizer]:
+        """从缓存文件加载前缀词典，失败时返回 None"""
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                freq, total = marshal.loads(data)
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+
+        tokenizer = jieba.Tokenizer()
+        tokenizer.FREQ = freq
+        tokenizer.total = total
+        tokenizer.initialized = True
+        self.loaded_from_cache = True
+        return tokenizer
+
+    def _build(self) -> jieba.Tokenizer:
+        """构建前缀词典并添加自定义词"""
+        tokenizer = jieba.Tokenizer()
+        tokenizer.initialize()
+        for word in self.words:
+            tokenizer.add_word(word)
+        return tokenizer
+
+    def _dump_cache(self, path: str, tokenizer: jieba.Tokenizer) -> None:
+        """原子地写入缓存文件（写入失败只影响下次启动速度）"""
+        temp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump((tokenizer.FREQ, tokenizer.total), f)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Failed to write tokenizer cache: {e}")
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def cut(self, text: str) -> List[str]:
+        """分词（首次调用时加载词典）"""
+        if not self.ready:
+            self.initialize()
+        return list(self._jieba.cut(text))
+
+    def tokenize(self, text: str) -> List[Token]:
+        """分词并给出每个词的位置（与 ``cut`` 的切分相同）"""
+        if not self.ready:
+            self.initialize()
+        tokens = []
+        start = 0
+        for word in self._jieba.cut(text):
+            end = start + len(word)
+            tokens.append(Token(word, start, end))
+            start = end
+        return tokens
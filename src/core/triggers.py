@@ -6,8 +6,12 @@ Warm Agent 关键词触发模块
 """
 
 import re
+import random
 from typing import List, Tuple, Optional, Dict, Any
 
+from .lexicon import LexiconMatch, get_lexicon_index
+from .rng import SeededRNG
+
 
 class WarmAgentTriggers:
     """Warm Agent 关键词触发管理器"""
@@ -44,6 +48,17 @@ class WarmAgentTriggers:
         # 否定词（用于过滤）
         self.negation_words = ["不", "没", "无", "非", "未", "别", "莫", "勿"]
         
+        # 登记到共享词库索引（与情感分析器共用一次扫描）
+        self.lexicon = get_lexicon_index()
+        self.lexicon.register("trigger_open", self.open_commands)
+        self.lexicon.register("trigger_close", self.close_commands)
+        self.lexicon.register("trigger_emotion", self.emotion_words)
+        self.lexicon.register("trigger_need", self.need_words)
+        self.lexicon.register("trigger_intensity", self.intensity_words)
+        self.lexicon.register("trigger_context", self.context_words)
+        self.lexicon.register("trigger_physical", self.physical_words)
+        self.lexicon.register("trigger_negation", self.negation_words)
+        
     def _load_emotion_words(self) -> Dict[str, List[str]]:
         """加载情感词库"""
         return {
@@ -137,62 +152,62 @@ class WarmAgentTriggers:
             "健康", "身体", "疾病", "生病"
         ]
     
-    def should_trigger_warm_mode(self, user_input: str) -> Tuple[bool, Dict[str, Any]]:
+    def should_trigger_warm_mode(self, user_input: str,
+                                 match: Optional[LexiconMatch] = None) -> Tuple[bool, Dict[str, Any]]:
         """
         检查是否应该触发温暖模式
         
         Args:
             user_input: 用户输入文本
+            match: 已有的词库扫描结果（可选，与情感分析器共享）
             
         Returns:
             Tuple[是否触发, 触发详情]
         """
-        user_input_lower = user_input.lower()
+        if match is None:
+            match = self.lexicon.scan(user_input)
         
         # 1. 检查显式开启指令
-        for cmd in self.open_commands:
-            if cmd in user_input:
-                return True, {
-                    "trigger_type": "explicit_open",
-                    "trigger_word": cmd,
-                    "confidence": 1.0
-                }
+        for hit in match.entries("trigger_open"):
+            return True, {
+                "trigger_type": "explicit_open",
+                "trigger_word": hit.word,
+                "confidence": 1.0
+            }
         
         # 2. 检查显式关闭指令
-        for cmd in self.close_commands:
-            if cmd in user_input:
-                return False, {
-                    "trigger_type": "explicit_close", 
-                    "trigger_word": cmd,
-                    "action": "close_warm_mode"
-                }
+        for hit in match.entries("trigger_close"):
+            return False, {
+                "trigger_type": "explicit_close", 
+                "trigger_word": hit.word,
+                "action": "close_warm_mode"
+            }
         
         # 3. 检查情感词和需求词
         found_words = []
         trigger_types = []
         
         # 检查所有情感词
-        for category, words in self.emotion_words.items():
-            for word in words:
-                if word in user_input:
-                    found_words.append(word)
-                    trigger_types.append(f"emotion_{category}")
+        for hit in match.entries("trigger_emotion"):
+            found_words.append(hit.word)
+            trigger_types.append(f"emotion_{hit.label}")
         
         # 检查需求词
-        for word in self.need_words:
-            if word in user_input:
-                found_words.append(word)
-                trigger_types.append("need")
+        for hit in match.entries("trigger_need"):
+            found_words.append(hit.word)
+            trigger_types.append("need")
         
         # 4. 检查否定词组合（避免误触发）
         if found_words:
+            # 最早出现的否定词的结束位置
+            negation_end = match.first_end("trigger_negation")
+            
             # 检查是否有否定词在情感词前面
             for word in found_words:
-                word_index = user_input.find(word)
+                word_index = match.first_start(word)
                 if word_index > 0:
                     # 检查前面的字符是否包含否定词
-                    preceding_text = user_input[:word_index]
-                    if any(neg in preceding_text for neg in self.negation_words):
+                    if negation_end is not None and negation_end <= word_index:
                         # 找到否定词，移除这个触发词
                         found_words.remove(word)
                         trigger_types = [t for t in trigger_types if not t.startswith("emotion_") and t != "need"]
@@ -203,9 +218,8 @@ class WarmAgentTriggers:
             confidence = min(0.3 + len(found_words) * 0.2, 0.9)
             
             # 如果有程度词或上下文词，增加置信度
-            for word in self.intensity_words + self.context_words:
-                if word in user_input:
-                    confidence = min(confidence + 0.1, 0.95)
+            for _ in match.entries("trigger_intensity") + match.entries("trigger_context"):
+                confidence = min(confidence + 0.1, 0.95)
             
             return True, {
                 "trigger_type": "keyword",
@@ -216,10 +230,7 @@ class WarmAgentTriggers:
             }
         
         # 6. 检查身体感受词（较低优先级）
-        physical_found = []
-        for word in self.physical_words:
-            if word in user_input:
-                physical_found.append(word)
+        physical_found = [hit.word for hit in match.entries("trigger_physical")]
         
         if physical_found:
             return True, {
@@ -236,49 +247,51 @@ class WarmAgentTriggers:
             "user_input": user_input
         }
     
-    def get_warm_response_template(self, trigger_info: Dict[str, Any]) -> str:
+    def get_warm_response_template(self, trigger_info: Dict[str, Any],
+                                   seed: Optional[int] = None) -> str:
         """
         根据触发信息获取温暖回应模板
         
         Args:
             trigger_info: 触发详情
+            seed: 随机种子（可选）；相同种子得到相同的模板
             
         Returns:
             温暖回应模板
         """
+        rng = SeededRNG(seed) if seed is not None else random
         trigger_type = trigger_info.get("trigger_type", "")
         trigger_words = trigger_info.get("trigger_words", [])
         
         # 根据触发类型选择模板
         if trigger_type == "explicit_open":
-            return self._get_welcome_template()
+            return self._get_welcome_template(rng)
         
         elif "emotion_negative" in trigger_info.get("trigger_categories", []):
-            return self._get_negative_emotion_template(trigger_words)
+            return self._get_negative_emotion_template(trigger_words, rng)
         
         elif "emotion_positive" in trigger_info.get("trigger_categories", []):
-            return self._get_positive_emotion_template(trigger_words)
+            return self._get_positive_emotion_template(trigger_words, rng)
         
         elif "need" in trigger_info.get("trigger_categories", []):
-            return self._get_need_template(trigger_words)
+            return self._get_need_template(trigger_words, rng)
         
         elif trigger_type == "physical_sensation":
-            return self._get_physical_template(trigger_words)
+            return self._get_physical_template(trigger_words, rng)
         
         else:
-            return self._get_general_warm_template()
+            return self._get_general_warm_template(rng)
     
-    def _get_welcome_template(self) -> str:
+    def _get_welcome_template(self, rng=random) -> str:
         """欢迎模板"""
         templates = [
             "好的！温暖模式已开启～✨ 从现在开始，我会用更温暖的方式回应你，记得随时告诉我你的感受哦！",
             "情感模式启动成功！🎉 我会更加关注你的情绪和感受，用更有温度的方式陪伴你～",
             "温暖回应已激活！❤️ 我会用心倾听你的每一句话，用温暖回应你的每一个情绪～"
         ]
-        import random
-        return random.choice(templates)
+        return rng.choice(templates)
     
-    def _get_negative_emotion_template(self, trigger_words: List[str]) -> str:
+    def _get_negative_emotion_template(self, trigger_words: List[str], rng=random) -> str:
         """负面情绪模板"""
         word = trigger_words[0] if trigger_words else "心情"
         
@@ -287,10 +300,9 @@ class WarmAgentTriggers:
             f"{word}的滋味确实不好受...💔 但请相信，每一次情绪波动都是成长的契机。我在这里陪着你，想说什么都可以。",
             f"感受到你的{word}情绪了...🤗 这种时候确实需要有人倾听和理解。我在这里，随时准备给你支持和陪伴～"
         ]
-        import random
-        return random.choice(templates)
+        return rng.choice(templates)
     
-    def _get_positive_emotion_template(self, trigger_words: List[str]) -> str:
+    def _get_positive_emotion_template(self, trigger_words: List[str], rng=random) -> str:
         """正面情绪模板"""
         word = trigger_words[0] if trigger_words else "开心"
         
@@ -299,10 +311,9 @@ class WarmAgentTriggers:
             f"真为你感到{word}！✨ 美好的情绪就像阳光，能照亮一整天～要不要和我分享更多细节？",
             f"{word}的情绪是最有感染力的！😊 看到你开心，我也觉得世界变得更美好了呢～"
         ]
-        import random
-        return random.choice(templates)
+        return rng.choice(templates)
     
-    def _get_need_template(self, trigger_words: List[str]) -> str:
+    def _get_need_template(self, trigger_words: List[str], rng=random) -> str:
         """需求词模板"""
         word = trigger_words[0] if trigger_words else "支持"
         
@@ -311,10 +322,9 @@ class WarmAgentTriggers:
             f"需要{word}的时候，记得我永远在这里～❤️ 无论是倾听、建议还是简单的陪伴，我都会用心对待。",
             f"{word}已就位！✨ 我会用最温暖的方式回应你的每一个需求，让你感受到被理解和关怀～"
         ]
-        import random
-        return random.choice(templates)
+        return rng.choice(templates)
     
-    def _get_physical_template(self, trigger_words: List[str]) -> str:
+    def _get_physical_template(self, trigger_words: List[str], rng=random) -> str:
         """身体感受模板"""
         word = trigger_words[0] if trigger_words else "累"
         
@@ -323,18 +333,16 @@ class WarmAgentTriggers:
             f"感受到你的身体{word}了...🛌 这种时候最适合放松和恢复。要不要试试一些简单的放松方法？",
             f"{word}的时候确实需要格外关爱自己呢...🌿 我在这里陪你，一起找到最适合的恢复方式～"
         ]
-        import random
-        return random.choice(templates)
+        return rng.choice(templates)
     
-    def _get_general_warm_template(self) -> str:
+    def _get_general_warm_template(self, rng=random) -> str:
         """通用温暖模板"""
         templates = [
             "我在这里用心倾听～✨ 无论你想分享什么，我都会用最温暖的方式回应你～",
             "感受到你想和我连接的心意了...❤️ 我会用全部的关注和温暖来回应你～",
             "欢迎来到温暖空间～🌼 在这里，每一个字都会被温柔对待，每一种情绪都会被理解～"
         ]
-        import random
-        return random.choice(templates)
+        return rng.choice(templates)
 
 
 # 单例实例
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用量日志缓冲模块
+请求路径只把用量事件放进内存环形缓冲区，后台任务每攒够 N 条或每隔 T 毫秒
+用 COPY 批量写入 usage_logs；缓冲区有上限，满时丢弃最旧的事件并计数。
+某条记录本身写不进去（如用户已删除导致外键冲突）时把该批对半拆分重试，只丢弃出错的记录；
+连接等临时错误时未写入的事件放回缓冲区，下个周期重试
+"""
+
+import os
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Tuple
+
+import asyncpg
+
+from .async_user_manager import get_async_user_manager
+
+# (user_id, endpoint, request_size, response_size, processing_time_ms, created_at)
+UsageRecord = Tuple[str, str, int, int, int, datetime]
+
+# 由记录内容引起的错误：重试同一条记录仍会失败
+ROW_ERRORS = (asyncpg.IntegrityConstraintViolationError, asyncpg.DataError)
+
+
+class UsageLogBuffer:
+    """用量日志写缓冲"""
+
+    def __init__(self, user_manager, max_size: int = 10000,
+                 batch_size: int = 500, flush_interval: float = 0.5):
+        """
+        初始化缓冲区
+
+        Args:
+            user_manager: 提供 ``copy_usage_logs(records)`` 的异步用户管理器
+            max_size: 缓冲区最多保留的事件数
+            batch_size: 攒够多少条立即写入
+            flush_interval: 最长写入间隔（秒）
+        """
+        if batch_size < 1 or max_size < batch_size:
+            raise ValueError("Invalid buffer size")
+
+        self.user_manager = user_manager
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer: Deque[UsageRecord] = deque(maxlen=max_size)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.requeued = 0
+        self.flushes = 0
+
+    def record(self, user_id: str, endpoint: str, request_size: int = 0,
+               response_size: int = 0, processing_time_ms: int = 0) -> None:
+        """记录一条用量事件（不访问数据库）"""
+        if len(self._buffer) >= self.max_size:
+            # deque 满时 append 会挤掉最旧的一条
+            self.dropped += 1
+
+        self._buffer.append((
+            user_id, endpoint, request_size, response_size, processing_time_ms,
+            datetime.now(timezone.utc)
+        ))
+        self.recorded += 1
+
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """把缓冲区中的事件全部写入数据库，返回写入条数"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        total = 0
+        async with self._flush_lock:
+            while self._buffer:
+                count = min(self.batch_size, len(self._buffer))
+                records = [self._buffer.popleft() for _ in range(count)]
+                written = await self._write(records)
+                if written is None:
+                    break
+                total += written
+        return total
+
+    async def _write(self, records: List[UsageRecord]) -> Optional[int]:
+        """
+        写入一批事件，返回写入条数
+
+        记录本身有错时对半拆分重试，最终只丢弃出错的记录；
+        其他错误时把未写入的事件放回缓冲区并返回 None
+        """
+        chunks: Deque[List[UsageRecord]] = deque([records])
+        written = 0
+        while chunks:
+            chunk = chunks.popleft()
+            try:
+                await self.user_manager.copy_usage_logs(chunk)
+            except ROW_ERRORS as e:
+                if len(chunk) == 1:
+                    self.failed += 1
+                    print(f"Dropped invalid usage log: {e}")
+                    continue
+                middle = len(chunk) // 2
+                chunks.appendleft(chunk[middle:])
+                chunks.appendleft(chunk[:middle])
+                continue
+            except Exception as e:
+                chunks.appendleft(chunk)
+                self._requeue([record for pending in chunks for record in pending])
+                print(f"Failed to flush usage logs, will retry: {e}")
+                return None
+            self.written += len(chunk)
+            self.flushes += 1
+            written += len(chunk)
+        return written
+
+    def _requeue(self, records: List[UsageRecord]) -> None:
+        """把未写入的事件放回缓冲区头部（放不下时丢弃其中最旧的）"""
+        room = self.max_size - len(self._buffer)
+        if len(records) > room:
+            self.dropped += len(records) - room
+            records = records[len(records) - room:]
+        self._buffer.extendleft(reversed(records))
+        self.requeued += len(records)
+
+    async def _run(self) -> None:
+        """后台写入循环"""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        """启动后台写入任务（需在事件循环中调用）"""
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务并写完剩余事件"""
+        if self._task is not None:
+            # 不取消任务，避免正在写入的一批丢失
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._wakeup = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """缓冲区状态"""
+        return {
+            "buffered": len(self._buffer),
+            "max_size": self.max_size,
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "requeued": self.requeued,
+            "flushes": self.flushes,
+        }
+
+
+# 全局用量缓冲实例
+_usage_buffer: Optional[UsageLogBuffer] = None
+
+
+def get_usage_buffer() -> UsageLogBuffer:
+    """获取用量日志缓冲实例（单例，配置来自环境变量）"""
+    global _usage_buffer
+    if _usage_buffer is None:
+        _usage_buffer = UsageLogBuffer(
+            get_async_user_manager(),
+            max_size=int(os.getenv("WARM_AGENT_USAGE_BUFFER_SIZE", "10000")),
+            batch_size=int(os.getenv("WARM_AGENT_USAGE_BATCH_SIZE", "500")),
+            flush_interval=float(os.getenv("WARM_AGENT_USAGE_FLUSH_MS", "500")) / 1000
+        )
+    return _usage_buffer
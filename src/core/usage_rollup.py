@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用量汇总模块
+后台定期刷新小时/天汇总表，维护 usage_logs 的月分区并按保留期删除旧分区
+（表结构与 SQL 函数见 migrations/003_partition_usage_logs.sql）
+
+每次刷新后把汇总水位写入 usage_rollup_state，下次从水位往前 ``lookback`` 开始重算，
+聚合任务停机多久，恢复后就补算多久
+"""
+
+import os
+import time
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from .async_user_manager import get_async_user_manager
+
+# 多个 worker 同时运行时，只有拿到该咨询锁的一个执行汇总
+ROLLUP_LOCK_ID = 0x5741524D
+
+
+def _add_months(day: date, months: int) -> date:
+    """某日期所在月份加减若干个月，返回该月1日"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class UsageAggregator:
+    """用量汇总后台任务"""
+
+    def __init__(self, user_manager, interval: float = 60.0, lookback: float = 7200.0,
+                 daily_interval: float = 600.0, maintenance_interval: float = 86400.0,
+                 retention_months: int = 12, hourly_retention_days: int = 14,
+                 partitions_ahead: int = 2):
+        """
+        初始化汇总任务
+
+        Args:
+            user_manager: 异步用户管理器（提供 ``get_pool()``）
+            interval: 小时汇总刷新间隔（秒）
+            lookback: 在汇总水位之前额外重算的时长（秒），覆盖晚到的记录
+            daily_interval: 天汇总刷新间隔（秒）
+            maintenance_interval: 分区维护与保留清理间隔（秒）
+            retention_months: 原始记录保留的整月数
+            hourly_retention_days: 小时汇总保留天数
+            partitions_ahead: 提前创建的未来月分区数
+        """
+        self.user_manager = user_manager
+        self.interval = interval
+        self.lookback = lookback
+        self.daily_interval = daily_interval
+        self.maintenance_interval = maintenance_interval
+        self.retention_months = retention_months
+        self.hourly_retention_days = hourly_retention_days
+        self.partitions_ahead = partitions_ahead
+
+        self._task: Optional[asyncio.Task] = None
+        # 上次刷新天汇总 / 维护分区的时间（monotonic）；None 表示启动后尚未执行，首轮立即执行
+        self._last_daily: Optional[float] = None
+        self._last_maintenance: Optional[float] = None
+
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.maintenance_errors = 0
+        self.partitions_dropped = 0
+
+    async def run_once(self, force_daily: bool = False) -> bool:
+        """
+        执行一次汇总（到期时顺带刷新天汇总和维护分区）
+
+        Returns:
+            False 表示其他 worker 正在汇总，本次跳过
+        """
+        now = time.monotonic()
+        include_daily = force_daily or self._due(self._last_daily, self.daily_interval, now)
+        maintenance = self._due(self._last_maintenance, self.maintenance_interval, now)
+        names = ["hourly", "daily"] if include_daily else ["hourly"]
+
+        pool = await self.user_manager.get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", ROLLUP_LOCK_ID):
+                    self.skipped += 1
+                    return False
+
+                since = await self._since(conn, names)
+                await conn.execute("SELECT refresh_usage_rollups($1, $2)", since, include_daily)
+                # 水位取本事务开始时间：之后提交的记录由下次刷新的回看窗口覆盖
+                await conn.execute(
+                    """
+                    INSERT INTO usage_rollup_state (name, rolled_up_to)
+                    SELECT unnest($1::text[]), NOW()
+                    ON CONFLICT (name) DO UPDATE SET rolled_up_to = EXCLUDED.rolled_up_to
+                    """,
+                    names
+                )
+
+            # 分区维护使用单独的事务：维护失败不会回滚已完成的汇总刷新
+            if maintenance and await self._try_maintain(conn):
+                self._last_maintenance = now
+
+        if include_daily:
+            self._last_daily = now
+        self.runs += 1
+        return True
+
+    @staticmethod
+    def _due(last: Optional[float], interval: float, now: float) -> bool:
+        """距上次执行已超过间隔（启动后尚未执行过也算到期）"""
+        return last is None or now - last >= interval
+
+    async def _since(self, conn, names: List[str]) -> datetime:
+        """本次重算的起点：各汇总水位中最早的一个往前 ``lookback``（无水位时从当前时间往前）"""
+        watermark = await conn.fetchval(
+            "SELECT MIN(rolled_up_to) FROM usage_rollup_state WHERE name = ANY($1::text[])",
+            names
+        )
+        return (watermark or datetime.now(timezone.utc)) - timedelta(seconds=self.lookback)
+
+    async def _try_maintain(self, conn) -> bool:
+        """在单独的事务中维护分区，返回是否完成（失败时下个周期重试）"""
+        try:
+            async with conn.transaction():
+                if not await conn.fetchval("SELECT pg_try_advisory_xact_lock($1)", ROLLUP_LOCK_ID):
+                    return False
+                await self._maintain(conn)
+        except Exception as e:
+            self.maintenance_errors += 1
+            print(f"Usage partition maintenance failed: {e}")
+            return False
+        return True
+
+    async def _maintain(self, conn) -> None:
+        """创建未来分区，删除过期分区与小时汇总"""
+        today = datetime.now(timezone.utc).date()
+        for months in range(self.partitions_ahead + 1):
+            await conn.execute(
+                "SELECT create_usage_logs_partition($1)",
+                _add_months(today, months)
+            )
+
+        if self.retention_months > 0:
+            self.partitions_dropped += await conn.fetchval(
+                "SELECT drop_usage_logs_partitions($1)",
+                _add_months(today, -self.retention_months)
+            )
+
+        if self.hourly_retention_days > 0:
+            await conn.execute(
+                "DELETE FROM usage_rollup_hourly WHERE bucket < NOW() - make_interval(days => $1)",
+                self.hourly_retention_days
+            )
+
+    async def _run(self) -> None:
+        """后台循环"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 汇总失败不影响主流程，下个周期重试
+                self.errors += 1
+                print(f"Usage rollup failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """启动后台任务（需在事件循环中调用）"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, int]:
+        """任务状态"""
+        return {
+            "runs": self.runs,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "maintenance_errors": self.maintenance_errors,
+            "partitions_dropped": self.partitions_dropped,
+        }
+
+
+# 全局汇总任务实例
+_usage_aggregator: Optional[UsageAggregator] = None
+
+
+def get_usage_aggregator() -> UsageAggregator:
+    """获取用量汇总任务实例（单例，配置来自环境变量）"""
+    global _usage_aggregator
+    if _usage_aggregator is None:
+        _usage_aggregator = UsageAggregator(
+            get_async_user_manager(),
+            interval=float(os.getenv("WARM_AGENT_ROLLUP_INTERVAL", "60")),
+            daily_interval=float(os.getenv("WARM_AGENT_ROLLUP_DAILY_INTERVAL", "600")),
+            retention_months=int(os.getenv("WARM_AGENT_USAGE_RETENTION_MONTHS", "12")),
+            hourly_retention_days=int(os.getenv("WARM_AGENT_ROLLUP_HOURLY_RETENTION_DAYS", "14"))
+        )
+    return _usage_aggregator
@@ -11,11 +11,14 @@ import uuid
 import secrets
 import hashlib
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from dataclasses import dataclass
 
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+
+from .db_pool import ConnectionPool, create_pool_from_env
+from .metrics import timed_db_call
+from ..utils.compat import DATACLASS_SLOTS
 
 # 密码加密
 try:
@@ -32,7 +35,7 @@ except ImportError:
         return hashlib.sha256(password.encode()).hexdigest() == hash
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class User:
     """用户数据模型"""
     id: str
@@ -83,15 +86,77 @@ class User:
         }
 
 
-class UserManager:
-    """用户管理器"""
+class UserManagerBase:
+    """用户管理器公共逻辑（与数据库驱动无关）"""
     
-    def __init__(self, database_url: str):
-        self.database_url = database_url
+    # 套餐额度
+    QUOTA_LIMITS = {
+        "free": 1000,
+        "pro": 10000,
+        "enterprise": 100000
+    }
     
-    def _get_connection(self):
-        """获取数据库连接"""
-        return psycopg2.connect(self.database_url)
+    # 认证缓存（AuthCache），用户信息变更时需要失效
+    auth_cache = None
+    
+    def _invalidate_cached_user(self, user_id: str):
+        """失效认证缓存中该用户的记录"""
+        if self.auth_cache is not None:
+            self.auth_cache.invalidate_user(user_id)
+    
+    @staticmethod
+    def _summarize_usage(rows, days: int) -> Dict[str, Any]:
+        """把天汇总行合并为总量、按端点、按天三种统计"""
+        total_requests = 0
+        total_time = 0
+        by_endpoint: Dict[str, int] = {}
+        by_day: Dict[Any, int] = {}
+        
+        for row in rows:
+            count = row['request_count']
+            total_requests += count
+            total_time += row['processing_time_sum']
+            by_endpoint[row['endpoint']] = by_endpoint.get(row['endpoint'], 0) + count
+            by_day[row['bucket']] = by_day.get(row['bucket'], 0) + count
+        
+        return {
+            "period_days": days,
+            "total_requests": total_requests,
+            "avg_processing_time_ms": round(total_time / total_requests, 2) if total_requests else 0,
+            "by_endpoint": [
+                {"endpoint": endpoint, "count": count}
+                for endpoint, count in sorted(by_endpoint.items(), key=lambda item: -item[1])
+            ],
+            "by_day": [
+                {"date": day.isoformat(), "count": count}
+                for day, count in sorted(by_day.items(), reverse=True)
+            ]
+        }
+    
+    @staticmethod
+    def _row_to_user(row) -> User:
+        """数据库行转换为User对象"""
+        return User(
+            id=str(row['id']),
+            email=row['email'],
+            api_key=row['api_key'],
+            plan=row['plan'],
+            quota_used=row['quota_used'],
+            quota_limit=row['quota_limit'],
+            is_active=row['is_active'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at'],
+            password_hash=row.get('password_hash'),
+            email_verified=row.get('email_verified', False)
+        )
+    
+    def _validate_new_user(self, email: str, password: str):
+        """校验注册参数"""
+        if not self._validate_email(email):
+            raise ValueError("Invalid email format")
+        
+        if not password or len(password) < 6:
+            raise ValueError("Password must be at least 6 characters")
     
     def _generate_api_key(self) -> str:
         """生成随机API key"""
@@ -118,7 +183,30 @@ class UserManager:
             return pwd_context.verify(password, password_hash)
         else:
             return pwd_context_verify(password, password_hash)
+
+
+class UserManager(UserManagerBase):
+    """用户管理器"""
+    
+    def __init__(self, database_url: str, pool: Optional[ConnectionPool] = None,
+                 auth_cache=None):
+        self.database_url = database_url
+        self.pool = pool or create_pool_from_env(database_url)
+        self.auth_cache = auth_cache
     
+    def _get_connection(self):
+        """从连接池借出数据库连接"""
+        return self.pool.getconn()
+    
+    def _release_connection(self, conn):
+        """归还数据库连接"""
+        self.pool.putconn(conn)
+    
+    def close(self):
+        """关闭连接池"""
+        self.pool.close()
+    
+    @timed_db_call("create_user")
     def create_user(self, email: str, password: str, plan: str = "free") -> Optional[User]:
         """
         创建新用户
@@ -131,19 +219,10 @@ class UserManager:
         Returns:
             User对象 或 None（如果邮箱已存在）
         """
-        if not self._validate_email(email):
-            raise ValueError("Invalid email format")
-        
-        if not password or len(password) < 6:
-            raise ValueError("Password must be at least 6 characters")
+        self._validate_new_user(email, password)
         
         # 根据套餐设置额度
-        quota_limits = {
-            "free": 1000,
-            "pro": 10000,
-            "enterprise": 100000
-        }
-        quota_limit = quota_limits.get(plan, 1000)
+        quota_limit = self.QUOTA_LIMITS.get(plan, 1000)
         
         api_key = self._generate_api_key()
         password_hash = self._hash_password(password)
@@ -171,25 +250,14 @@ class UserManager:
                 row = cur.fetchone()
                 conn.commit()
                 
-                return User(
-                    id=str(row['id']),
-                    email=row['email'],
-                    api_key=row['api_key'],
-                    plan=row['plan'],
-                    quota_used=row['quota_used'],
-                    quota_limit=row['quota_limit'],
-                    is_active=row['is_active'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at'],
-                    password_hash=row['password_hash'],
-                    email_verified=row['email_verified']
-                )
+                return self._row_to_user(row)
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
     
+    @timed_db_call("get_user_by_api_key")
     def get_user_by_api_key(self, api_key: str) -> Optional[User]:
         """通过API key获取用户"""
         conn = self._get_connection()
@@ -204,22 +272,11 @@ class UserManager:
                 if not row:
                     return None
                 
-                return User(
-                    id=str(row['id']),
-                    email=row['email'],
-                    api_key=row['api_key'],
-                    plan=row['plan'],
-                    quota_used=row['quota_used'],
-                    quota_limit=row['quota_limit'],
-                    is_active=row['is_active'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at'],
-                    password_hash=row.get('password_hash'),
-                    email_verified=row.get('email_verified', False)
-                )
+                return self._row_to_user(row)
         finally:
-            conn.close()
+            self._release_connection(conn)
     
+    @timed_db_call("get_user_by_email")
     def get_user_by_email(self, email: str) -> Optional[User]:
         """通过邮箱获取用户"""
         conn = self._get_connection()
@@ -234,21 +291,9 @@ class UserManager:
                 if not row:
                     return None
                 
-                return User(
-                    id=str(row['id']),
-                    email=row['email'],
-                    api_key=row['api_key'],
-                    plan=row['plan'],
-                    quota_used=row['quota_used'],
-                    quota_limit=row['quota_limit'],
-                    is_active=row['is_active'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at'],
-                    password_hash=row.get('password_hash'),
-                    email_verified=row.get('email_verified', False)
-                )
+                return self._row_to_user(row)
         finally:
-            conn.close()
+            self._release_connection(conn)
     
     def authenticate_user(self, email: str, password: str) -> Optional[User]:
         """
@@ -270,6 +315,7 @@ class UserManager:
         
         return None
     
+    @timed_db_call("regenerate_api_key")
     def regenerate_api_key(self, user_id: str) -> Optional[str]:
         """重新生成API key"""
         new_api_key = self._generate_api_key()
@@ -283,14 +329,39 @@ class UserManager:
                 )
                 row = cur.fetchone()
                 conn.commit()
+                self._invalidate_cached_user(user_id)
                 
                 return row[0] if row else None
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
     
+    @timed_db_call("update_plan")
+    def update_plan(self, user_id: str, plan: str) -> bool:
+        """变更套餐（同时调整额度上限）"""
+        if plan not in self.QUOTA_LIMITS:
+            raise ValueError(f"Plan must be one of: {list(self.QUOTA_LIMITS)}")
+        
+        conn = self._get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE users SET plan = %s, quota_limit = %s, updated_at = NOW() WHERE id = %s",
+                    (plan, self.QUOTA_LIMITS[plan], user_id)
+                )
+                conn.commit()
+                self._invalidate_cached_user(user_id)
+                
+                return cur.rowcount > 0
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+    
+    @timed_db_call("delete_user")
     def delete_user(self, user_id: str) -> bool:
         """注销用户账户"""
         conn = self._get_connection()
@@ -309,51 +380,83 @@ class UserManager:
                 )
                 
                 conn.commit()
+                self._invalidate_cached_user(user_id)
                 return cur.rowcount > 0
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
     
-    def increment_quota(self, api_key: str) -> bool:
+    @timed_db_call("consume_quota")
+    def consume_quota(self, api_key: str, cost: int = 1) -> Optional[int]:
         """
-        增加用量计数
+        原子地扣减额度
+        
+        检查与扣减在同一条条件UPDATE中完成，并发请求不会超出额度。
+        
+        Args:
+            api_key: 用户API key
+            cost: 本次消耗的额度（批量接口一次扣减N）
         
         Returns:
-            True: 成功
-            False: 超出额度
+            扣减后的剩余额度；超出额度或用户不存在时返回 None
         """
         conn = self._get_connection()
         try:
             with conn.cursor() as cur:
-                # 检查额度
                 cur.execute(
-                    "SELECT quota_used, quota_limit FROM users WHERE api_key = %s",
-                    (api_key,)
+                    """
+                    UPDATE users
+                    SET quota_used = quota_used + %s, updated_at = NOW()
+                    WHERE api_key = %s AND is_active = TRUE
+                      AND quota_used + %s <= quota_limit
+                    RETURNING quota_limit - quota_used
+                    """,
+                    (cost, api_key, cost)
                 )
                 row = cur.fetchone()
-                
-                if not row:
-                    return False
-                
-                quota_used, quota_limit = row
-                
-                if quota_used >= quota_limit:
-                    return False  # 超出额度
-                
-                # 增加计数
+                conn.commit()
+                return row[0] if row else None
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._release_connection(conn)
+    
+    @timed_db_call("refund_quota")
+    def refund_quota(self, api_key: str, amount: int):
+        """退还预留但未使用的额度"""
+        if amount <= 0:
+            return
+        
+        conn = self._get_connection()
+        try:
+            with conn.cursor() as cur:
                 cur.execute(
-                    "UPDATE users SET quota_used = quota_used + 1, updated_at = NOW() WHERE api_key = %s",
-                    (api_key,)
+                    "UPDATE users SET quota_used = GREATEST(quota_used - %s, 0), updated_at = NOW() WHERE api_key = %s",
+                    (amount, api_key)
                 )
                 conn.commit()
-                return True
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            self._release_connection(conn)
+    
+    def increment_quota(self, api_key: str, amount: int = 1) -> bool:
+        """
+        增加用量计数
+        
+        Args:
+            api_key: 用户API key
+            amount: 本次消耗的额度（批量接口一次扣减N）
+        
+        Returns:
+            True: 成功
+            False: 超出额度
+        """
+        return self.consume_quota(api_key, amount) is not None
     
     def log_usage(self, api_key: str, endpoint: str, 
                   request_size: int = 0, response_size: int = 0,
@@ -380,60 +483,59 @@ class UserManager:
             # 日志记录失败不影响主流程
             print(f"Failed to log usage: {e}")
         finally:
-            conn.close()
+            self._release_connection(conn)
     
-    def get_usage_stats(self, user_id: str, days: int = 30) -> Dict[str, Any]:
-        """获取用量统计"""
+    @timed_db_call("log_usage_many")
+    def log_usage_many(self, user_id: str, endpoint: str,
+                       entries: List[Tuple[int, int, int]]):
+        """
+        批量记录用量日志（单条多行INSERT）
+        
+        Args:
+            user_id: 用户ID
+            endpoint: 端点
+            entries: (request_size, response_size, processing_time_ms) 列表
+        """
+        if not entries:
+            return
+        
         conn = self._get_connection()
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                # 获取总用量
-                cur.execute(
+            with conn.cursor() as cur:
+                execute_values(
+                    cur,
                     """
-                    SELECT COUNT(*) as total_requests,
-                           AVG(processing_time_ms) as avg_processing_time
-                    FROM usage_logs
-                    WHERE user_id = %s AND created_at > NOW() - INTERVAL '%s days'
+                    INSERT INTO usage_logs (user_id, endpoint, request_size, response_size, processing_time_ms)
+                    VALUES %s
                     """,
-                    (user_id, days)
+                    [(user_id, endpoint, *entry) for entry in entries],
+                    page_size=len(entries)
                 )
-                total_stats = cur.fetchone()
-                
-                # 按端点统计
-                cur.execute(
-                    """
-                    SELECT endpoint, COUNT(*) as count
-                    FROM usage_logs
-                    WHERE user_id = %s AND created_at > NOW() - INTERVAL '%s days'
-                    GROUP BY endpoint
-                    ORDER BY count DESC
-                    """,
-                    (user_id, days)
-                )
-                endpoint_stats = cur.fetchall()
-                
-                # 按天统计
+                conn.commit()
+        except Exception as e:
+            conn.rollback()
+            # 日志记录失败不影响主流程
+            print(f"Failed to log usage: {e}")
+        finally:
+            self._release_connection(conn)
+    
+    @timed_db_call("get_usage_stats")
+    def get_usage_stats(self, user_id: str, days: int = 30) -> Dict[str, Any]:
+        """获取用量统计（读取天汇总表）"""
+        conn = self._get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(
                     """
-                    SELECT DATE(created_at) as date, COUNT(*) as count
-                    FROM usage_logs
-                    WHERE user_id = %s AND created_at > NOW() - INTERVAL '%s days'
-                    GROUP BY DATE(created_at)
-                    ORDER BY date DESC
+                    SELECT bucket, endpoint, request_count, processing_time_sum
+                    FROM usage_rollup_daily
+                    WHERE user_id = %s AND bucket >= (NOW() - make_interval(days => %s))::DATE
                     """,
                     (user_id, days)
                 )
-                daily_stats = cur.fetchall()
-                
-                return {
-                    "period_days": days,
-                    "total_requests": total_stats['total_requests'] or 0,
-                    "avg_processing_time_ms": round(total_stats['avg_processing_time'] or 0, 2),
-                    "by_endpoint": [{"endpoint": row['endpoint'], "count": row['count']} for row in endpoint_stats],
-                    "by_day": [{"date": row['date'].isoformat(), "count": row['count']} for row in daily_stats]
-                }
+                return self._summarize_usage(cur.fetchall(), days)
         finally:
-            conn.close()
+            self._release_connection(conn)
 
 
 # 全局用户管理器实例
@@ -4,21 +4,29 @@
 基于情感分析结果生成有温度、有同理心的回应。
 """
 
-from typing import Dict, List, Optional
+import os
+import hashlib
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
 from dataclasses import dataclass
 import random
 import re
 
 from .emotion_analyzer import EmotionResult
+from .rng import SeededRNG, response_seed, stable_seed
+from .response_cache import ResponseVariantCache, emotion_signature
+from ..utils.compat import DATACLASS_SLOTS
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class WarmResponse:
-    """温暖回应结果"""
+    """温暖回应结果（个性化元素存为元组，可与缓存中的变体共享）"""
     text: str
     warmth_score: float
     style: str
-    personalized_elements: List[str]
+    personalized_elements: Tuple[str, ...]
+    
+    def __post_init__(self):
+        self.personalized_elements = tuple(self.personalized_elements)
     
     def to_dict(self) -> Dict:
         """转换为字典"""
@@ -26,7 +34,7 @@ class WarmResponse:
             "text": self.text,
             "warmth_score": self.warmth_score,
             "style": self.style,
-            "personalized_elements": self.personalized_elements
+            "personalized_elements": list(self.personalized_elements)
         }
     
     @classmethod
@@ -40,6 +48,55 @@ class WarmResponse:
         )
 
 
+# 专业风格下移除的口语化表达
+_COLLOQUIAL_PATTERN = re.compile(r'(哈哈|嗯嗯|呢|啦|哦)')
+
+
+def _finish_casual(text: str) -> str:
+    """口语化：句号换成波浪号"""
+    return text.replace("。", "～")
+
+
+def _finish_professional(text: str) -> str:
+    """正式化：波浪号换回句号，去掉笑声"""
+    return text.replace("～", "。").replace("哈哈", "")
+
+
+# 风格对整段文本的最终调整
+_STYLE_FINISHERS: Dict[str, Callable[[str], str]] = {
+    "casual": _finish_casual,
+    "professional": _finish_professional
+}
+
+
+class _RenderPlan:
+    """（情感, 风格, 表情级别）对应的预编译渲染计划"""
+    
+    __slots__ = ("openers", "closers", "enhance_phrases", "enhance_separator",
+                 "style_phrases", "style_threshold", "emojis", "emoji_pattern",
+                 "emoji_level", "professional", "finish", "elements", "warmth_base")
+    
+    def __init__(self, openers: Tuple[str, ...], closers: Tuple[str, ...],
+                 enhance_phrases: Tuple[str, ...], enhance_separator: str,
+                 style_phrases: Tuple[str, ...], style_threshold: float,
+                 emojis: Tuple[str, ...], emoji_pattern: Pattern, emoji_level: str,
+                 professional: bool, finish: Optional[Callable[[str], str]],
+                 elements: Tuple[str, ...], warmth_base: float):
+        self.openers = openers
+        self.closers = closers
+        self.enhance_phrases = enhance_phrases
+        self.enhance_separator = enhance_separator
+        self.style_phrases = style_phrases
+        self.style_threshold = style_threshold
+        self.emojis = emojis
+        self.emoji_pattern = emoji_pattern
+        self.emoji_level = emoji_level
+        self.professional = professional
+        self.finish = finish
+        self.elements = elements
+        self.warmth_base = warmth_base
+
+
 class WarmResponseEngine:
     """温暖回应引擎"""
     
@@ -154,12 +211,50 @@ class WarmResponseEngine:
         "neutral": ["✨", "💫", "🌟", "💙", "🌸"]
     }
     
-    def __init__(self):
-        """初始化温暖回应引擎"""
-        pass
+    # 按情感增强基础回应的短语（及短语后的连接符）
+    ENHANCE_PHRASES = {
+        "sadness": ["别担心", "一切都会好起来的", "你并不孤单", "我相信你"],
+        "anger": ["冷静下来", "深呼吸", "放轻松", "慢慢来"],
+        "anxiety": ["不用担心", "没问题的", "一切都会顺利", "你可以的"],
+        "joy": ["太棒了", "值得庆祝", "为你开心", "真替你高兴"]
+    }
+    ENHANCE_SEPARATORS = {"joy": "！"}
+    
+    # 按风格增强的短语及触发阈值（随机数超过阈值才添加）
+    STYLE_PHRASES = {
+        "casual": ["哈哈", "嗯嗯", "好的呢", "明白啦", "没问题"],
+        "warm": ["亲爱的", "朋友", "伙伴"]
+    }
+    STYLE_PHRASE_THRESHOLDS = {"casual": 0.7, "warm": 0.8}
+    
+    EMOJI_LEVELS = ("none", "low", "moderate", "high")
+    
+    def __init__(self, deterministic: bool = False,
+                 cache: Optional[ResponseVariantCache] = None):
+        """
+        初始化温暖回应引擎，预编译全部渲染计划
+        
+        Args:
+            deterministic: 可复现模式；未传入种子时由 (user_id, 基础回应, 日期) 生成种子
+            cache: 回应变体缓存（可选）；启用后每个输入组合只在有限个变体中选择
+        """
+        self.deterministic = deterministic
+        self.cache = cache
+        emotions = set(self.EMPATHY_OPENERS) | set(self.SUPPORT_CLOSERS) | set(self.EMOJI_MAP)
+        self._plans: Dict[Tuple[str, str, str], _RenderPlan] = {
+            (emotion, style, level): self._compile_plan(emotion, style, level)
+            for emotion in emotions
+            for style in self.STYLE_TEMPLATES
+            for level in self.EMOJI_LEVELS
+        }
+    
+    def seed_for(self, user_id: Optional[str], text: str) -> Optional[int]:
+        """可复现模式下按用户和输入文本生成种子，否则返回 None"""
+        return response_seed(user_id, text) if self.deterministic else None
     
     def generate(self, emotion_result: EmotionResult, base_response: str,
-                 user_context: Optional[Dict] = None) -> WarmResponse:
+                 user_context: Optional[Dict] = None,
+                 seed: Optional[int] = None) -> WarmResponse:
         """
         生成温暖回应
         
@@ -167,6 +262,7 @@ class WarmResponseEngine:
             emotion_result: 情感分析结果
             base_response: 基础回应
             user_context: 用户上下文（可选）
+            seed: 随机种子（可选）；相同种子与输入得到相同的回应
             
         Returns:
             WarmResponse: 温暖回应结果
@@ -174,162 +270,219 @@ class WarmResponseEngine:
         if user_context is None:
             user_context = {}
         
+        if seed is None and self.deterministic:
+            seed = response_seed(user_context.get("user_id"), base_response)
+        rng = SeededRNG(seed) if seed is not None else random
+        
         # 获取用户偏好
         preferences = user_context.get("preferences", {})
         style = preferences.get("style", "warm")
         emoji_level = preferences.get("emoji_level", "moderate")
         
-        # 1. 添加同理心开场白
-        opener = self._select_opener(emotion_result)
+        if self.cache is not None:
+            return self._generate_cached(emotion_result, base_response, style, emoji_level, seed)
         
-        # 2. 增强基础回应
-        enhanced_response = self._enhance_response(
-            base_response, emotion_result, style
-        )
-        
-        # 3. 添加支持性结尾
-        closer = self._select_closer(emotion_result)
-        
-        # 4. 组合回应
-        warm_text = self._compose_response(opener, enhanced_response, closer)
-        
-        # 5. 添加表情符号
-        warm_text = self._add_emojis(warm_text, emotion_result, emoji_level)
-        
-        # 6. 应用风格调整
-        warm_text = self._apply_style(warm_text, style)
-        
-        # 7. 计算温暖度分数
-        warmth_score = self._calculate_warmth_score(
-            emotion_result, style, len(opener) > 0, len(closer) > 0
-        )
-        
-        # 8. 识别个性化元素
-        personalized_elements = self._identify_personalized_elements(
-            emotion_result, style, emoji_level
-        )
+        # 1. 按（情感, 风格, 表情级别）取预编译的渲染计划，一次拼装出回应
+        plan, personalized_elements = self._resolve_plan(emotion_result, style, emoji_level)
+        warm_text, warmth = self._render(plan, emotion_result, base_response, rng)
         
+        # 2. 计算温暖度分数（不含强度的部分在渲染时已算出）
         return WarmResponse(
             text=warm_text,
-            warmth_score=warmth_score,
+            warmth_score=self._warmth_score(warmth, emotion_result.intensity),
             style=style,
             personalized_elements=personalized_elements
         )
     
-    def _select_opener(self, emotion_result: EmotionResult) -> str:
-        """选择同理心开场白"""
-        emotion = emotion_result.primary_emotion
-        openers = self.EMPATHY_OPENERS.get(emotion, self.EMPATHY_OPENERS["neutral"])
-        
-        # 根据强度选择
-        if emotion_result.intensity > 0.7:
-            return random.choice(openers)
-        elif emotion_result.intensity > 0.4:
-            return random.choice(openers) if random.random() > 0.3 else ""
-        else:
-            return ""
-    
-    def _enhance_response(self, base_response: str, emotion_result: EmotionResult,
-                          style: str) -> str:
-        """增强基础回应"""
-        enhanced = base_response
-        
-        # 根据情感类型调整
-        if emotion_result.primary_emotion == "sadness":
-            enhanced = self._make_more_supportive(enhanced)
-        elif emotion_result.primary_emotion == "anger":
-            enhanced = self._make_more_calming(enhanced)
-        elif emotion_result.primary_emotion == "anxiety":
-            enhanced = self._make_more_reassuring(enhanced)
-        elif emotion_result.primary_emotion == "joy":
-            enhanced = self._make_more_celebratory(enhanced)
+    def _generate_cached(self, emotion_result: EmotionResult, base_response: str,
+                         style: str, emoji_level: str, seed: Optional[int]) -> WarmResponse:
+        """
+        从变体缓存生成回应
         
-        # 根据风格调整
-        if style == "casual":
-            enhanced = self._make_casual(enhanced)
-        elif style == "professional":
-            enhanced = self._make_professional(enhanced)
-        elif style == "warm":
-            enhanced = self._make_warmer(enhanced)
-        
-        return enhanced
-    
-    def _select_closer(self, emotion_result: EmotionResult) -> str:
-        """选择支持性结尾"""
-        emotion = emotion_result.primary_emotion
-        closers = self.SUPPORT_CLOSERS.get(emotion, self.SUPPORT_CLOSERS["neutral"])
-        
-        # 如果需要支持或情感强度较高
-        if emotion_result.needs_support or emotion_result.intensity > 0.6:
-            return random.choice(closers)
-        elif emotion_result.intensity > 0.3:
-            return random.choice(closers) if random.random() > 0.5 else ""
+        渲染只依赖情感签名、风格、表情级别与基础回应，以此为 key（基础回应取定长摘要，
+        key 的内存不随客户端传入的文本长度增长）；变体下标由种子（或随机数）决定，
+        变体本身用（渲染参数, 下标）派生的种子渲染
+        """
+        render_key = emotion_signature(emotion_result) + (style, emoji_level)
+        key = render_key + (hashlib.blake2b(base_response.encode(), digest_size=16).digest(),)
+        if seed is not None:
+            index = seed % self.cache.variants
         else:
-            return ""
-    
-    def _compose_response(self, opener: str, enhanced_response: str, 
-                          closer: str) -> str:
-        """组合回应"""
-        parts = []
+            index = int(random.random() * self.cache.variants)
         
-        if opener:
-            parts.append(opener)
+        cached = self.cache.get(key, index)
+        if cached is not None:
+            elements, (warm_text, warmth) = cached
+        else:
+            plan, elements = self._resolve_plan(emotion_result, style, emoji_level)
+            warm_text, warmth = self._render(
+                plan, emotion_result, base_response,
+                SeededRNG(stable_seed(*render_key, base_response, index))
+            )
+            self.cache.put(key, index, elements, (warm_text, warmth))
         
-        parts.append(enhanced_response)
+        return WarmResponse(
+            text=warm_text,
+            warmth_score=self._warmth_score(warmth, emotion_result.intensity),
+            style=style,
+            personalized_elements=elements
+        )
+    
+    def _resolve_plan(self, emotion_result: EmotionResult, style: str,
+                      emoji_level: str) -> Tuple["_RenderPlan", Tuple[str, ...]]:
+        """取渲染计划与个性化元素"""
+        plan = self._plans.get((emotion_result.primary_emotion, style, emoji_level))
+        if plan is None:
+            plan = self._get_fallback_plan(emotion_result.primary_emotion, style, emoji_level)
+            return plan, tuple(self._identify_personalized_elements(emotion_result, style, emoji_level))
         
-        if closer:
-            parts.append(closer)
+        if emotion_result.needs_support:
+            return plan, plan.elements + ("支持模式: 开启",)
+        return plan, plan.elements
+    
+    @staticmethod
+    def _warmth_score(warmth: float, intensity: float) -> float:
+        """加上强度部分，得到最终温暖度分数"""
+        return round(min(1.0, warmth + intensity * 0.1), 2)
+    
+    def _get_fallback_plan(self, emotion: str, style: str, emoji_level: str) -> "_RenderPlan":
+        """未知取值与其渲染效果等价的已知取值共用计划（不为任意输入新建计划）"""
+        # 未知情感按 neutral、未知风格按 balanced、未知表情级别按 none 渲染
+        if emotion not in self.EMOJI_MAP:
+            emotion = "neutral"
+        if style not in self.STYLE_TEMPLATES:
+            style = "balanced"
+        if emoji_level not in self.EMOJI_LEVELS:
+            emoji_level = "none"
+        return self._plans[(emotion, style, emoji_level)]
+    
+    def _compile_plan(self, emotion: str, style: str, emoji_level: str) -> "_RenderPlan":
+        """
+        编译渲染计划
         
-        # 用合适的连接词组合
-        if len(parts) == 1:
-            return parts[0]
-        elif len(parts) == 2:
-            return f"{parts[0]} {parts[1]}"
-        else:
-            return f"{parts[0]} {parts[1]} {parts[2]}"
+        模板中的固定文本在这里一次性完成风格替换；
+        运行时只对基础回应做风格处理，再按顺序拼接各片段
+        """
+        finish = _STYLE_FINISHERS.get(style)
+        
+        def styled(phrases: List[str]) -> Tuple[str, ...]:
+            return tuple(finish(phrase) if finish else phrase for phrase in phrases)
+        
+        emojis = tuple(self.EMOJI_MAP.get(emotion, self.EMOJI_MAP["neutral"]))
+        
+        # 不需要支持时的个性化元素与温暖度基础分
+        no_support = EmotionResult(emotion, [], 0.0, 0.0, [], [], False, "")
+        elements = tuple(self._identify_personalized_elements(no_support, style, emoji_level))
+        
+        return _RenderPlan(
+            openers=styled(self.EMPATHY_OPENERS.get(emotion, self.EMPATHY_OPENERS["neutral"])),
+            closers=styled(self.SUPPORT_CLOSERS.get(emotion, self.SUPPORT_CLOSERS["neutral"])),
+            enhance_phrases=styled(self.ENHANCE_PHRASES.get(emotion, [])),
+            enhance_separator=self.ENHANCE_SEPARATORS.get(emotion, "，"),
+            style_phrases=styled(self.STYLE_PHRASES.get(style, [])),
+            style_threshold=self.STYLE_PHRASE_THRESHOLDS.get(style, 1.0),
+            emojis=emojis,
+            emoji_pattern=re.compile("|".join(re.escape(emoji) for emoji in emojis)),
+            emoji_level=emoji_level,
+            professional=style == "professional",
+            finish=finish,
+            elements=elements,
+            warmth_base=self._warmth_base(emotion, style)
+        )
     
-    def _add_emojis(self, text: str, emotion_result: EmotionResult, 
-                    level: str) -> str:
-        """添加表情符号"""
-        if level == "none":
-            return text
+    def _render(self, plan: "_RenderPlan", emotion_result: EmotionResult,
+                base_response: str, rng=random) -> Tuple[str, float]:
+        """
+        按渲染计划生成回应文本
         
-        emotion = emotion_result.primary_emotion
-        emojis = self.EMOJI_MAP.get(emotion, self.EMOJI_MAP["neutral"])
+        Args:
+            rng: 随机源（``random`` 模块或 ``SeededRNG``）
         
+        Returns:
+            (回应文本, 不含强度部分的温暖度)
+        """
+        intensity = emotion_result.intensity
+        
+        # 1. 同理心开场白（根据强度选择）
+        opener = ""
+        if intensity > 0.7:
+            opener = rng.choice(plan.openers)
+        elif intensity > 0.4 and rng.random() > 0.3:
+            opener = rng.choice(plan.openers)
+        
+        # 2. 增强基础回应：情感短语在前，风格短语在最前
+        enhance_phrase = ""
+        if plan.enhance_phrases and rng.random() > 0.7:
+            enhance_phrase = rng.choice(plan.enhance_phrases)
+        
+        style_phrase = ""
+        if plan.style_phrases and rng.random() > plan.style_threshold:
+            style_phrase = rng.choice(plan.style_phrases)
+        
+        body = base_response
+        if plan.professional:
+            # 移除过于口语化的表达（前面有短语时只去掉结尾空白）
+            body = _COLLOQUIAL_PATTERN.sub("", body)
+            body = body.rstrip() if enhance_phrase else body.strip()
+        
+        # 3. 支持性结尾（需要支持或情感强度较高时）
+        closer = ""
+        if emotion_result.needs_support or intensity > 0.6:
+            closer = rng.choice(plan.closers)
+        elif intensity > 0.3 and rng.random() > 0.5:
+            closer = rng.choice(plan.closers)
+        
+        # 4. 表情符号（模板中不含表情，只需检查基础回应）
+        emoji_prefix = emoji_suffix = ""
+        level = plan.emoji_level
         if level == "low":
             # 只在结尾添加一个表情
-            if not any(char in text for char in emojis):
-                text = f"{text} {random.choice(emojis)}"
+            if not plan.emoji_pattern.search(body):
+                emoji_suffix = rng.choice(plan.emojis)
         elif level == "moderate":
-            # 在开头和结尾添加表情
-            if not text.startswith(tuple(emojis)):
-                text = f"{random.choice(emojis)} {text}"
+            # 在开头添加表情
+            if opener or style_phrase or enhance_phrase or not body.startswith(plan.emojis):
+                emoji_prefix = rng.choice(plan.emojis)
         elif level == "high":
-            # 多处添加表情
-            text = f"{random.choice(emojis)} {text} {random.choice(emojis)}"
+            # 开头和结尾都添加表情
+            emoji_prefix = rng.choice(plan.emojis)
+            emoji_suffix = rng.choice(plan.emojis)
         
-        return text
-    
-    def _apply_style(self, text: str, style: str) -> str:
-        """应用风格调整"""
-        if style == "casual":
-            # 添加一些口语化表达
-            text = text.replace("。", "～")
-        elif style == "professional":
-            # 确保正式和专业
-            text = text.replace("～", "。")
-            text = text.replace("哈哈", "")
-        
-        return text
+        # 5. 风格调整（模板部分已在编译时完成）
+        if plan.finish is not None:
+            body = plan.finish(body)
+        
+        # 6. 一次拼接
+        parts = []
+        if emoji_prefix:
+            parts += (emoji_prefix, " ")
+        if opener:
+            parts += (opener, " ")
+        if style_phrase:
+            parts += (style_phrase, "，")
+        if enhance_phrase:
+            parts += (enhance_phrase, plan.enhance_separator)
+        parts.append(body)
+        if closer:
+            parts += (" ", closer)
+        if emoji_suffix:
+            parts += (" ", emoji_suffix)
+        
+        # 7. 温暖度：基础分加上开场白与结尾的加分
+        warmth = plan.warmth_base
+        if opener:
+            warmth += 0.1
+        if closer:
+            warmth += 0.1
+        
+        return "".join(parts), warmth
     
-    def _calculate_warmth_score(self, emotion_result: EmotionResult, style: str,
-                                has_opener: bool, has_closer: bool) -> float:
-        """计算温暖度分数"""
+    def _warmth_base(self, emotion: str, style: str) -> float:
+        """温暖度的基础分（开场白、结尾与强度的加分在生成时累加）"""
         base_score = 0.5
         
         # 根据情感调整
-        if emotion_result.primary_emotion in ["sadness", "anxiety", "fear", "loneliness"]:
+        if emotion in ["sadness", "anxiety", "fear", "loneliness"]:
             base_score += 0.1  # 对负面情感更需要温暖
         
         # 根据风格调整
@@ -341,16 +494,7 @@ class WarmResponseEngine:
         }
         base_score += style_scores.get(style, 0.1)
         
-        # 根据元素调整
-        if has_opener:
-            base_score += 0.1
-        if has_closer:
-            base_score += 0.1
-        
-        # 根据情感强度调整
-        base_score += emotion_result.intensity * 0.1
-        
-        return round(min(1.0, base_score), 2)
+        return base_score
     
     def _identify_personalized_elements(self, emotion_result: EmotionResult,
                                         style: str, emoji_level: str) -> List[str]:
@@ -370,102 +514,6 @@ class WarmResponseEngine:
             elements.append("支持模式: 开启")
         
         return elements
-    
-    def _make_more_supportive(self, text: str) -> str:
-        """使回应更有支持性"""
-        supportive_phrases = [
-            "别担心",
-            "一切都会好起来的",
-            "你并不孤单",
-            "我相信你"
-        ]
-        
-        if random.random() > 0.7:
-            phrase = random.choice(supportive_phrases)
-            text = f"{phrase}，{text}"
-        
-        return text
-    
-    def _make_more_calming(self, text: str) -> str:
-        """使回应更 calming"""
-        calming_phrases = [
-            "冷静下来",
-            "深呼吸",
-            "放轻松",
-            "慢慢来"
-        ]
-        
-        if random.random() > 0.7:
-            phrase = random.choice(calming_phrases)
-            text = f"{phrase}，{text}"
-        
-        return text
-    
-    def _make_more_reassuring(self, text: str) -> str:
-        """使回应更让人安心"""
-        reassuring_phrases = [
-            "不用担心",
-            "没问题的",
-            "一切都会顺利",
-            "你可以的"
-        ]
-        
-        if random.random() > 0.7:
-            phrase = random.choice(reassuring_phrases)
-            text = f"{phrase}，{text}"
-        
-        return text
-    
-    def _make_more_celebratory(self, text: str) -> str:
-        """使回应更庆祝性"""
-        celebratory_phrases = [
-            "太棒了",
-            "值得庆祝",
-            "为你开心",
-            "真替你高兴"
-        ]
-        
-        if random.random() > 0.7:
-            phrase = random.choice(celebratory_phrases)
-            text = f"{phrase}！{text}"
-        
-        return text
-    
-    def _make_casual(self, text: str) -> str:
-        """使回应更随意"""
-        casual_additions = [
-            "哈哈",
-            "嗯嗯",
-            "好的呢",
-            "明白啦",
-            "没问题"
-        ]
-        
-        if random.random() > 0.7:
-            addition = random.choice(casual_additions)
-            text = f"{addition}，{text}"
-        
-        return text
-    
-    def _make_warmer(self, text: str) -> str:
-        """使回应更温暖"""
-        warm_additions = [
-            "亲爱的",
-            "朋友",
-            "伙伴"
-        ]
-        
-        if random.random() > 0.8:
-            addition = random.choice(warm_additions)
-            text = f"{addition}，{text}"
-        
-        return text
-    
-    def _make_professional(self, text: str) -> str:
-        """使回应更专业"""
-        # 移除过于口语化的表达
-        text = re.sub(r'(哈哈|嗯嗯|呢|啦|哦)', '', text)
-        return text.strip()
 
 
 # 全局温暖回应引擎实例
@@ -473,19 +521,30 @@ _warm_response_engine: Optional[WarmResponseEngine] = None
 
 
 def get_warm_response_engine() -> WarmResponseEngine:
-    """获取全局温暖回应引擎实例（单例模式）"""
+    """获取全局温暖回应引擎实例（单例，WARM_AGENT_RESPONSE_CACHE_SIZE=0 时不缓存）"""
     global _warm_response_engine
     if _warm_response_engine is None:
-        _warm_response_engine = WarmResponseEngine()
+        cache_size = int(os.getenv("WARM_AGENT_RESPONSE_CACHE_SIZE", "10000"))
+        cache = None
+        if cache_size > 0:
+            cache = ResponseVariantCache(
+                max_entries=cache_size,
+                variants=int(os.getenv("WARM_AGENT_RESPONSE_CACHE_VARIANTS", "8"))
+            )
+        _warm_response_engine = WarmResponseEngine(
+            deterministic=os.getenv("WARM_AGENT_RESPONSE_MODE", "random") == "deterministic",
+            cache=cache
+        )
     return _warm_response_engine
 
 
 # 便捷函数
 def generate_warm_response(emotion_result: EmotionResult, base_response: str,
-                           user_context: Optional[Dict] = None) -> WarmResponse:
+                           user_context: Optional[Dict] = None,
+                           seed: Optional[int] = None) -> WarmResponse:
     """便捷函数：生成温暖回应"""
     engine = get_warm_response_engine()
-    return engine.generate(emotion_result, base_response, user_context)
+    return engine.generate(emotion_result, base_response, user_context, seed=seed)
 
 
 if __name__ == "__main__":
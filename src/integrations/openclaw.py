@@ -6,6 +6,7 @@ OpenClaw 集成模块
 """
 
 import json
+from functools import partial
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass, asdict
 from datetime import datetime
@@ -13,9 +14,16 @@ from datetime import datetime
 from ..core.emotion_analyzer import get_emotion_analyzer, EmotionResult
 from ..core.warm_response_engine import get_warm_response_engine, WarmResponse
 from ..core.triggers import get_warm_agent_triggers
+from ..core.lexicon import LexiconMatch, get_lexicon_index
+from ..core.session_store import SessionState, get_session_store
+from ..core.interaction_recorder import get_interaction_recorder
+from ..utils.compat import DATACLASS_SLOTS
 
+# 会话状态写回冲突（其他 worker 同时更新了同一会话）时的最大重试次数
+SAVE_RETRIES = 5
 
-@dataclass
+
+@dataclass(**DATACLASS_SLOTS)
 class OpenClawMessage:
     """OpenClaw消息"""
     content: str
@@ -40,7 +48,7 @@ class OpenClawContext:
             self.user_context = {}
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class ProcessedMessage:
     """处理后的消息"""
     original: OpenClawMessage
@@ -60,12 +68,14 @@ class OpenClawIntegration:
     提供与OpenClaw的无缝集成
     """
     
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, session_store=None, recorder=None):
         """
         初始化集成
         
         Args:
             config: 配置字典
+            session_store: 会话状态存储（默认按环境变量选择内存或Redis）
+            recorder: 交互记录器（默认按环境变量选择写入端）
         """
         self.config = config
         
@@ -74,14 +84,22 @@ class OpenClawIntegration:
         self.warm_engine = get_warm_response_engine()
         self.triggers = get_warm_agent_triggers()
         
+        # 共享词库索引：每条消息只扫描一次，供指令检查、情感分析和触发器共用
+        self.lexicon = get_lexicon_index()
+        self.lexicon.register("openclaw_open", ["开启情感模式", "warm agent", "温暖模式", "开启温暖模式"])
+        self.lexicon.register("openclaw_close", ["关闭情感模式", "关闭温暖模式", "恢复正常模式", "退出情感支持"])
+        
         # OpenClaw特定配置
         self.skill_config = config.get("openclaw", {})
         self.auto_detect = self.skill_config.get("auto_detect", True)
         self.enhance_all = self.skill_config.get("enhance_all", False)
         self.default_warm_mode = self.skill_config.get("default_warm_mode", False)
         
-        # 用户状态管理
-        self.user_states = {}  # user_id -> UserState
+        # 用户状态管理（有界、可跨 worker 共享）
+        self.sessions = session_store or get_session_store()
+        
+        # 交互记录（只入队，后台批量写入）
+        self.recorder = recorder or get_interaction_recorder()
         
         print(f"✅ OpenClaw集成初始化完成")
         print(f"   自动检测: {self.auto_detect}")
@@ -90,38 +108,52 @@ class OpenClawIntegration:
     
     def process_message(self,
                        message: OpenClawMessage,
-                       context: OpenClawContext) -> ProcessedMessage:
+                       context: OpenClawContext,
+                       emotion_result: Optional[EmotionResult] = None) -> ProcessedMessage:
         """
         处理OpenClaw消息
         
         Args:
             message: OpenClaw消息
-            context: OpenClaw上下文
+            context: OpenClaw上下文（带 session_id 时状态按会话隔离）
+            emotion_result: 已有的情感分析结果（可选，如来自缓存或分析执行器）
             
         Returns:
             ProcessedMessage: 处理后的消息
         """
-        user_id = context.user_id
-        
-        # 1. 获取或创建用户状态
-        user_state = self._get_user_state(user_id)
-        
-        # 2. 检查显式指令
-        explicit_command = self._check_explicit_command(message.content)
+        # 1. 获取或创建用户状态，处理完成后写回存储
+        state_key = self._state_key(context)
+        user_state = self._get_user_state(state_key)
+        try:
+            return self._process_with_state(message, context, user_state, emotion_result)
+        finally:
+            self._save_user_state(state_key, user_state)
+    
+    def _process_with_state(self,
+                            message: OpenClawMessage,
+                            context: OpenClawContext,
+                            user_state: SessionState,
+                            emotion_result: Optional[EmotionResult]) -> ProcessedMessage:
+        """在已加载的会话状态上处理消息"""
+        # 2. 扫描词库（一次），检查显式指令
+        match = self.lexicon.scan(message.content)
+        explicit_command = self._check_explicit_command(message.content, match)
         if explicit_command is not None:
             return self._process_explicit_command(
                 message, context, user_state, explicit_command
             )
         
         # 3. 情感分析
-        emotion_result = self.emotion_analyzer.analyze(
-            message.content,
-            context=context.user_context
-        )
+        if emotion_result is None:
+            emotion_result = self.emotion_analyzer.analyze(
+                message.content,
+                context=context.user_context,
+                match=match
+            )
         
         # 4. 检查是否应该触发温暖模式
         should_enhance = self._should_enhance_response(
-            message, emotion_result, context, user_state
+            message, emotion_result, context, user_state, match
         )
         
         # 5. 生成温暖回应
@@ -129,19 +161,19 @@ class OpenClawIntegration:
             warm_response = self.warm_engine.generate(
                 emotion_result=emotion_result,
                 base_response=message.base_response,
-                user_context=context.user_context
+                user_context=context.user_context,
+                seed=self.warm_engine.seed_for(context.user_id, message.content)
             )
             
             # 6. 更新用户状态
             self._update_user_state(user_state, {
                 "last_emotion": emotion_result.primary_emotion,
                 "last_intensity": emotion_result.intensity,
-                "warm_mode": True,
-                "last_interaction": datetime.utcnow().isoformat()
+                "warm_mode": True
             })
             
-            # 7. 记录交互（实际实现中会存储到数据库）
-            self._record_interaction(user_id, message, emotion_result, warm_response)
+            # 7. 记录交互（入队后由后台线程写入）
+            self._record_interaction(context, message, emotion_result, warm_response)
             
             return ProcessedMessage(
                 original=message,
@@ -150,16 +182,12 @@ class OpenClawIntegration:
                 should_enhance=True,
                 enhancement_metadata={
                     "warmth_score": warm_response.warmth_score,
-                    "personalized": warm_response.personalized_elements,
-                    "enhancement_details": warm_response.enhancement_details
+                    "personalized": list(warm_response.personalized_elements)
                 }
             )
         else:
             # 不增强，返回原始回应
-            self._update_user_state(user_state, {
-                "warm_mode": False,
-                "last_interaction": datetime.utcnow().isoformat()
-            })
+            self._update_user_state(user_state, {"warm_mode": False})
             
             return ProcessedMessage(
                 original=message,
@@ -168,19 +196,40 @@ class OpenClawIntegration:
                 should_enhance=False
             )
     
-    def _get_user_state(self, user_id: str) -> Dict:
-        """获取用户状态"""
-        if user_id not in self.user_states:
-            # 初始化用户状态
-            self.user_states[user_id] = {
-                "warm_mode": self.default_warm_mode,
-                "preferences": self._get_default_preferences(),
-                "interaction_count": 0,
-                "last_interaction": None,
-                "emotion_history": []
-            }
-        
-        return self.user_states[user_id]
+    @staticmethod
+    def _state_key(context: OpenClawContext) -> str:
+        """状态键：有会话ID时按会话隔离，否则按用户"""
+        return context.session_id or context.user_id
+    
+    def end_session(self, session_id: str):
+        """会话结束时释放其状态"""
+        self.sessions.delete(session_id)
+    
+    def _get_user_state(self, user_id: str) -> SessionState:
+        """获取用户状态（不存在时初始化）"""
+        user_state = self.sessions.get(user_id)
+        if user_state is None:
+            user_state = SessionState(warm_mode=self.default_warm_mode)
+        return user_state
+    
+    def _save_user_state(self, state_key: str, user_state: SessionState):
+        """
+        写回用户状态（乐观并发）
+
+        存储中的版本已被其他 worker 更新时，重新读取并在最新状态上重放本次的修改，
+        双方的温暖模式切换、交互计数和情感记录都不会丢失
+        """
+        state = user_state
+        for _ in range(SAVE_RETRIES):
+            if self.sessions.compare_and_set(state_key, state):
+                return
+            state = self._get_user_state(state_key)
+            state.replay(user_state.changes)
+        print(f"Session state save gave up after {SAVE_RETRIES} conflicts: {state_key}")
+    
+    def _get_preferences(self, user_state: SessionState) -> Dict:
+        """默认偏好合并用户设置"""
+        return {**self._get_default_preferences(), **user_state.preferences}
     
     def _get_default_preferences(self) -> Dict:
         """获取默认偏好"""
@@ -192,35 +241,31 @@ class OpenClawIntegration:
             "always_warm": False
         }
     
-    def _check_explicit_command(self, text: str) -> Optional[str]:
+    def _check_explicit_command(self, text: str,
+                                match: Optional[LexiconMatch] = None) -> Optional[str]:
         """检查显式指令"""
-        open_commands = ["开启情感模式", "warm agent", "温暖模式", "开启温暖模式"]
-        close_commands = ["关闭情感模式", "关闭温暖模式", "恢复正常模式", "退出情感支持"]
+        if match is None:
+            match = self.lexicon.scan(text)
         
-        for cmd in open_commands:
-            if cmd in text:
-                return "open"
+        if match.entries("openclaw_open"):
+            return "open"
         
-        for cmd in close_commands:
-            if cmd in text:
-                return "close"
+        if match.entries("openclaw_close"):
+            return "close"
         
         return None
     
     def _process_explicit_command(self,
                                  message: OpenClawMessage,
                                  context: OpenClawContext,
-                                 user_state: Dict,
+                                 user_state: SessionState,
                                  command: str) -> ProcessedMessage:
         """处理显式指令"""
         user_id = context.user_id
         
         if command == "open":
             # 开启温暖模式
-            self._update_user_state(user_state, {
-                "warm_mode": True,
-                "last_interaction": datetime.utcnow().isoformat()
-            })
+            self._update_user_state(user_state, {"warm_mode": True})
             
             response = "✅ 好的，温暖模式已开启！✨ 从现在开始，我会用更温暖的方式回应你～"
             
@@ -246,10 +291,7 @@ class OpenClawIntegration:
         
         else:  # command == "close"
             # 关闭温暖模式
-            self._update_user_state(user_state, {
-                "warm_mode": False,
-                "last_interaction": datetime.utcnow().isoformat()
-            })
+            self._update_user_state(user_state, {"warm_mode": False})
             
             response = "✅ 好的，情感模式已关闭。需要的时候随时说'开启情感模式'或使用情感词触发哦！😊"
             
@@ -276,7 +318,8 @@ class OpenClawIntegration:
                                 message: OpenClawMessage,
                                 emotion_result: EmotionResult,
                                 context: OpenClawContext,
-                                user_state: Dict) -> bool:
+                                user_state: SessionState,
+                                match: Optional[LexiconMatch] = None) -> bool:
         """
         判断是否应该增强回应
         
@@ -285,6 +328,7 @@ class OpenClawIntegration:
             emotion_result: 情感分析结果
             context: OpenClaw上下文
             user_state: 用户状态
+            match: 词库扫描结果（可选）
             
         Returns:
             bool: 是否应该增强
@@ -294,19 +338,18 @@ class OpenClawIntegration:
             return True
         
         # 2. 如果用户处于温暖模式
-        if user_state.get("warm_mode", False):
+        if user_state.warm_mode:
             return True
         
         # 3. 如果用户偏好总是温暖
-        preferences = user_state.get("preferences", {})
-        if preferences.get("always_warm", False):
+        if self._get_preferences(user_state).get("always_warm", False):
             return True
         
         # 4. 检查情感触发
         if self.auto_detect:
             # 使用关键词触发器
             should_trigger, trigger_info = self.triggers.should_trigger_warm_mode(
-                message.content
+                message.content, match=match
             )
             
             if should_trigger:
@@ -325,105 +368,93 @@ class OpenClawIntegration:
         
         return False
     
-    def _update_user_state(self, user_state: Dict, updates: Dict):
-        """更新用户状态"""
-        user_state.update(updates)
+    def _update_user_state(self, user_state: SessionState, updates: Dict):
+        """更新用户状态（交互计数与最近交互时间随之更新；修改会被记录，写回冲突时重放）"""
+        # 温暖模式没有变化时不记入修改，重放时不覆盖其他 worker 的切换
+        if updates.get("warm_mode", user_state.warm_mode) == user_state.warm_mode:
+            updates = {key: value for key, value in updates.items() if key != "warm_mode"}
+        user_state.apply(partial(self._apply_updates, updates=updates))
+    
+    @staticmethod
+    def _apply_updates(user_state: SessionState, updates: Dict):
+        """把一次更新应用到状态上"""
+        if "warm_mode" in updates:
+            user_state.warm_mode = updates["warm_mode"]
         
-        # 更新交互计数
-        if "interaction_count" in user_state:
-            user_state["interaction_count"] += 1
+        user_state.touch()
         
-        # 更新情感历史
+        # 更新情感历史（只保留最近的记录）
         if "last_emotion" in updates:
-            emotion = updates["last_emotion"]
-            intensity = updates.get("last_intensity", 0.0)
-            
-            if "emotion_history" not in user_state:
-                user_state["emotion_history"] = []
-            
-            user_state["emotion_history"].append({
-                "emotion": emotion,
-                "intensity": intensity,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            # 只保留最近50条记录
-            if len(user_state["emotion_history"]) > 50:
-                user_state["emotion_history"] = user_state["emotion_history"][-50:]
+            user_state.record_emotion(
+                updates["last_emotion"],
+                updates.get("last_intensity", 0.0)
+            )
     
     def _record_interaction(self,
-                           user_id: str,
+                           context: OpenClawContext,
                            message: OpenClawMessage,
                            emotion_result: EmotionResult,
                            warm_response: WarmResponse):
-        """记录交互（模拟实现）"""
-        # 在实际实现中，这里会存储到数据库
-        interaction = {
-            "user_id": user_id,
-            "timestamp": datetime.utcnow().isoformat(),
-            "user_input": message.content,
-            "emotion_data": emotion_result.to_dict(),
-            "response": warm_response.text,
-            "metadata": message.metadata
-        }
-        
-        # 这里只是打印，实际实现中会存储
-        print(f"📝 记录交互: {json.dumps(interaction, ensure_ascii=False, indent=2)}")
+        """记录交互（不在消息路径上做序列化和 I/O）"""
+        self.recorder.record(
+            context.user_id,
+            context.channel,
+            context.session_id,
+            message.content,
+            emotion_result,
+            warm_response.text,
+            message.metadata
+        )
     
     def get_user_summary(self, user_id: str) -> Dict:
         """获取用户摘要"""
-        if user_id not in self.user_states:
+        user_state = self.sessions.get(user_id)
+        if user_state is None:
             return {"error": "User not found"}
         
-        user_state = self.user_states[user_id]
+        last_interaction = None
+        if user_state.last_interaction is not None:
+            last_interaction = datetime.utcfromtimestamp(user_state.last_interaction).isoformat()
         
-        # 分析情感历史
-        emotion_history = user_state.get("emotion_history", [])
+        # 情感历史的计数与均值随写入增量维护
+        emotion_history = user_state.emotion_history
         if emotion_history:
-            emotions = [e["emotion"] for e in emotion_history]
-            intensities = [e["intensity"] for e in emotion_history]
-            
-            from collections import Counter
-            emotion_counter = Counter(emotions)
-            
             summary = {
                 "user_id": user_id,
-                "total_interactions": user_state.get("interaction_count", 0),
-                "warm_mode": user_state.get("warm_mode", False),
-                "most_common_emotion": emotion_counter.most_common(1)[0] if emotion_counter else None,
-                "average_intensity": sum(intensities) / len(intensities) if intensities else 0,
-                "recent_emotions": emotions[-10:] if len(emotions) > 10 else emotions,
-                "last_interaction": user_state.get("last_interaction"),
-                "preferences": user_state.get("preferences", {})
+                "total_interactions": user_state.interaction_count,
+                "warm_mode": user_state.warm_mode,
+                "most_common_emotion": emotion_history.most_common(),
+                "average_intensity": round(emotion_history.mean_intensity(), 4),
+                "recent_emotions": emotion_history.recent(10),
+                "last_interaction": last_interaction,
+                "preferences": self._get_preferences(user_state)
             }
         else:
             summary = {
                 "user_id": user_id,
-                "total_interactions": user_state.get("interaction_count", 0),
-                "warm_mode": user_state.get("warm_mode", False),
+                "total_interactions": user_state.interaction_count,
+                "warm_mode": user_state.warm_mode,
                 "message": "暂无情感记录",
-                "last_interaction": user_state.get("last_interaction"),
-                "preferences": user_state.get("preferences", {})
+                "last_interaction": last_interaction,
+                "preferences": self._get_preferences(user_state)
             }
         
         return summary
     
     def update_user_preferences(self, user_id: str, preferences: Dict) -> Dict:
         """更新用户偏好"""
-        if user_id not in self.user_states:
+        user_state = self.sessions.get(user_id)
+        if user_state is None:
             return {"error": "User not found"}
         
-        user_state = self.user_states[user_id]
-        
-        # 合并偏好
-        current_preferences = user_state.get("preferences", {})
-        current_preferences.update(preferences)
-        user_state["preferences"] = current_preferences
+        # 合并偏好（只保存用户设置，默认值不入存储）
+        user_state.apply(lambda state: state.preferences.update(preferences))
+        self._save_user_state(user_id, user_state)
         
         return {
             "success": True,
             "user_id": user_id,
-            "updated_preferences": current_preferences
+            "updated_preferences": self._get_preferences(user_state)
         }
 
 
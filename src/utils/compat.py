@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+版本兼容
+"""
+
+import sys
+
+# dataclass 的 slots 参数需要 Python 3.10+，更早的版本退回普通 dataclass：
+# @dataclass(**DATACLASS_SLOTS)
+DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
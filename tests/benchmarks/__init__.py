@@ -0,0 +1,5 @@
+"""
+核心引擎微基准
+
+    python -m tests.benchmarks.runner --baseline tests/benchmarks/baseline.json
+"""
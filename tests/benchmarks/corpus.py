@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成中文聊天语料
+片段表固定写在本文件中（不读取当前词库），同一种子在任何版本上生成的语料都相同，
+不同版本的基准结果因此可以直接对比
+"""
+
+import random
+from typing import Dict, List
+
+# 不含任何情感词、否定词、程度词与需求词的日常片段
+NEUTRAL_FRAGMENTS = [
+    "今天", "下午", "刚刚", "周末", "晚上", "我们", "同事", "室友", "地铁上",
+    "吃了一碗面", "开了一个会", "看了一部电影", "去超市买菜", "准备出门",
+    "天气预报说明天下雨", "楼下新开了一家店", "在整理房间", "喝了杯咖啡",
+    "项目进度还行", "路上车挺多", "晚饭吃什么", "快递到了", "换了个手机壳",
+    "这周要交报告", "在看书", "打算早点睡", "周五一起吃饭吧", "小区里在修路",
+]
+
+# 情感词、否定词、程度词与需求词（关键词密集文本用）
+KEYWORD_FRAGMENTS = [
+    "开心", "高兴", "难过", "伤心", "生气", "烦死了", "焦虑", "担心", "压力",
+    "害怕", "孤独", "寂寞", "谢谢", "感动", "失落", "委屈", "想哭", "太好了",
+    "不", "没有", "非常", "特别", "有点", "需要安慰", "好累", "不知所措",
+]
+
+PUNCTUATION = ["，", "。", "！", "？", "……", "～"]
+
+# 各类文本的长度范围（字符数）
+LENGTHS = {
+    "short": (4, 16),
+    "medium": (40, 200),
+    "long": (10000, 10000),
+    "keyword_dense": (30, 120),
+    "keyword_free": (20, 150),
+}
+
+CATEGORIES = tuple(LENGTHS)
+
+
+def _build_text(rng: random.Random, length: int, keyword_ratio: float) -> str:
+    """拼接片段直到达到目标长度（超出部分截断）"""
+    pieces: List[str] = []
+    size = 0
+    while size < length:
+        if rng.random() < keyword_ratio:
+            piece = rng.choice(KEYWORD_FRAGMENTS)
+        else:
+            piece = rng.choice(NEUTRAL_FRAGMENTS)
+        if rng.random() < 0.4:
+            piece += rng.choice(PUNCTUATION)
+        pieces.append(piece)
+        size += len(piece)
+    return "".join(pieces)[:length]
+
+
+def generate_corpus(seed: int = 20240501, size: int = 200,
+                    long_size: int = 20) -> Dict[str, List[str]]:
+    """
+    生成语料
+
+    Args:
+        seed: 随机种子
+        size: 每类文本的条数
+        long_size: 万字长文本的条数
+
+    Returns:
+        Dict[str, List[str]]: 类别 -> 文本列表
+    """
+    keyword_ratios = {
+        "short": 0.3,
+        "medium": 0.2,
+        "long": 0.1,
+        "keyword_dense": 0.9,
+        "keyword_free": 0.0,
+    }
+    corpus = {}
+    for category in CATEGORIES:
+        # 每类使用独立的随机序列，调整某一类不影响其他类
+        rng = random.Random(f"{seed}:{category}")
+        low, high = LENGTHS[category]
+        count = long_size if category == "long" else size
+        corpus[category] = [
+            _build_text(rng, rng.randint(low, high), keyword_ratios[category])
+            for _ in range(count)
+        ]
+    return corpus
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+核心引擎微基准
+对每个被测函数、每类语料逐次计时，输出吞吐（ops/sec）与延迟分位数（JSON）；
+指定 --baseline 时与保存的结果对比，吞吐下降超过阈值即视为回退（退出码 1）
+
+    python -m tests.benchmarks.runner --output bench.json
+    python -m tests.benchmarks.runner --baseline tests/benchmarks/baseline.json --threshold 0.2
+    python -m tests.benchmarks.runner --save-baseline tests/benchmarks/baseline.json
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import contextlib
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+from src.core.emotion_analyzer import get_emotion_analyzer
+from src.core.warm_response_engine import get_warm_response_engine
+from src.core.triggers import get_warm_agent_triggers
+from src.core.session_store import MemorySessionStore
+from src.core.interaction_recorder import InteractionRecorder, NullInteractionWriter
+from src.integrations.openclaw import OpenClawContext, OpenClawIntegration, OpenClawMessage
+
+from tests.benchmarks.corpus import CATEGORIES, generate_corpus
+
+# 每类语料的计时次数（乘以 --scale）；万字文本单次较慢，次数相应减少
+ITERATIONS = {
+    "short": 2000,
+    "medium": 1000,
+    "long": 40,
+    "keyword_dense": 1000,
+    "keyword_free": 1000,
+}
+
+# 正式计时前的预热次数（不计入结果）
+WARMUP = 20
+
+# 每项重复计时的轮数，取最快的一轮（与 timeit 的建议相同，排除机器上其他负载的干扰）
+REPEAT = 3
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def build_targets(corpus: Dict[str, List[str]]) -> Dict[str, Callable[[str], Any]]:
+    """被测函数：文本 -> 一次调用（依赖的分析结果等输入预先准备，不计入计时）"""
+    analyzer = get_emotion_analyzer()
+    engine = get_warm_response_engine()
+    triggers = get_warm_agent_triggers()
+    integration = OpenClawIntegration(
+        {"openclaw": {"auto_detect": True}},
+        session_store=MemorySessionStore(),
+        recorder=InteractionRecorder(NullInteractionWriter())
+    )
+    results = {text: analyzer.analyze(text) for texts in corpus.values() for text in texts}
+    user_context = {"preferences": {"style": "warm", "emoji_level": "moderate"}}
+
+    def analyze(text: str):
+        return analyzer.analyze(text)
+
+    def generate(text: str):
+        return engine.generate(results[text], "我在这里陪着你。", user_context)
+
+    def should_trigger(text: str):
+        return triggers.should_trigger_warm_mode(text)
+
+    def process_message(text: str):
+        return integration.process_message(
+            OpenClawMessage(content=text, base_response="我在这里陪着你。"),
+            OpenClawContext(user_id="bench_user", channel="bench", user_context=user_context)
+        )
+
+    return {
+        "emotion_analyzer.analyze": analyze,
+        "warm_response_engine.generate": generate,
+        "triggers.should_trigger_warm_mode": should_trigger,
+        "openclaw.process_message": process_message,
+    }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """线性插值分位数（输入已排序）"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _time_calls(func: Callable[[str], Any], texts: List[str], iterations: int) -> List[float]:
+    """一轮计时：每次调用的延迟（微秒；与 timeit 一样计时期间关闭 GC）"""
+    clock = time.perf_counter_ns
+    latencies = []
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for index in range(iterations):
+            text = texts[index % len(texts)]
+            start = clock()
+            func(text)
+            latencies.append((clock() - start) / 1000)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return latencies
+
+
+def measure(func: Callable[[str], Any], texts: List[str], iterations: int,
+            repeat: int = REPEAT) -> Dict[str, float]:
+    """重复计时并取最快的一轮，返回吞吐与延迟统计（延迟单位为微秒）"""
+    for text in texts[:WARMUP]:
+        func(text)
+
+    latencies = min(
+        (_time_calls(func, texts, iterations) for _ in range(repeat)),
+        key=statistics.fmean
+    )
+    latencies.sort()
+    stats = {
+        "iterations": iterations,
+        "repeat": repeat,
+        "ops_per_sec": round(1e6 / statistics.fmean(latencies), 1),
+        "mean_us": round(statistics.fmean(latencies), 2),
+    }
+    for pct in PERCENTILES:
+        stats[f"p{pct}_us"] = round(percentile(latencies, pct), 2)
+    return stats
+
+
+def run(scale: float = 1.0, seed: int = 20240501, repeat: int = REPEAT,
+        targets: Optional[List[str]] = None) -> Dict[str, Any]:
+    """运行全部基准"""
+    corpus = generate_corpus(seed=seed)
+    # 组件初始化的提示信息输出到 stderr，标准输出只留给 JSON 结果
+    with contextlib.redirect_stdout(sys.stderr):
+        functions = build_targets(corpus)
+    if targets:
+        functions = {name: func for name, func in functions.items() if name in targets}
+
+    # 引擎内部的随机选择也固定种子，保证每次运行走相同的分支
+    random.seed(seed)
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for name, func in functions.items():
+        results[name] = {
+            category: measure(
+                func, corpus[category], max(1, int(ITERATIONS[category] * scale)), repeat
+            )
+            for category in CATEGORIES
+        }
+
+    return {
+        "metadata": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "scale": scale,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float) -> List[Dict[str, Any]]:
+    """
+    对比吞吐
+
+    Args:
+        current: 本次结果
+        baseline: 基线结果
+        threshold: 允许的吞吐下降比例（0.2 表示下降超过 20% 视为回退）
+
+    Returns:
+        List[Dict]: 回退项（基线中不存在的项不比较）
+    """
+    regressions = []
+    for name, categories in current["results"].items():
+        for category, stats in categories.items():
+            expected = baseline.get("results", {}).get(name, {}).get(category)
+            if not expected:
+                continue
+            change = stats["ops_per_sec"] / expected["ops_per_sec"] - 1
+            if change < -threshold:
+                regressions.append({
+                    "target": name,
+                    "category": category,
+                    "baseline_ops_per_sec": expected["ops_per_sec"],
+                    "ops_per_sec": stats["ops_per_sec"],
+                    "change": round(change, 4),
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="核心引擎微基准")
+    parser.add_argument("--scale", type=float, default=1.0, help="计时次数的倍数")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="每项重复计时的轮数（取最快的一轮）")
+    parser.add_argument("--seed", type=int, default=20240501, help="语料与引擎的随机种子")
+    parser.add_argument("--target", action="append", help="只运行指定的被测函数（可重复）")
+    parser.add_argument("--output", help="结果写入的 JSON 文件（默认输出到标准输出）")
+    parser.add_argument("--baseline", help="对比的基线 JSON 文件")
+    parser.add_argument(
+        "--threshold", type=float,
+        default=float(os.getenv("WARM_AGENT_BENCH_THRESHOLD", "0.2")),
+        help="允许的吞吐下降比例"
+    )
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    args = parser.parse_args()
+
+    report = run(scale=args.scale, seed=args.seed, repeat=args.repeat, targets=args.target)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        report["comparison"] = {
+            "baseline": args.baseline,
+            "threshold": args.threshold,
+            "regressions": regressions,
+        }
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({key: report[key] for key in ("metadata", "results")}, f,
+                      ensure_ascii=False, indent=2)
+            f.write("\n")
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准套件测试
+语料与对比逻辑每次都测；完整基准较慢，仅在 WARM_AGENT_BENCHMARKS=1 时运行
+"""
+
+import os
+import json
+
+import pytest
+
+from tests.benchmarks.corpus import CATEGORIES, generate_corpus
+from tests.benchmarks.runner import compare, run
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def test_corpus_is_reproducible():
+    """测试同一种子生成相同语料，且各类长度符合预期"""
+    corpus = generate_corpus(seed=7, size=20, long_size=2)
+
+    assert corpus == generate_corpus(seed=7, size=20, long_size=2)
+    assert corpus != generate_corpus(seed=8, size=20, long_size=2)
+    assert set(corpus) == set(CATEGORIES)
+    assert all(len(text) == 10000 for text in corpus["long"])
+    assert all(len(text) <= 16 for text in corpus["short"])
+
+
+def test_compare_flags_regressions():
+    """测试吞吐下降超过阈值才算回退"""
+    baseline = {"results": {"f": {"short": {"ops_per_sec": 1000.0}}}}
+
+    assert compare({"results": {"f": {"short": {"ops_per_sec": 850.0}}}}, baseline, 0.2) == []
+    regressions = compare({"results": {"f": {"short": {"ops_per_sec": 700.0}}}}, baseline, 0.2)
+    assert [(item["target"], item["category"]) for item in regressions] == [("f", "short")]
+    # 基线中没有的项不比较
+    assert compare({"results": {"g": {"short": {"ops_per_sec": 1.0}}}}, baseline, 0.2) == []
+
+
+@pytest.mark.skipif(os.getenv("WARM_AGENT_BENCHMARKS") != "1",
+                    reason="set WARM_AGENT_BENCHMARKS=1 to run benchmarks")
+def test_no_regression_against_baseline():
+    """测试吞吐相对保存的基线没有回退"""
+    with open(BASELINE_PATH, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    report = run(scale=float(os.getenv("WARM_AGENT_BENCH_SCALE", "1.0")))
+    threshold = float(os.getenv("WARM_AGENT_BENCH_THRESHOLD", "0.2"))
+    assert compare(report, baseline, threshold) == []
@@ -50,6 +50,93 @@ class TestAPI:
         assert data["status"] == "healthy"
         assert "components" in data
     
+    def test_readiness_check(self, client):
+        """测试分词词典加载后就绪"""
+        from src.api.main import emotion_analyzer
+        
+        emotion_analyzer.tokenizer.initialize()
+        response = client.get("/ready")
+        
+        assert response.status_code == 200
+        assert response.json()["ready"] is True
+        assert client.get("/health").json()["components"]["tokenizer"] == "ok"
+    
+    def test_serialize_once(self):
+        """测试一次编码的响应体与标准JSON等价"""
+        from src.api.serialization import JSONBytesResponse, dumps, render_list_envelope
+        
+        items = [{"primary_emotion": "sadness", "intensity": 0.75}, {"keywords": ["难过"]}]
+        metadata = {"user_id": "u1", "quota_remaining": 3}
+        body = render_list_envelope([dumps(item) for item in items], metadata)
+        
+        assert json.loads(body) == {"success": True, "data": items, "metadata": metadata}
+        assert "难过".encode("utf-8") in body
+        response = JSONBytesResponse(body)
+        assert response.body == body
+        assert response.headers["content-type"] == "application/json"
+        assert response.headers["content-length"] == str(len(body))
+    
+    def test_stream_requires_api_key(self, client):
+        """测试WebSocket未提供API Key时以4401关闭"""
+        from starlette.websockets import WebSocketDisconnect
+        
+        with client.websocket_connect("/v1/stream") as websocket:
+            message = websocket.receive_json()
+            assert message["type"] == "error"
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                websocket.receive_json()
+        
+        assert exc_info.value.code == 4401
+    
+    def test_stream_survives_bad_message(self, client, monkeypatch):
+        """测试单条消息的 context 非法时只回错误帧，连接继续可用且不扣额度"""
+        from datetime import datetime
+        from types import SimpleNamespace
+        from src.api import main
+        from src.core.user_manager import User
+        
+        now = datetime.now()
+        user = User("u1", "u1@example.com", "key", "free", 0, 100, True, now, now)
+        quota = SimpleNamespace(used=0)
+        
+        async def lookup_user(api_key):
+            return user
+        
+        async def consume_quota(api_key, cost=1):
+            quota.used += cost
+            return 100 - quota.used
+        
+        async def refund_quota(api_key, amount):
+            quota.used -= amount
+        
+        monkeypatch.setattr(main, "lookup_user", lookup_user)
+        monkeypatch.setattr(main, "user_manager",
+                            SimpleNamespace(consume_quota=consume_quota, refund_quota=refund_quota))
+        monkeypatch.setattr(main, "usage_buffer", SimpleNamespace(record=lambda *args: None))
+        
+        with client.websocket_connect("/v1/stream?api_key=key") as websocket:
+            for context in ("abc", ["x"], {"preferences": "warm"}):
+                websocket.send_text(json.dumps({"id": 1, "text": "我好难过，需要安慰", "context": context}))
+                message = websocket.receive_json()
+                assert message["type"] == "error"
+                assert message["id"] == 1
+        
+            websocket.send_text(json.dumps({"id": 2, "text": "我好难过，需要安慰"}))
+            message = websocket.receive_json()
+            assert message["type"] == "result"
+            assert message["id"] == 2
+        
+        assert quota.used == 1
+    
+    def test_metrics_endpoint(self, client):
+        """测试Prometheus指标端点"""
+        client.get("/health")
+        response = client.get("/metrics")
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'endpoint="/health"' in response.text
+    
     def test_emotion_analysis_without_auth(self, client):
         """测试未认证的情感分析"""
         data = {"text": "今天心情很好"}
@@ -255,7 +342,7 @@ class TestAPI:
             {"text": "需要安慰"}
         ]
         
-        response = client.post("/v1/batch/emotion/analyze",
+        response = client.post("/v1/emotion/analyze/batch",
                               json=data,
                               headers=headers)
         
@@ -8,13 +8,32 @@
 import pytest
 import sys
 import os
+import asyncio
+import json
+from datetime import date
 
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src.core.emotion_analyzer import EmotionAnalyzer, EmotionResult
+from src.core.emotion_analyzer import EmotionAnalyzer, EmotionResult, EmotionType
 from src.core.warm_response_engine import WarmResponseEngine, WarmResponse
 from src.core.triggers import WarmAgentTriggers
+from src.core.analysis_executor import AnalysisExecutor
+from src.core.batch_scoring import NUMPY_AVAILABLE
+from src.core.cache import CacheManager
+from src.core.db_pool import ConnectionPool, PoolTimeoutError, _PooledConnection
+from src.core.lexicon import KeywordAutomaton, LexiconIndex
+from src.core.async_user_manager import AsyncUserManager
+from src.core.auth_cache import AuthCache
+from src.core.usage_buffer import UsageLogBuffer
+from src.core.quota_meter import QuotaMeter
+from src.core.session_store import MemorySessionStore, SessionState
+from src.core.emotion_history import EmotionHistory
+from src.core.interaction_recorder import InteractionRecorder, JsonlInteractionWriter
+from src.core.response_cache import ResponseVariantCache, emotion_signature
+from src.core.tokenizer import Tokenizer
+from src.core.usage_rollup import _add_months
+from src.core.user_manager import User, UserManagerBase
 
 
 class TestEmotionAnalyzer:
@@ -54,6 +73,20 @@ class TestEmotionAnalyzer:
         assert result.primary_emotion != "sadness"
         assert result.intensity < 0.3
     
+    def test_negation_uses_single_segmentation(self, analyzer, monkeypatch):
+        """测试只在含否定词时分词，且否定范围一次扫描得出"""
+        calls = []
+        tokenize = analyzer.tokenizer.tokenize
+        monkeypatch.setattr(analyzer.tokenizer, "tokenize",
+                            lambda text: calls.append(text) or tokenize(text))
+        
+        analyzer.analyze("今天很开心")
+        assert calls == []
+        
+        analyzer.analyze("我不开心，也没难过")
+        assert calls == ["我不开心，也没难过"]
+        assert analyzer._negated_emotions(tokenize("我不开心，也没难过")) == ["joy", "sadness"]
+    
     def test_analyze_empty_text(self, analyzer):
         """测试空文本"""
         text = ""
@@ -84,6 +117,35 @@ class TestEmotionAnalyzer:
         result = analyzer.analyze(text)
         assert result.primary_emotion == expected_emotion
     
+    def test_analyze_many_matches_analyze(self, analyzer):
+        """测试批量分析与逐条分析结果一致"""
+        texts = ["今天很开心！", "我不难过", "", "好累，怎么办？", "普通的天气"]
+        results = analyzer.analyze_many(texts)
+        
+        assert len(results) == len(texts)
+        assert results == [analyzer.analyze(text) for text in texts]
+    
+    @pytest.mark.skipif(not NUMPY_AVAILABLE, reason="numpy not installed")
+    def test_vectorized_batch_matches_analyze(self, analyzer):
+        """测试向量化批量打分与逐条分析逐位一致"""
+        import random
+        
+        rng = random.Random(7)
+        pieces = (
+            [word for words in analyzer.EMOTION_KEYWORDS.values() for word in words]
+            + analyzer.NEGATION_WORDS * 3
+            + [word for words in analyzer.INTENSITY_MODIFIERS.values() for word in words]
+            + analyzer.NEED_SUPPORT_KEYWORDS
+            + ["！", "？", "，", "今天", "工作", "朋友", "的", "我"]
+        )
+        texts = [
+            "".join(rng.choice(pieces) for _ in range(rng.randint(1, 10)))
+            for _ in range(400)
+        ] + ["", "不开心", "没难过", "x" * 600 + "开心"]
+        
+        assert len(texts) >= analyzer.VECTORIZE_MIN_BATCH
+        assert analyzer.analyze_many(texts) == [analyzer.analyze(text) for text in texts]
+    
     def test_context_analysis(self, analyzer):
         """测试上下文分析"""
         text = "工作压力大"
@@ -96,6 +158,936 @@ class TestEmotionAnalyzer:
         
         assert "work" in result.context_hints
         assert result.intensity > 0.5
+    
+    def test_result_is_compact(self, analyzer):
+        """测试结果使用元组与共享的情感名，且字典往返不变"""
+        result = analyzer.analyze("工作压力好大，有点焦虑", {"topic": "work"})
+        restored = EmotionResult.from_dict(json.loads(json.dumps(result.to_dict())))
+    
+        assert restored == result
+        assert isinstance(restored.keywords, tuple)
+        assert isinstance(restored.to_dict()["keywords"], list)
+        assert restored.primary_emotion is EmotionType(result.primary_emotion).value
+        if sys.version_info >= (3, 10):
+            assert not hasattr(restored, "__dict__")
+
+
+class TestTokenizer:
+    """分词器测试"""
+    
+    def test_lazy_load_and_cache(self, tmp_path):
+        """测试首次分词时才加载词典，之后从缓存文件加载"""
+        tokenizer = Tokenizer(["气死我了"], cache_dir=str(tmp_path))
+        assert not tokenizer.ready
+        
+        words = tokenizer.cut("真是气死我了")
+        assert "气死我了" in words
+        assert tokenizer.ready
+        assert not tokenizer.loaded_from_cache
+        assert os.path.exists(tokenizer.cache_path)
+        
+        cached = Tokenizer(["气死我了"], cache_dir=str(tmp_path))
+        cached.initialize()
+        assert cached.loaded_from_cache
+        assert cached.cut("真是气死我了") == words
+        
+        tokens = cached.tokenize("真是气死我了")
+        assert [token.word for token in tokens] == words
+        assert all("真是气死我了"[token.start:token.end] == token.word for token in tokens)
+        
+        # 自定义词不同时缓存键不同
+        assert Tokenizer(["难过"], cache_dir=str(tmp_path)).cache_path != tokenizer.cache_path
+
+
+class TestKeywordAutomaton:
+    """关键词自动机测试"""
+    
+    @pytest.fixture
+    def automaton(self):
+        automaton = KeywordAutomaton()
+        automaton.add_many(["不", "不爽", "爽"], "a")
+        automaton.add("哈哈", "b")
+        return automaton.build()
+    
+    def test_iter_matches_overlapping(self, automaton):
+        """测试重叠命中及位置"""
+        hits = list(automaton.iter_matches("真不爽"))
+        
+        assert hits == [("不", "a", 1), ("不爽", "a", 1), ("爽", "a", 2)]
+
+
+class TestLexiconIndex:
+    """共享词库索引测试"""
+    
+    def test_entries_follow_lexicon_order(self):
+        """测试命中条目按词表顺序返回"""
+        index = LexiconIndex()
+        index.register("emotion", {"joy": ["开心", "高兴"], "sadness": ["难过"]})
+        index.register("negation", ["不"])
+        match = index.scan("难过又高兴，不开心开心")
+        
+        assert [h.word for h in match.entries("emotion")] == ["开心", "高兴", "难过"]
+        assert match.counts[("emotion", "joy")] == {"开心": 2, "高兴": 1}
+        assert match.has("negation")
+        assert match.first_start("开心") == 7
+    
+    def test_counts_match_str_count(self):
+        """测试计数与str.count语义一致（重叠出现只计一次）"""
+        index = LexiconIndex()
+        index.register("laugh", ["哈哈"])
+        text = "哈哈哈哈哈"
+        
+        assert index.scan(text).counts[("laugh", None)] == {"哈哈": text.count("哈哈")}
+    
+    def test_shared_scan_between_consumers(self):
+        """测试情感分析器和触发器共享一次扫描"""
+        analyzer = EmotionAnalyzer()
+        triggers = WarmAgentTriggers()
+        text = "今天很难过，怎么办？"
+        match = analyzer.lexicon.scan(text)
+        
+        assert analyzer.lexicon is triggers.lexicon
+        assert analyzer.analyze(text, match=match) == analyzer.analyze(text)
+        assert triggers.should_trigger_warm_mode(text, match=match)[0] is True
+        assert match.counts[("emotion", "sadness")] == {"难过": 1}
+        assert match.has("intensity", "very")
+        assert match.has("question")
+
+
+class TestAnalysisExecutor:
+    """分析执行器测试"""
+    
+    def test_thread_mode_matches_inline(self):
+        """测试线程池模式结果与直接分析一致"""
+        executor = AnalysisExecutor(mode="thread", max_workers=1, inline_max_chars=5)
+        text = "今天工作压力好大，不知道该怎么办"
+        try:
+            result = asyncio.run(executor.analyze(text))
+            batch = asyncio.run(executor.analyze_many([text, "好累"]))
+        finally:
+            executor.shutdown()
+        
+        analyzer = EmotionAnalyzer()
+        assert result == analyzer.analyze(text)
+        assert batch == analyzer.analyze_many([text, "好累"])
+    
+    def test_broken_pool_is_shut_down(self):
+        """测试进程池损坏时关闭旧池，下次提交重建"""
+        from concurrent.futures import Executor
+        from concurrent.futures.process import BrokenProcessPool
+        
+        class BrokenPool(Executor):
+            def __init__(self):
+                self.shutdown_calls = []
+            
+            def submit(self, fn, *args, **kwargs):
+                raise BrokenProcessPool("worker died")
+            
+            def shutdown(self, wait=True, *, cancel_futures=False):
+                self.shutdown_calls.append((wait, cancel_futures))
+        
+        executor = AnalysisExecutor(mode="thread", max_workers=1, inline_max_chars=0)
+        broken = BrokenPool()
+        executor._pool = broken
+        try:
+            with pytest.raises(BrokenProcessPool):
+                asyncio.run(executor.analyze("今天工作压力好大"))
+            assert executor._pool is None
+            assert broken.shutdown_calls == [(False, True)]
+        finally:
+            executor.shutdown()
+    
+    def test_rebuild_after_worker_killed(self):
+        """测试工作进程被杀后，下一次分析在事件循环之外重建进程池，并发调用只重建一次"""
+        import signal
+        import threading
+        from concurrent.futures.process import BrokenProcessPool
+        
+        executor = AnalysisExecutor(mode="process", max_workers=1, inline_max_chars=0)
+        text = "今天工作压力好大，不知道该怎么办"
+        start = executor.start
+        starts = []
+        
+        def tracked_start():
+            starts.append(threading.current_thread() is threading.main_thread())
+            start()
+        
+        executor.start = tracked_start
+        
+        async def scenario():
+            await executor.analyze(text)
+            for pid in list(executor._pool._processes):
+                os.kill(pid, signal.SIGKILL)
+            with pytest.raises(BrokenProcessPool):
+                await executor.analyze(text)
+            return await asyncio.gather(executor.analyze(text), executor.analyze(text))
+        
+        try:
+            results = asyncio.run(scenario())
+        finally:
+            executor.shutdown()
+        
+        assert results == [EmotionAnalyzer().analyze(text)] * 2
+        assert starts == [False, False]
+    
+    def test_invalid_mode(self):
+        """测试非法执行模式"""
+        with pytest.raises(ValueError):
+            AnalysisExecutor(mode="gpu")
+    
+    def test_cached_results_match_analyzer(self):
+        """测试缓存命中的结果与直接分析一致，重复文本只分析一次"""
+        cache = CacheManager("test_analysis", max_entries=100)
+        executor = AnalysisExecutor(mode="inline", cache=cache)
+        texts = ["好累", "哈哈太好了", "好累"]
+        
+        first = asyncio.run(executor.analyze_many(texts))
+        second = asyncio.run(executor.analyze_many(texts))
+        
+        analyzer = EmotionAnalyzer()
+        assert first == second == [analyzer.analyze(text) for text in texts]
+        assert cache.stats()["misses"] == 3
+        assert cache.stats()["local_hits"] == 3
+        assert cache.stats()["entries"] == 2
+    
+    def test_cache_key_tracks_lexicon_version(self):
+        """测试缓存键包含词库版本，且不受无关 context 影响"""
+        analyzer = EmotionAnalyzer()
+        key = analyzer.cache_key("好累")
+        
+        assert key == analyzer.cache_key("好累", {"user_id": "u1"})
+        assert analyzer.lexicon.version in key
+        assert key != analyzer.cache_key("好累 ")
+
+
+class FakeConnection:
+    """模拟的 psycopg2 连接"""
+    
+    def __init__(self):
+        self.closed = 0
+        self.rollbacks = 0
+    
+    def get_transaction_status(self):
+        return 2  # TRANSACTION_STATUS_INTRANS
+    
+    def rollback(self):
+        self.rollbacks += 1
+    
+    def close(self):
+        self.closed = 1
+
+
+class TestConnectionPool:
+    """数据库连接池测试"""
+    
+    @pytest.fixture
+    def pool(self, monkeypatch):
+        pool = ConnectionPool("postgresql://fake", min_size=1, max_size=2,
+                              max_uses=3, timeout=0.01)
+        monkeypatch.setattr(pool, "_connect", lambda: _PooledConnection(FakeConnection()))
+        return pool
+    
+    def test_reuses_connections(self, pool):
+        """测试连接复用并在归还时回滚事务"""
+        conn = pool.getconn()
+        pool.putconn(conn)
+        
+        assert pool.getconn() is conn
+        assert conn.rollbacks == 1
+        assert pool.stats()["size"] == 1
+    
+    def test_recycles_after_max_uses(self, pool):
+        """测试使用次数达到上限后回收"""
+        first = pool.getconn()
+        pool.putconn(first)
+        pool.putconn(pool.getconn())
+        pool.putconn(pool.getconn())
+        
+        assert first.closed
+        assert pool.getconn() is not first
+    
+    def test_timeout_when_exhausted(self, pool):
+        """测试连接耗尽时超时"""
+        pool.getconn()
+        pool.getconn()
+        
+        with pytest.raises(PoolTimeoutError):
+            pool.getconn()
+        assert pool.stats()["in_use"] == 2
+    
+    def test_health_check_runs_outside_lock(self, pool, monkeypatch):
+        """测试探活时不持有锁，其他线程可以同时归还和借出"""
+        import threading
+        
+        other = pool.getconn()
+        idle = pool.getconn()
+        pool.putconn(idle)
+        progressed = []
+        
+        def slow_health_check(item):
+            worker = threading.Thread(target=lambda: progressed.append(pool.stats()["in_use"]))
+            worker.start()
+            worker.join(timeout=1)
+            return False
+        
+        monkeypatch.setattr(pool, "_is_healthy", slow_health_check)
+        pool.putconn(other)
+        conn = pool.getconn()
+        
+        assert progressed
+        assert conn is not idle and idle.closed
+
+
+class TestAsyncUserManager:
+    """异步用户管理器测试（不连接数据库）"""
+    
+    def test_rejects_invalid_input_before_connecting(self):
+        """测试参数校验先于建立连接池"""
+        manager = AsyncUserManager("postgresql://fake")
+        
+        with pytest.raises(ValueError):
+            asyncio.run(manager.create_user("not-an-email", "password123"))
+        with pytest.raises(ValueError):
+            asyncio.run(manager.create_user("user@example.com", "123"))
+        assert manager._pool is None
+    
+    def test_invalidation_runs_off_event_loop(self):
+        """测试变更套餐后的缓存失效（含 Redis 广播）不在事件循环线程中执行"""
+        import threading
+        
+        class RecordingCache:
+            def __init__(self):
+                self.threads = []
+            
+            def invalidate_user(self, user_id):
+                self.threads.append(threading.get_ident())
+        
+        class FakePool:
+            async def execute(self, query, *args):
+                return "UPDATE 1"
+        
+        cache = RecordingCache()
+        manager = AsyncUserManager("postgresql://fake", auth_cache=cache)
+        manager._pool = FakePool()
+        
+        async def run():
+            assert await manager.update_plan("u1", "pro")
+            return threading.get_ident()
+        
+        loop_thread = asyncio.run(run())
+        assert len(cache.threads) == 1
+        assert cache.threads[0] != loop_thread
+    
+    def test_shares_password_hashing(self):
+        """测试与同步版本共用密码哈希"""
+        manager = AsyncUserManager("postgresql://fake")
+        password_hash = manager._hash_password("password123")
+        
+        assert manager.verify_password("password123", password_hash)
+        assert not manager.verify_password("wrong", password_hash)
+
+
+class TestCacheManager:
+    """两级缓存测试（仅本地层）"""
+    
+    def test_lru_by_entries_and_bytes(self):
+        """测试按条目数和字节数淘汰"""
+        cache = CacheManager("test", max_entries=2, max_bytes=1000)
+        
+        async def run():
+            await cache.set("a", b"1")
+            await cache.set("b", b"2")
+            await cache.get("a")
+            await cache.set("c", b"3")
+            return await cache.get_many(["a", "b", "c"])
+        
+        assert asyncio.run(run()) == [b"1", None, b"3"]
+        assert cache.stats()["bytes"] == 4
+        
+        small = CacheManager("test", max_entries=10, max_bytes=10)
+        asyncio.run(small.set_many([("k1", b"x" * 6), ("k2", b"y" * 6)]))
+        assert small.stats()["entries"] == 1
+    
+    def test_expiry(self):
+        """测试过期条目不再命中"""
+        cache = CacheManager("test", ttl=0)
+        asyncio.run(cache.set("a", b"1"))
+        
+        assert asyncio.run(cache.get("a")) is None
+        assert cache.stats()["misses"] == 1
+
+
+class TestAuthCache:
+    """认证缓存测试"""
+    
+    @staticmethod
+    def make_user(user_id="u1", api_key="key-1"):
+        return User(id=user_id, email=f"{user_id}@example.com", api_key=api_key,
+                    plan="free", quota_used=0, quota_limit=1000, is_active=True,
+                    created_at=None, updated_at=None)
+    
+    def test_positive_and_negative_entries(self):
+        """测试有效key与无效key的缓存"""
+        cache = AuthCache(ttl=60, negative_ttl=60)
+        user = self.make_user()
+        
+        assert cache.get("key-1") == (False, None)
+        cache.set("key-1", user)
+        cache.set("bad-key", None)
+        
+        assert cache.get("key-1") == (True, user)
+        assert cache.get("bad-key") == (True, None)
+        assert cache.stats()["negative_hits"] == 1
+    
+    def test_expiry_and_lru(self):
+        """测试过期与LRU淘汰"""
+        cache = AuthCache(ttl=60, negative_ttl=0, max_size=2)
+        cache.set("bad-key", None)
+        assert cache.get("bad-key") == (False, None)
+        
+        cache.set("a", self.make_user("u1", "a"))
+        cache.set("b", self.make_user("u2", "b"))
+        cache.get("a")
+        cache.set("c", self.make_user("u3", "c"))
+        
+        assert cache.get("b") == (False, None)
+        assert cache.get("a")[0] and cache.get("c")[0]
+    
+    def test_invalidate_user(self):
+        """测试按用户失效（如重新生成key、变更套餐）"""
+        cache = AuthCache(ttl=60)
+        cache.set("key-1", self.make_user())
+        cache.set("key-2", self.make_user(user_id="u2", api_key="key-2"))
+        
+        cache.invalidate_user("u1")
+        
+        assert cache.get("key-1") == (False, None)
+        assert cache.get("key-2")[0]
+    
+    def test_stale_read_is_not_cached_after_invalidation(self):
+        """测试查库期间发生失效时，查到的旧记录不写入缓存"""
+        cache = AuthCache(ttl=60)
+        generation = cache.generation()
+        stale = self.make_user()
+        cache.invalidate_user("u1")
+        cache.set("key-1", stale, generation)
+        
+        assert cache.get("key-1") == (False, None)
+        
+        cache.set("key-1", stale, cache.generation())
+        assert cache.get("key-1") == (True, stale)
+
+
+class TestUsageRollup:
+    """用量汇总测试"""
+    
+    def test_summarize_daily_rollups(self):
+        """测试由天汇总合并出总量、按端点和按天统计"""
+        rows = [
+            {"bucket": date(2026, 3, 1), "endpoint": "/v1/emotion/analyze", "request_count": 3, "processing_time_sum": 30},
+            {"bucket": date(2026, 3, 2), "endpoint": "/v1/emotion/analyze", "request_count": 2, "processing_time_sum": 10},
+            {"bucket": date(2026, 3, 2), "endpoint": "/v1/warm-response/generate", "request_count": 1, "processing_time_sum": 20},
+        ]
+        stats = UserManagerBase._summarize_usage(rows, 30)
+        
+        assert stats["total_requests"] == 6
+        assert stats["avg_processing_time_ms"] == 10.0
+        assert stats["by_endpoint"][0] == {"endpoint": "/v1/emotion/analyze", "count": 5}
+        assert stats["by_day"] == [{"date": "2026-03-02", "count": 3}, {"date": "2026-03-01", "count": 3}]
+        assert UserManagerBase._summarize_usage([], 7)["avg_processing_time_ms"] == 0
+    
+    def test_add_months(self):
+        """测试分区月份计算"""
+        assert _add_months(date(2026, 11, 15), 2) == date(2027, 1, 1)
+        assert _add_months(date(2026, 1, 31), -12) == date(2025, 1, 1)
+    
+    def test_maintenance_failure_keeps_refresh(self):
+        """测试分区维护失败不回滚汇总刷新，且下个周期重试维护"""
+        from src.core.usage_rollup import UsageAggregator
+        
+        conn = FakeRollupConnection(fail_maintenance=True)
+        aggregator = UsageAggregator(FakeRollupManager(conn), maintenance_interval=0)
+        assert asyncio.run(aggregator.run_once()) is True
+        assert any("refresh_usage_rollups" in query for query, _ in conn.committed)
+        assert aggregator.stats()["maintenance_errors"] == 1
+        assert aggregator.stats()["errors"] == 0
+        
+        asyncio.run(aggregator.run_once())
+        assert aggregator.stats()["maintenance_errors"] == 2
+    
+    def test_first_run_refreshes_daily_and_maintains(self, monkeypatch):
+        """测试启动后的首轮立即刷新天汇总并维护分区（与主机已运行多久无关）"""
+        from src.core import usage_rollup
+        
+        monkeypatch.setattr(usage_rollup.time, "monotonic", lambda: 10.0)
+        conn = FakeRollupConnection()
+        aggregator = usage_rollup.UsageAggregator(FakeRollupManager(conn))
+        asyncio.run(aggregator.run_once())
+        
+        refresh = [args for query, args in conn.committed if "refresh_usage_rollups" in query]
+        assert refresh[0][1] is True
+        assert any("create_usage_logs_partition" in query for query, _ in conn.committed)
+    
+    def test_refresh_resumes_from_watermark(self):
+        """测试从汇总水位往前回看开始重算，并推进水位"""
+        from datetime import datetime, timedelta, timezone
+        from src.core.usage_rollup import UsageAggregator
+        
+        watermark = datetime.now(timezone.utc) - timedelta(days=2)
+        conn = FakeRollupConnection(watermark=watermark)
+        aggregator = UsageAggregator(FakeRollupManager(conn), lookback=3600)
+        asyncio.run(aggregator.run_once())
+        
+        refresh = [args for query, args in conn.committed if "refresh_usage_rollups" in query]
+        assert refresh[0][0] == watermark - timedelta(seconds=3600)
+        assert [args for query, args in conn.committed if "usage_rollup_state" in query] == [
+            (["hourly", "daily"],)
+        ]
+
+
+class FakeRollupTransaction:
+    """模拟的 asyncpg 事务：正常退出时提交期间执行的语句"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    async def __aenter__(self):
+        self.conn.pending = []
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.committed.extend(self.conn.pending)
+
+
+class FakeRollupConnection:
+    """模拟的 asyncpg 连接（记录已提交的语句及参数）"""
+    
+    def __init__(self, watermark=None, fail_maintenance=False):
+        self.watermark = watermark
+        self.fail_maintenance = fail_maintenance
+        self.pending = []
+        self.committed = []
+    
+    def transaction(self):
+        return FakeRollupTransaction(self)
+    
+    async def fetchval(self, query, *args):
+        if "usage_rollup_state" in query:
+            return self.watermark
+        if "drop_usage_logs_partitions" in query:
+            return 0
+        return True
+    
+    async def execute(self, query, *args):
+        if self.fail_maintenance and "create_usage_logs_partition" in query:
+            raise RuntimeError("default partition contains matching rows")
+        self.pending.append((query, args))
+
+
+class FakeRollupManager:
+    """模拟的异步用户管理器（连接池每次借出同一个连接）"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    async def get_pool(self):
+        manager = self
+        
+        class Pool:
+            def acquire(self):
+                class Acquire:
+                    async def __aenter__(self):
+                        return manager.conn
+                    
+                    async def __aexit__(self, *exc):
+                        return False
+                return Acquire()
+        return Pool()
+
+
+class FakeUsageWriter:
+    """模拟的用量日志写入端"""
+    
+    def __init__(self):
+        self.batches = []
+    
+    async def copy_usage_logs(self, records):
+        self.batches.append(records)
+
+
+class TestUsageLogBuffer:
+    """用量日志缓冲测试"""
+    
+    def test_flushes_in_batches(self):
+        """测试按批写入"""
+        writer = FakeUsageWriter()
+        buffer = UsageLogBuffer(writer, max_size=10, batch_size=2)
+        for i in range(5):
+            buffer.record("u1", "/v1/emotion/analyze", i, 0, 1)
+        
+        assert asyncio.run(buffer.flush()) == 5
+        assert [len(batch) for batch in writer.batches] == [2, 2, 1]
+        assert buffer.stats()["written"] == 5
+    
+    def test_drops_oldest_when_full(self):
+        """测试缓冲区满时丢弃最旧事件并计数"""
+        writer = FakeUsageWriter()
+        buffer = UsageLogBuffer(writer, max_size=3, batch_size=3)
+        for i in range(5):
+            buffer.record("u1", "/v1/emotion/analyze", i)
+        
+        assert buffer.stats()["dropped"] == 2
+        asyncio.run(buffer.flush())
+        assert [record[2] for record in writer.batches[0]] == [2, 3, 4]
+    
+    def test_stop_drains(self):
+        """测试停止时写完剩余事件"""
+        writer = FakeUsageWriter()
+        buffer = UsageLogBuffer(writer, batch_size=100, flush_interval=60)
+        
+        async def run():
+            buffer.start()
+            buffer.record("u1", "/v1/emotion/analyze")
+            await buffer.stop()
+        
+        asyncio.run(run())
+        assert sum(len(batch) for batch in writer.batches) == 1
+    
+    def test_bad_row_only_drops_that_row(self):
+        """测试某条记录外键冲突时同批其他记录仍写入"""
+        import asyncpg
+        
+        class DeletedUserWriter(FakeUsageWriter):
+            async def copy_usage_logs(self, records):
+                if any(record[0] == "deleted" for record in records):
+                    raise asyncpg.ForeignKeyViolationError("user does not exist")
+                self.batches.append(records)
+        
+        writer = DeletedUserWriter()
+        buffer = UsageLogBuffer(writer, max_size=20, batch_size=8)
+        for i in range(8):
+            buffer.record("deleted" if i == 5 else "u1", "/v1/emotion/analyze", i)
+        
+        assert asyncio.run(buffer.flush()) == 7
+        assert sorted(record[2] for batch in writer.batches for record in batch) == [0, 1, 2, 3, 4, 6, 7]
+        assert buffer.stats()["failed"] == 1
+    
+    def test_requeues_on_connection_error(self):
+        """测试连接错误时事件放回缓冲区，下次写入"""
+        class FlakyWriter(FakeUsageWriter):
+            def __init__(self):
+                super().__init__()
+                self.down = True
+            
+            async def copy_usage_logs(self, records):
+                if self.down:
+                    raise ConnectionError("connection refused")
+                self.batches.append(records)
+        
+        writer = FlakyWriter()
+        buffer = UsageLogBuffer(writer, max_size=10, batch_size=2)
+        for i in range(3):
+            buffer.record("u1", "/v1/emotion/analyze", i)
+        
+        assert asyncio.run(buffer.flush()) == 0
+        assert buffer.stats()["buffered"] == 3
+        
+        writer.down = False
+        assert asyncio.run(buffer.flush()) == 3
+        assert [record[2] for batch in writer.batches for record in batch] == [0, 1, 2]
+        assert buffer.stats()["failed"] == 0
+
+
+class FakeQuotaStore:
+    """模拟的额度存储（与 consume_quota / refund_quota 语义一致）"""
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.calls = 0
+    
+    async def consume_quota(self, api_key, cost=1):
+        self.calls += 1
+        if self.used + cost > self.limit:
+            return None
+        self.used += cost
+        return self.limit - self.used
+    
+    async def refund_quota(self, api_key, amount):
+        self.used = max(self.used - amount, 0)
+
+
+class TestQuotaMeter:
+    """按块预留额度测试"""
+    
+    def test_reserves_in_chunks(self):
+        """测试每块额度只访问一次存储，剩余额度按实际用量计算"""
+        store = FakeQuotaStore(100)
+        meter = QuotaMeter(store, "key", chunk=10)
+        
+        async def run():
+            return [await meter.consume() for _ in range(25)]
+        
+        remaining = asyncio.run(run())
+        assert remaining[0] == 99
+        assert remaining[-1] == 75
+        assert store.calls == 3
+    
+    def test_release_refunds_unused(self):
+        """测试关闭时退还未使用的预留额度"""
+        store = FakeQuotaStore(100)
+        meter = QuotaMeter(store, "key", chunk=10)
+        
+        async def run():
+            await meter.consume()
+            await meter.consume()
+            return await meter.release()
+        
+        assert asyncio.run(run()) == 8
+        assert store.used == 2
+    
+    def test_unconsume_is_refunded(self):
+        """测试撤销的扣减在关闭时一并退还"""
+        store = FakeQuotaStore(100)
+        meter = QuotaMeter(store, "key", chunk=10)
+        
+        async def run():
+            await meter.consume()
+            await meter.consume()
+            meter.unconsume()
+            return await meter.release()
+        
+        assert asyncio.run(run()) == 9
+        assert meter.used == 1
+        assert store.used == 1
+    
+    def test_falls_back_when_chunk_exceeds_quota(self):
+        """测试剩余额度不足一块时逐次扣减，用尽后返回None"""
+        store = FakeQuotaStore(3)
+        meter = QuotaMeter(store, "key", chunk=10)
+        
+        async def run():
+            return [await meter.consume() for _ in range(4)]
+        
+        assert asyncio.run(run()) == [2, 1, 0, None]
+        assert store.used == 3
+
+
+class TestEmotionHistory:
+    """环形情感历史测试"""
+    
+    def test_rolling_aggregates_match_window(self):
+        """测试覆盖旧记录后计数与均值仍与窗口内容一致"""
+        history = EmotionHistory(capacity=5)
+        emotions = ["joy", "sadness", "sadness", "anger", "joy", "sadness", "fear", "sadness"]
+        for i, emotion in enumerate(emotions):
+            history.append(emotion, i / 10, timestamp=1000 + i)
+        
+        window = list(history)
+        assert len(history) == 5
+        assert [item[0] for item in window] == emotions[-5:]
+        assert [item[2] for item in window] == [1003, 1004, 1005, 1006, 1007]
+        assert history.most_common() == ("sadness", 2)
+        assert history.count("joy") == 1
+        assert history.mean_intensity() == pytest.approx(sum(item[1] for item in window) / 5)
+        assert history.recent(3) == ["sadness", "fear", "sadness"]
+    
+    def test_bytes_round_trip(self):
+        """测试打包往返"""
+        history = EmotionHistory(capacity=3)
+        for emotion in ["joy", "loneliness", "gratitude", "love"]:
+            history.append(emotion, 0.5, timestamp=42)
+        
+        restored = EmotionHistory.from_bytes(history.to_bytes(), capacity=3)
+        assert restored == history
+        assert restored.most_common() == history.most_common()
+        assert restored.mean_intensity() == history.mean_intensity()
+        
+        # 还原后的环继续写入时，计数与均值仍与窗口一致
+        for history_ in (history, restored):
+            history_.append("joy", 0.9, timestamp=43)
+            history_.append("joy", 0.1, timestamp=44)
+        assert restored == history
+        assert restored.count("joy") == history.count("joy") == 2
+        assert restored.mean_intensity() == pytest.approx(history.mean_intensity())
+    
+    def test_restore_into_smaller_capacity(self):
+        """测试容量变小时只保留最新的记录"""
+        history = EmotionHistory(capacity=5)
+        for i, emotion in enumerate(["joy", "sadness", "anger", "fear", "love"]):
+            history.append(emotion, 0.5, timestamp=i)
+        
+        restored = EmotionHistory.from_bytes(history.to_bytes(), capacity=2)
+        assert [item[0] for item in restored] == ["fear", "love"]
+        assert restored.count("joy") == 0
+    
+    def test_most_common_tie_keeps_first_seen(self):
+        """测试出现次数并列时取窗口内最早出现的情感（与 Counter.most_common 一致）"""
+        from collections import Counter
+        
+        history = EmotionHistory(capacity=4)
+        emotions = ["joy", "anger", "sadness", "sadness", "anger"]
+        for emotion in emotions:
+            history.append(emotion, 0.5)
+        
+        window = [item[0] for item in history]
+        assert history.most_common() == Counter(window).most_common(1)[0] == ("anger", 2)
+
+
+class TestSessionStore:
+    """会话状态存储测试"""
+    
+    def test_state_round_trip(self):
+        """测试序列化往返"""
+        state = SessionState(warm_mode=True, preferences={"style": "warm"})
+        state.touch()
+        state.record_emotion("sad", 0.8)
+        
+        restored = SessionState.from_bytes(state.to_bytes())
+        assert restored == state
+    
+    def test_lru_eviction(self):
+        """测试超出上限时淘汰最久未用的会话"""
+        store = MemorySessionStore(max_sessions=2)
+        store.set("a", SessionState())
+        store.set("b", SessionState())
+        store.get("a")
+        store.set("c", SessionState(warm_mode=True))
+        
+        assert store.get("b") is None
+        assert store.get("a") is not None
+        assert store.get("c").warm_mode is True
+        assert store.stats()["evictions"] == 1
+        assert store.stats()["sessions"] == 2
+    
+    def test_ttl_expiration(self):
+        """测试会话过期"""
+        store = MemorySessionStore(ttl=0)
+        store.set("a", SessionState())
+        
+        assert store.get("a") is None
+        assert store.stats()["expirations"] == 1
+    
+    def test_compare_and_set_rejects_stale_version(self):
+        """测试版本已被其他写入更新时条件写入失败"""
+        store = MemorySessionStore()
+        store.set("a", SessionState())
+        first = store.get("a")
+        second = store.get("a")
+        
+        assert store.compare_and_set("a", first) is True
+        assert store.compare_and_set("a", second) is False
+        assert store.get("a").version == first.version == 2
+        assert store.stats()["conflicts"] == 1
+    
+    def test_concurrent_updates_are_merged(self):
+        """测试两个 worker 同时处理同一会话时，双方的修改都写回（冲突时在最新状态上重放）"""
+        from src.core.interaction_recorder import NullInteractionWriter
+        from src.integrations.openclaw import OpenClawContext, OpenClawIntegration, OpenClawMessage
+        
+        class InterleavingStore(MemorySessionStore):
+            """第一次读取之后插入另一个 worker 的完整处理"""
+            interleave = None
+            
+            def get(self, key):
+                state = super().get(key)
+                interleave, self.interleave = self.interleave, None
+                if interleave is not None:
+                    interleave()
+                return state
+        
+        store = InterleavingStore()
+        workers = [
+            OpenClawIntegration({"openclaw": {}}, session_store=store,
+                                recorder=InteractionRecorder(NullInteractionWriter()))
+            for _ in range(2)
+        ]
+        context = OpenClawContext(user_id="u1", channel="qqbot")
+        store.interleave = lambda: workers[1].process_message(
+            OpenClawMessage(content="开启温暖模式", base_response="好的"), context
+        )
+        workers[0].process_message(OpenClawMessage(content="今天很难过", base_response="嗯"), context)
+        
+        state = store.get("u1")
+        assert state.warm_mode is True
+        assert state.interaction_count == 3
+        assert state.emotion_history.recent(1) == ["sadness"]
+        assert store.stats()["conflicts"] == 1
+
+
+class FakeInteractionWriter:
+    """模拟的交互写入端"""
+    
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+    
+    def write(self, records):
+        self.batches.append(records)
+    
+    def close(self):
+        self.closed = True
+
+
+class TestInteractionRecorder:
+    """交互记录测试"""
+    
+    @pytest.fixture
+    def emotion(self):
+        return EmotionAnalyzer().analyze("今天好难过")
+    
+    def test_flushes_in_batches(self, emotion):
+        """测试按批写入"""
+        writer = FakeInteractionWriter()
+        recorder = InteractionRecorder(writer, max_size=10, batch_size=2)
+        for i in range(5):
+            recorder.record(f"u{i}", "qqbot", None, "今天好难过", emotion, "抱抱你")
+        
+        assert recorder.flush() == 5
+        assert [len(batch) for batch in writer.batches] == [2, 2, 1]
+    
+    def test_drops_oldest_when_full(self, emotion):
+        """测试队列满时丢弃最旧的记录并计数"""
+        writer = FakeInteractionWriter()
+        recorder = InteractionRecorder(writer, max_size=3, batch_size=3)
+        for i in range(5):
+            recorder.record(f"u{i}", "qqbot", None, "今天好难过", emotion, "抱抱你")
+        recorder.stop()
+        
+        assert recorder.stats()["dropped"] == 2
+        assert [record.user_id for record in writer.batches[0]] == ["u2", "u3", "u4"]
+        assert writer.closed
+    
+    def test_autostart_on_first_record(self, emotion):
+        """测试未调用 start 时首次记录自动启动后台写入"""
+        import time
+        
+        writer = FakeInteractionWriter()
+        recorder = InteractionRecorder(writer, batch_size=1, flush_interval=0.01, autostart=True)
+        recorder.record("u1", "qqbot", None, "今天好难过", emotion, "抱抱你")
+        deadline = time.monotonic() + 5
+        while not writer.batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        recorder.stop()
+        recorder.stop()
+        
+        assert [record.user_id for batch in writer.batches for record in batch] == ["u1"]
+        assert writer.closed
+    
+    def test_jsonl_rotation(self, emotion, tmp_path):
+        """测试JSONL文件超过上限时轮转"""
+        path = tmp_path / "interactions.jsonl"
+        writer = JsonlInteractionWriter(str(path), max_bytes=500, backup_count=2)
+        recorder = InteractionRecorder(writer, batch_size=1)
+        for i in range(5):
+            recorder.record(f"u{i}", "qqbot", None, "今天好难过", emotion, "抱抱你")
+        recorder.stop()
+        
+        assert writer.rotations > 0
+        assert (tmp_path / "interactions.jsonl.1").exists()
+        assert not (tmp_path / "interactions.jsonl.3").exists()
+        last = path.read_text(encoding="utf-8").splitlines()[-1]
+        assert json.loads(last)["user_id"] == "u4"
 
 
 class TestWarmResponseEngine:
@@ -189,6 +1181,78 @@ class TestWarmResponseEngine:
         # 高温暖度应该有更多个性化元素
         assert len(response.personalized_elements) > 0
         assert response.warmth_score > 0.5
+    
+    def test_seeded_generation_is_reproducible(self, engine, emotion_result):
+        """测试相同种子得到逐字节相同的回应"""
+        outputs = {
+            engine.generate(emotion_result, "建议你休息一下", seed=42).text
+            for _ in range(5)
+        }
+        assert len(outputs) == 1
+        
+        deterministic = WarmResponseEngine(deterministic=True)
+        context = {"user_id": "u1"}
+        first = deterministic.generate(emotion_result, "建议你休息一下", context)
+        second = deterministic.generate(emotion_result, "建议你休息一下", context)
+        assert first.to_dict() == second.to_dict()
+        assert deterministic.seed_for("u1", "今天好累") == deterministic.seed_for("u1", "今天好累")
+        assert engine.seed_for("u1", "今天好累") is None
+    
+    def test_response_cache(self, emotion_result):
+        """测试回应变体缓存：命中同一变体、强度只影响分数、LRU 淘汰"""
+        cache = ResponseVariantCache(max_entries=2, variants=4)
+        engine = WarmResponseEngine(cache=cache)
+        
+        first = engine.generate(emotion_result, "建议你休息一下", seed=5)
+        assert cache.stats()["misses"] == 1
+        # 同一强度区间内命中同一变体，温暖度按实际强度计算
+        stronger = EmotionResult("sadness", [], 0.95, 0.85, [], [], True, "")
+        assert emotion_signature(stronger) == emotion_signature(emotion_result)
+        second = engine.generate(stronger, "建议你休息一下", seed=5)
+        assert second.text == first.text
+        assert second.personalized_elements == first.personalized_elements
+        assert second.warmth_score == round(min(1.0, first.warmth_score + 0.02), 2)
+        assert cache.stats()["hits"] == 1
+        
+        # 不传种子时在变体池内随机选择，回复仍有变化
+        texts = {engine.generate(emotion_result, "建议你休息一下").text for _ in range(50)}
+        assert 1 < len(texts) <= 4
+        
+        engine.generate(emotion_result, "别担心")
+        engine.generate(emotion_result, "慢慢来")
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 1
+        assert 0 < stats["hit_ratio"] < 1
+    
+    def test_response_cache_key_is_fixed_size(self, emotion_result):
+        """测试缓存 key 只含基础回应的定长摘要，长文本不占用 key 内存"""
+        cache = ResponseVariantCache(max_entries=4, variants=2)
+        engine = WarmResponseEngine(cache=cache)
+        base_response = "好的" * 5000
+        
+        first = engine.generate(emotion_result, base_response, seed=1)
+        second = engine.generate(emotion_result, base_response, seed=1)
+        
+        assert second.text == first.text
+        assert cache.stats()["hits"] == 1
+        (key,) = cache._entries
+        assert base_response not in key
+        assert len(key[-1]) == 16
+    
+    def test_render_plans(self, engine, emotion_result):
+        """测试预编译渲染计划：风格替换作用于模板，未知偏好回退到等价计划"""
+        casual = {"preferences": {"style": "casual", "emoji_level": "none"}}
+        for _ in range(20):
+            response = engine.generate(emotion_result, "好的。", casual)
+            assert "。" not in response.text
+            assert "好的～" in response.text
+        
+        unknown = {"preferences": {"style": "poetic", "emoji_level": "max"}}
+        response = engine.generate(emotion_result, "好的", unknown)
+        assert "好的" in response.text
+        assert "风格适配: poetic" in response.personalized_elements
+        assert "表情级别: max" in response.personalized_elements
 
 
 class TestWarmAgentTriggers:
@@ -266,6 +1330,17 @@ class TestWarmAgentTriggers:
         assert template
         assert isinstance(template, str)
         assert len(template) > 0
+    
+    def test_seeded_warm_response_template(self, triggers):
+        """测试相同种子选出相同模板"""
+        trigger_info = {
+            "trigger_type": "keyword",
+            "trigger_words": ["难过"],
+            "trigger_categories": ["emotion_negative"]
+        }
+        
+        templates = {triggers.get_warm_response_template(trigger_info, seed=7) for _ in range(5)}
+        assert len(templates) == 1
 
 
 if __name__ == "__main__":